@@ -1,26 +1,55 @@
-import uvicorn
-from fastapi import FastAPI, HTTPException
+import asyncio
+import base64
+import json
+import os
+import time
+import httpx
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from datetime import date
 from typing import Literal
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import firestore
-import requests
-from purchaseAnalysis import predict_affordability
-from datetime import date, datetime
+from datetime import date, datetime, timezone
 from dateutil.relativedelta import relativedelta
-from profileAggregator import calculate_historical_profile, adjust_for_current_month_outliers
-
-NESSIE_API_KEY = '933f9b5bbbb8094ff92c2ea78ece8502'
-NESSIE_BASE_URL = 'http://api.nessieisreal.com'
-# Initialize the SDK with a service account
-# Replace 'path/to/your/serviceAccountKey.json' with your actual file path
-#cred = credentials.Certificate('hakgt25realproj/mvidia-c10e5-firebase-adminsdk-fbsvc-b0e12b6e77.json')
-#firebase_admin.initialize_app(cred)
-
-# Get a reference to the Firestore database
-db = firestore.client()
+from nessieClient import create_async_client, nessie_get, nessie_get_async
+from nessieCache import get_response_cache
+from firestoreSync import TRANSACTION_TIMESTAMP_FIELD
+from profileCache import ProfileCache, MISSING
+from singleFlight import SingleFlight
+from syncJobs import JobQueue, QueueFull, current_job
+from storage import get_client, get_async_client
+from transactionStore import (
+    store_enabled, read_or_backfill, read_recent_purchases, record_synced_transactions, backfill_customer
+)
+from syncPipeline import run_sync_pipeline
+import metrics
+from metrics import METRICS_ENABLED, MetricsMiddleware, stage
+from profiling import PROFILE_DIR, PROFILING_ENABLED, ProfilingMiddleware, capture, capture_path, requested_mode
+
+# The database clients (Firestore, or the local stand-in picked by STORAGE_BACKEND), created
+# on startup so importing the app has no side effects. Request handlers use the async client;
+# the blocking client is kept for the sync writers, which run in worker threads.
+db = None
+adb = None
+
+# Shared async HTTP client for Nessie, opened on startup
+nessie_http = None
+
+# Read-through cache for /customers/{id}/analysis results
+profile_cache = ProfileCache()
+# Concurrent identical reads share one backend fetch
+single_flight = SingleFlight()
+
+# Most customers one POST /customers/analysis/batch request may ask for
+ANALYSIS_BATCH_MAX_CUSTOMERS = 300
+# Values per Firestore 'in' query
+FIRESTORE_IN_LIMIT = 30
+
+# Default and maximum page size of /customers/{id}/purchases/recent
+RECENT_PURCHASES_PAGE_SIZE = 100
+RECENT_PURCHASES_MAX_PAGE_SIZE = 1000
 
 # -- jAEiLtrKvtoLO2U3NmVo --sample customer ID
 # Import Google Cloud Firestore client library
@@ -28,53 +57,92 @@ db = firestore.client()
 # --- 1. Firestore Initialization ---
 # This assumes you have authenticated with Google Cloud CLI and set your project.
 # See the "How to Run" section below for instructions.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup_event()
+    try:
+        yield
+    finally:
+        await shutdown_event()
+
 app = FastAPI(
     title="Nessie Data Sync API",
     description="An API to pull all data for a customer from the Nessie API and store it in Cloud Firestore.",
     version="2.0.0",
+    lifespan=lifespan,
 )
+# Per-route request counts, latency and Firestore operations, served at /metrics
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+# Requests sent with X-Profile: sample|cprofile are profiled (only when PROFILING_ENABLED=1);
+# for POST /sync/customers/{id} the queued sync job is profiled instead of the enqueue
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, skip=[('POST', '/sync/customers/')])
 
-@app.on_event("startup")
 async def startup_event():
-    """Checks for a valid Firestore client on startup."""
+    """
+    Creates the database clients (unless already set, e.g. by a benchmark) and opens the
+    Nessie HTTP client. A missing or invalid Firestore credential fails startup here.
+    """
+    global db, adb, nessie_http
     if db is None:
-        raise RuntimeError("Could not initialize Firestore client. Check GCP authentication.")
+        db = get_client()
+    if adb is None:
+        adb = get_async_client()
+    nessie_http = create_async_client()
+    sync_jobs.start()
+
+async def shutdown_event():
+    await sync_jobs.stop()
+    if nessie_http is not None:
+        await nessie_http.aclose()
 
 # --- 3. Nessie API Helper ---
 
-def nessie_get_request(endpoint: str):
+async def nessie_get_request_async(endpoint: str):
     """
-    Makes a GET request to the Nessie API and handles common errors.
+    Makes a GET request to the Nessie API without blocking the event loop,
+    and handles common errors. Transient failures are retried by nessieClient.
     """
-    url = f"{NESSIE_BASE_URL}{endpoint}?key={NESSIE_API_KEY}"
     try:
-        response = requests.get(url, timeout=10)
-        # Raise an exception for 4xx or 5xx status codes
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 404:
-            # Return None for 404s so the caller can handle "not found" cases
-            return None
+        # Returns None for 404s so the caller can handle "not found" cases
+        return await nessie_get_async(nessie_http, endpoint)
+    except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail=f"Error from Nessie API: {e}")
-    except requests.exceptions.RequestException as e:
+    except httpx.RequestError as e:
         # Handle network errors, timeouts, etc.
         raise HTTPException(status_code=503, detail=f"Could not connect to Nessie API: {e}")
 
-def get_transactions_for_customer(customer_firestore_id: str):
-    """Retrieves all transactions for a given customer from Firestore."""
+def nessie_get_request(endpoint: str):
+    """Blocking counterpart of nessie_get_request_async, for the sync pipeline's fetch threads."""
+    import requests
     try:
-        accounts_query = db.collection('accounts').where('customer_firestore_id', '==', customer_firestore_id).stream()
-        account_ids = [account.id for account in accounts_query]
-        if not account_ids: return []
-        if len(account_ids) > 30:
-            print(f"  WARNING: Customer {customer_firestore_id} has >30 accounts. Skipping.")
-            return []
-        transactions_query = db.collection('transactions').where('customer_firestore_id', '==', customer_firestore_id).stream()
-        return [t.to_dict() for t in transactions_query]
-    except Exception as e:
-        print(f"  ERROR: Could not fetch transactions for {customer_firestore_id}. Reason: {e}")
-        return []
+        return nessie_get(endpoint)
+    except requests.exceptions.HTTPError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=f"Error from Nessie API: {e}")
+    except requests.exceptions.RequestException as e:
+        raise HTTPException(status_code=503, detail=f"Could not connect to Nessie API: {e}")
+
+async def get_account_ids_async(customer_firestore_id: str):
+    """Returns the customer's account document IDs. At most 31 are read: enough to enforce the 30-account limit."""
+    accounts_query = adb.collection('accounts').where('customer_firestore_id', '==', customer_firestore_id).limit(31)
+    return [account.id async for account in accounts_query.stream()]
+
+async def lookup_customer_async(customer_firestore_id: str):
+    """
+    Returns (whether the customer exists, their account IDs). Concurrent lookups of the
+    same customer, from any endpoint, share one pair of reads; a lookup started before a
+    sync invalidated the customer is not shared with those started after it.
+    """
+    async def lookup():
+        customer_doc, account_ids = await asyncio.gather(
+            adb.collection('users').document(customer_firestore_id).get(),
+            get_account_ids_async(customer_firestore_id),
+        )
+        return customer_doc.exists, account_ids
+    generation = profile_cache.generation(customer_firestore_id)
+    return await single_flight.do(('customer', customer_firestore_id, generation), lookup)
+
 # --- 4. Firestore De-duplication & Sync Logic ---
 
 def sync_document(collection_name: str, nessie_data: dict, extra_fields: dict = None):
@@ -110,99 +178,189 @@ def sync_document(collection_name: str, nessie_data: dict, extra_fields: dict =
 
 # --- 5. The Combined Sync Endpoint ---
 
-@app.post("/sync/customers/{nessie_customer_id}", status_code=200)
-def sync_single_customer_by_nessie_id(nessie_customer_id: str):
+def save_synced_profile(customer_firestore_id: str, committed: list, after_failure: bool = False):
+    """
+    Folds a customer's newly committed transactions into their rollup and recomputes
+    their financial profile from it. Blocking; runs on the sync pipeline's analyze stage.
+    after_failure is for documents a failed sync committed, which may have been appended
+    to the store already: the customer's store partitions are rebuilt instead.
+    """
+    # The analytics stack (pandas, numpy) is imported on the first sync, not at startup
+    from monthlyRollups import load_rollup, update_rollups
+    from profileEngine import profile_from_rollup
+
+    try:
+        if store_enabled():
+            if after_failure:
+                backfill_customer(db, customer_firestore_id)
+            else:
+                record_synced_transactions(db, committed)
+        update_rollups(db, committed)
+
+        rollup = load_rollup(db, customer_firestore_id)
+        if not rollup['transaction_count']:
+            print(f"  INFO: No transactions found for {customer_firestore_id}.")
+            return
+        # The profile comes from the customer's monthly rollup, not their full history
+        final_profile = profile_from_rollup(rollup).final_profile
+
+        if final_profile:
+            final_profile["last_updated_utc"] = datetime.utcnow()
+
+            try:
+                doc_ref = db.collection('financial_profiles').document(customer_firestore_id)
+                doc_ref.set(final_profile)
+                print(f"  ✅ SUCCESS: Financial profile for {customer_firestore_id} saved to Firestore.")
+            except Exception as e:
+                print(f"  ❌ ERROR: Could not save profile for {customer_firestore_id}. Reason: {e}")
+        else:
+            print(f"  INFO: Not enough historical data to create a profile for {customer_firestore_id}.")
+    finally:
+        # New accounts, transactions or profile, even when no profile was saved: drop the cached analysis result
+        profile_cache.invalidate(customer_firestore_id)
+
+async def run_customer_sync(nessie_customer_id: str):
     """
     Fetches and syncs all data for a single customer given their Nessie ID.
     This includes the customer record, all their accounts, and all their transactions.
+    Returns the customer's Firestore ID; raises if the sync fails. Run as a sync job.
     """
     print(f"\n--- 🎯 Starting targeted sync for Nessie Customer ID: {nessie_customer_id} ---")
     try:
         # Step 1: Fetch and Sync the Customer record
-        customer_data = nessie_get_request(f"/customers/{nessie_customer_id}")
+        customer_data = await nessie_get_request_async(f"/customers/{nessie_customer_id}")
         if not customer_data:
-            print(f"  ERROR: Customer '{nessie_customer_id}' not found in Nessie.")
-            return None
+            raise LookupError(f"Customer '{nessie_customer_id}' not found in Nessie.")
         
-        customer_firestore_id = sync_document('users', customer_data)
+        customer_firestore_id = await asyncio.to_thread(sync_document, 'users', customer_data)
         
         # Step 2: Fetch and Sync all of the Customer's Accounts
-        accounts_data = nessie_get_request(f"/customers/{nessie_customer_id}/accounts")
+        accounts_data = await nessie_get_request_async(f"/customers/{nessie_customer_id}/accounts")
         if not accounts_data:
             print("  INFO: No accounts found for this customer.")
+            # The customer record was rewritten above: drop the cached analysis result
+            profile_cache.invalidate(customer_firestore_id)
             print(f"--- ✅ Targeted Sync Complete for {nessie_customer_id} (no accounts to process) ---")
             return customer_firestore_id
 
-        # Step 3: Loop through each account and sync its transactions
-        total_synced_transactions = 0
-        for account in accounts_data:
-            nessie_account_id = account['_id']
-            account_firestore_id = sync_document(
-                'accounts', account, {'customer_firestore_id': customer_firestore_id}
-            )
-            
-            # Fetch all transaction types for the account
-            deposits = nessie_get_request(f"/accounts/{nessie_account_id}/deposits") or []
-            purchases = nessie_get_request(f"/accounts/{nessie_account_id}/purchases") or []
-            withdrawals = nessie_get_request(f"/accounts/{nessie_account_id}/withdrawals") or []
-
-            all_txns = (
-                [{**t, 'type': 'deposit'} for t in deposits] +
-                [{**t, 'type': 'purchase'} for t in purchases] +
-                [{**t, 'type': 'withdrawal'} for t in withdrawals]
+        # Step 3: Fetch, write and analyze through the sync pipeline: each account's transactions
+        # are written while the next ones download, and the profile is recomputed once at the end.
+        # The pipeline's stages are threads using the blocking clients, so it runs off the event loop.
+        try:
+            result = await asyncio.to_thread(
+                run_sync_pipeline, db, accounts_data, {account['_id']: customer_firestore_id for account in accounts_data},
+                nessie_get_request, on_customer_synced=save_synced_profile,
             )
-
-            print(f"  Syncing {len(all_txns)} transactions for account {nessie_account_id}...")
-            for txn in all_txns:
-                sync_document('transactions', txn, {'customer_firestore_id': customer_firestore_id})
-            
-            total_synced_transactions += len(all_txns)
-
-
-            all_transactions = get_transactions_for_customer(customer_firestore_id)
-            if not all_transactions:
-                print(f"  INFO: No transactions found for {customer_firestore_id}.")
-                continue
-            historical_profile, historical_expenses = calculate_historical_profile(all_transactions)
-        
-            if historical_profile:
-                final_profile = adjust_for_current_month_outliers(all_transactions, historical_expenses, historical_profile)
-                final_profile["last_updated_utc"] = datetime.utcnow()
-                
+        except Exception as e:
+            # Transactions committed before the failure still go into the store, rollup and profile
+            if getattr(e, 'committed', None):
                 try:
-                    doc_ref = db.collection('financial_profiles').document(customer_firestore_id)
-                    doc_ref.set(final_profile)
-                    print(f"  ✅ SUCCESS: Financial profile for {customer_firestore_id} saved to Firestore.")
-                except Exception as e:
-                    print(f"  ❌ ERROR: Could not save profile for {customer_firestore_id}. Reason: {e}")
-            else:
-                print(f"  INFO: Not enough historical data to create a profile for {customer_firestore_id}.")            
-            print(f"--- ✅ Targeted Sync Complete for {nessie_customer_id}. Synced {total_synced_transactions} transactions. ---")
-            return customer_firestore_id
+                    await asyncio.to_thread(save_synced_profile, customer_firestore_id, e.committed, after_failure=True)
+                except Exception as fold_error:
+                    print(f"  ❌ ERROR: Could not fold the transactions synced before the failure. Reason: {fold_error}")
+            raise
+        print(f"  -> Created {result['transactions_created']} new transactions, skipped {result['transactions_skipped']} existing.")
+        print(f"--- ✅ Targeted Sync Complete for {nessie_customer_id}. Synced {result['transactions_fetched']} transactions. ---")
+        return customer_firestore_id
 
     except Exception as e:
-        print(f"  ❌ An unexpected error occurred during sync for {nessie_customer_id}: {e}")
-        return None
-    
+        print(f"  ❌ Sync failed for {nessie_customer_id}: {getattr(e, 'detail', None) or e}")
+        raise
+
+async def run_sync_job(nessie_customer_id: str, profile_mode: str = None, profile_path: str = None):
+    """
+    run_customer_sync, accounted in the metrics as the sync_jobs job's 'sync' stage. With a
+    profile_mode the sync runs inside a capture written to profile_path; if another capture
+    is running the job's profile_file is set to 'busy' and the sync runs unprofiled.
+    """
+    if profile_mode is None:
+        return await sync_stage(nessie_customer_id)
+    start = time.perf_counter()
+    with capture(profile_mode, profile_path) as running:
+        if not running and current_job.get() is not None:
+            current_job.get().details['profile_file'] = 'busy'
+        try:
+            return await sync_stage(nessie_customer_id)
+        finally:
+            if running:
+                print(f"  🔬 Profiled sync job for {nessie_customer_id} ({profile_mode}, {time.perf_counter() - start:.3f}s) -> {profile_path}")
+
+async def sync_stage(nessie_customer_id: str):
+    with stage('sync_jobs', 'sync') as scope:
+        customer_firestore_id = await run_customer_sync(nessie_customer_id)
+        scope.count()
+        return customer_firestore_id
+
+# Customer syncs run here, off the request path, with one job per customer at a time
+sync_jobs = JobQueue(run_sync_job)
+
+@app.post("/sync/customers/{nessie_customer_id}", status_code=202)
+async def sync_single_customer_by_nessie_id(nessie_customer_id: str, request: Request):
+    """
+    Queues a sync of the customer's records, accounts, transactions and profile, and
+    returns its job right away; poll GET /sync/jobs/{job_id} for the outcome. While a
+    sync of the same customer is queued or running, that job is returned instead.
+    Sent with X-Profile (when PROFILING_ENABLED=1), the job itself is profiled and its
+    status names the capture in profile_file, for GET /profiles/{file_name}.
+    """
+    profile_mode = requested_mode(request.scope['headers'], request.scope['query_string']) if PROFILING_ENABLED else None
+    profile_path = capture_path(f"sync-{nessie_customer_id}", profile_mode) if profile_mode else None
+    try:
+        job, created = sync_jobs.submit(nessie_customer_id, nessie_customer_id, profile_mode, profile_path)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Sync queue is full, retry later: {e}")
+    if created and profile_mode:
+        job.details.update(profile_mode=profile_mode, profile_file=os.path.basename(profile_path))
+    return {**job.to_dict(), "deduplicated": not created, "status_url": f"/sync/jobs/{job.id}"}
+
+@app.get("/sync/jobs/{job_id}", status_code=200)
+async def get_sync_job(job_id: str):
+    """The status of a sync job: queued, running, succeeded (result is the customer's Firestore ID) or failed."""
+    job = sync_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown sync job (finished jobs are only kept for a while).")
+    return job.to_dict()
+
+@app.get("/sync/jobs", status_code=200)
+async def get_sync_job_stats():
+    """Counters for the sync job queue."""
+    return sync_jobs.stats()
+
 @app.get("/customers/{customer_firestore_id}/analysis", status_code=200)
-def get_customer_approval_info(customer_firestore_id: str):
+async def get_customer_approval_info(customer_firestore_id: str):
     """
     Retrieves all transactions for a given customer from Firestore.
     The customer ID must be the Firestore document ID, not the Nessie ID.
     """
+    # Served from the in-process cache when possible; syncs and the nightly job invalidate it
+    cached = profile_cache.get(customer_firestore_id)
+    if cached is not MISSING:
+        return cached
+    # On a miss, concurrent requests for the same customer share one load. The key includes
+    # the cache generation, so requests after a sync don't join a load that started before it.
+    generation = profile_cache.generation(customer_firestore_id)
+    return await single_flight.do(('analysis', customer_firestore_id, generation),
+                                  lambda: load_customer_analysis(customer_firestore_id, generation))
+
+async def load_customer_analysis(customer_firestore_id: str, generation: int):
+    """
+    Reads the analysis result from Firestore and caches it, unless a sync invalidated
+    it since `generation` (taken before the read) was current.
+    """
     try:
-        # 1. Validate that the customer exists in Firestore
-        customer_doc = db.collection('users').document(customer_firestore_id).get()
-        if not customer_doc.exists:
+        # 1. Read the customer, their accounts and their stored profile concurrently
+        (customer_exists, account_ids), profile_doc = await asyncio.gather(
+            lookup_customer_async(customer_firestore_id),
+            adb.collection('financial_profiles').document(customer_firestore_id).get(),
+        )
+
+        # 2. Validate that the customer exists in Firestore
+        if not customer_exists:
             raise HTTPException(status_code=404, detail="Customer not found in Firestore.")
 
-        # 2. Find all accounts belonging to this customer
-        accounts_query = db.collection('accounts').where('customer_firestore_id', '==', customer_firestore_id).stream()
-        
-        account_ids = [account.id for account in accounts_query]
-
         # 3. If no accounts are found, return an empty list
         if not account_ids:
+            profile_cache.set(customer_firestore_id, [], generation)
             return []
 
         # Note: Firestore 'in' queries are limited to 30 items.
@@ -210,9 +368,10 @@ def get_customer_approval_info(customer_firestore_id: str):
         if len(account_ids) > 30:
             raise HTTPException(status_code=400, detail="Query failed: Customer has more than 30 accounts, which exceeds the query limit.")
 
-        # 4. Find all transactions linked to these accounts using an 'in' query
-        dat = db.collection('financial_profiles').document(customer_firestore_id).get().get('final_adjusted_fcf')
+        # 4. Return the predicted free cash flow from the stored profile
+        dat = profile_doc.get('final_adjusted_fcf')
         
+        profile_cache.set(customer_firestore_id, dat, generation)
         return dat
 
     except HTTPException as e:
@@ -220,38 +379,195 @@ def get_customer_approval_info(customer_firestore_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
 
-@app.get("/customers/{customer_firestore_id}/purchases/recent", status_code=200)
-def get_recent_transactions(customer_firestore_id: str):
+class BatchAnalysisRequest(BaseModel):
+    customer_ids: list[str] = Field(min_length=1, max_length=ANALYSIS_BATCH_MAX_CUSTOMERS,
+                                    description="Firestore customer document IDs.")
+
+def invalid_document_id(document_id: str):
+    """Why Firestore would reject document_id as a document ID, or None if it's valid."""
+    if not document_id or document_id in ('.', '..'):
+        return "Customer ID must not be empty, '.' or '..'."
+    if '/' in document_id:
+        return "Customer ID must not contain '/'."
+    if document_id.startswith('__') and document_id.endswith('__'):
+        return "Customer ID must not match __.*__ (reserved by Firestore)."
+    if len(document_id.encode()) > 1500:
+        return "Customer ID must be at most 1500 bytes."
+    return None
+
+async def count_accounts_async(customer_firestore_ids: list[str]) -> dict:
+    """Returns {customer_id: number of accounts}, using one 'in' query per 30 customers."""
+    async def count_chunk(chunk):
+        query = adb.collection('accounts').where('customer_firestore_id', 'in', chunk).select(['customer_firestore_id'])
+        return [account.get('customer_firestore_id') async for account in query.stream()]
+
+    chunks = [customer_firestore_ids[i:i + FIRESTORE_IN_LIMIT] for i in range(0, len(customer_firestore_ids), FIRESTORE_IN_LIMIT)]
+    counts = dict.fromkeys(customer_firestore_ids, 0)
+    for owners in await asyncio.gather(*(count_chunk(chunk) for chunk in chunks)):
+        for owner in owners:
+            counts[owner] += 1
+    return counts
+
+@app.post("/customers/analysis/batch", status_code=200)
+async def get_batch_approval_info(request: BatchAnalysisRequest):
     """
-    Retrieves the last three months of transactions for a given customer.
+    The analysis result of many customers at once. Users and profiles are read with
+    batched multi-document gets and accounts with 'in' queries, instead of three round
+    trips per customer. Returns {"results": {id: result}, "errors": {id: {"status_code",
+    "detail"}}}, where each result or error is what GET /customers/{id}/analysis gives.
+    An ID Firestore can't look up (e.g. empty, or containing '/') gets a 400 error.
     """
-    try:
-        # 1. Validate customer and find their accounts (same as above)
-        customer_doc = db.collection('users').document(customer_firestore_id).get()
-        if not customer_doc.exists:
-            raise HTTPException(status_code=404, detail="Customer not found in Firestore.")
-
-        accounts_query = db.collection('accounts').where('customer_firestore_id', '==', customer_firestore_id).stream()
-        account_ids = [account.id for account in accounts_query]
+    customer_ids = list(dict.fromkeys(request.customer_ids))
+    results, errors = {}, {}
+    for customer_id in customer_ids:
+        problem = invalid_document_id(customer_id)
+        if problem:
+            errors[customer_id] = {"status_code": 400, "detail": problem}
+    customer_ids = [customer_id for customer_id in customer_ids if customer_id not in errors]
+
+    # Served from the in-process cache when possible, like the single-customer endpoint
+    for customer_id in customer_ids:
+        cached = profile_cache.get(customer_id)
+        if cached is not MISSING:
+            results[customer_id] = cached
+    pending = [customer_id for customer_id in customer_ids if customer_id not in results]
+    if not pending:
+        return {"results": results, "errors": errors}
+    generations = {customer_id: profile_cache.generation(customer_id) for customer_id in pending}
 
-        if not account_ids:
-            return ["no accounts found"]
+    try:
+        # 1. Read the customers, their account counts and their stored profiles concurrently
+        async def get_all(collection_name: str, field_paths=None):
+            refs = [adb.collection(collection_name).document(customer_id) for customer_id in pending]
+            return {snapshot.id: snapshot async for snapshot in adb.get_all(refs, field_paths=field_paths)}
+
+        users, account_counts, profiles = await asyncio.gather(
+            get_all('users', field_paths=[]),
+            count_accounts_async(pending),
+            get_all('financial_profiles', field_paths=['final_adjusted_fcf']),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
 
-        if len(account_ids) > 30:
-            raise HTTPException(status_code=400, detail="Query failed: Customer has more than 30 accounts.")
+    # 2. Apply the single-customer endpoint's checks to each customer
+    for customer_id in pending:
+        if not users[customer_id].exists:
+            errors[customer_id] = {"status_code": 404, "detail": "Customer not found in Firestore."}
+        elif account_counts[customer_id] > 30:
+            errors[customer_id] = {"status_code": 400, "detail": "Query failed: Customer has more than 30 accounts, which exceeds the query limit."}
+        else:
+            result = profiles[customer_id].get('final_adjusted_fcf') if account_counts[customer_id] else []
+            profile_cache.set(customer_id, result, generations[customer_id])
+            results[customer_id] = result
+    return {"results": results, "errors": errors}
+
+def encode_purchases_cursor(transaction: dict) -> str:
+    """An opaque cursor pointing just past a returned purchase: its timestamp and document id."""
+    position = {'ts': transaction[TRANSACTION_TIMESTAMP_FIELD].isoformat(), 'id': transaction['transaction_firestore_id']}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_purchases_cursor(cursor: str):
+    """The (timestamp, document id) a cursor points past; raises a 400 for anything malformed."""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(position['ts']), position['id']
+    except (ValueError, TypeError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
 
-        # 2. Calculate the start date for the query (3 months ago)
-        start_date = date.today() - relativedelta(months=3)
-        start_datetime = datetime.combine(start_date, datetime.min.time()) # Set time to 00:00:00
+async def fetch_recent_purchases_page(customer_firestore_id: str, since: datetime, after, limit: int):
+    """
+    One page of the customer's purchases dated from `since` on, ordered by their typed
+    timestamp then document id, resuming past `after`. Returns the page and the
+    position to resume from, or None when there is nothing more.
+    In Firestore this needs a composite index on
+    (customer_firestore_id, type, txn_ts, __name__).
+    """
+    # One extra row tells whether another page follows
+    if store_enabled():
+        rows = await asyncio.to_thread(
+            read_or_backfill, read_recent_purchases, db, customer_firestore_id, since, after, limit + 1
+        )
+    else:
+        query = (
+            adb.collection('transactions')
+            .where('customer_firestore_id', '==', customer_firestore_id)
+            .where('type', '==', 'purchase')
+            .where(TRANSACTION_TIMESTAMP_FIELD, '>=', since)
+            .order_by(TRANSACTION_TIMESTAMP_FIELD)
+            .order_by('__name__')
+            .limit(limit + 1)
+        )
+        if after:
+            query = query.start_after({
+                TRANSACTION_TIMESTAMP_FIELD: after[0],
+                '__name__': adb.collection('transactions').document(after[1]),
+            })
+        rows = [{**t.to_dict(), 'transaction_firestore_id': t.id} async for t in query.stream()]
+
+    page = rows[:limit]
+    if len(rows) <= limit:
+        return page, None
+    return page, (page[-1][TRANSACTION_TIMESTAMP_FIELD], page[-1]['transaction_firestore_id'])
+
+def recent_purchases_start() -> datetime:
+    """The start of the recent purchases range: 3 months ago, at midnight UTC."""
+    start_date = date.today() - relativedelta(months=3)
+    return datetime.combine(start_date, datetime.min.time(), tzinfo=timezone.utc)
+
+async def check_customer_for_purchases(customer_firestore_id: str) -> list:
+    """Validates the customer and returns their account IDs, raising the endpoint's 404/400."""
+    customer_exists, account_ids = await lookup_customer_async(customer_firestore_id)
+    if not customer_exists:
+        raise HTTPException(status_code=404, detail="Customer not found in Firestore.")
+    if len(account_ids) > 30:
+        raise HTTPException(status_code=400, detail="Query failed: Customer has more than 30 accounts.")
+    return account_ids
+
+async def load_recent_purchases_page(customer_firestore_id: str, after, limit: int) -> dict:
+    account_ids = await check_customer_for_purchases(customer_firestore_id)
+    if not account_ids:
+        return {"transactions": [], "next_cursor": None}
+    page, position = await fetch_recent_purchases_page(customer_firestore_id, recent_purchases_start(), after, limit)
+    next_cursor = encode_purchases_cursor(page[-1]) if position else None
+    return {"transactions": page, "next_cursor": next_cursor}
 
-        # 3. Query transactions using the date range and order them
-        transactions_query = db.collection('transactions').where('customer_firestore_id', '==', customer_firestore_id).where('purchase_date', '>=', str(start_datetime)).stream()
-        
-        # 4. Format and return the results
-        recent_transactions = [
-            {**t.to_dict(), 'transaction_firestore_id': t.id} for t in transactions_query
-        ]
-        return recent_transactions
+@app.get("/customers/{customer_firestore_id}/purchases/recent", status_code=200)
+async def get_recent_transactions(
+    customer_firestore_id: str,
+    limit: int = Query(RECENT_PURCHASES_PAGE_SIZE, ge=1, le=RECENT_PURCHASES_MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    format: Literal['json', 'ndjson'] = 'json',
+):
+    """
+    Retrieves the last three months of purchases for a given customer, oldest first.
+    Returns a page of at most `limit` purchases and a `next_cursor` to pass back for
+    the next one (null on the last page). With format=ndjson, every purchase from the
+    cursor on is streamed as one JSON object per line, read `limit` at a time.
+    """
+    try:
+        after = decode_purchases_cursor(cursor) if cursor else None
+
+        # Stream every page as NDJSON; only the customer check is shared with concurrent requests
+        if format == 'ndjson':
+            account_ids = await check_customer_for_purchases(customer_firestore_id)
+            start_datetime = recent_purchases_start()
+
+            async def lines(position):
+                if not account_ids: return
+                while True:
+                    page, position = await fetch_recent_purchases_page(customer_firestore_id, start_datetime, position, limit)
+                    for transaction in page:
+                        yield json.dumps(jsonable_encoder(transaction)) + '\n'
+                    if position is None: return
+            return StreamingResponse(lines(after), media_type='application/x-ndjson')
+
+        # Or return one page with a cursor to the next; concurrent requests for the same page share
+        # one read, unless a sync invalidated the customer in between (see lookup_customer_async)
+        generation = profile_cache.generation(customer_firestore_id)
+        return await single_flight.do(
+            ('purchases_recent', customer_firestore_id, limit, cursor, generation),
+            lambda: load_recent_purchases_page(customer_firestore_id, after, limit),
+        )
 
     except HTTPException as e:
         raise e
@@ -259,7 +575,59 @@ def get_recent_transactions(customer_firestore_id: str):
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
 
 
+# --- 6. Profile Cache Management ---
+
+class CacheInvalidationRequest(BaseModel):
+    customer_ids: list[str] | None = Field(default=None, description="Customers to drop; omit to clear the whole cache.")
+
+@app.get("/cache/stats", status_code=200)
+async def get_cache_stats():
+    """
+    Reports hit/miss counters for the analysis endpoint's profile cache, how many
+    requests were coalesced onto another's in-flight read, and the on-disk Nessie
+    response cache's counters (null when NESSIE_CACHE_PATH isn't set).
+    """
+    nessie_cache = get_response_cache()
+    return {
+        **profile_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "nessie_cache": await asyncio.to_thread(nessie_cache.stats) if nessie_cache else None,
+    }
+
+@app.post("/cache/profiles/invalidate", status_code=200)
+async def invalidate_profile_cache(request: CacheInvalidationRequest):
+    """
+    Drops cached analysis results. Called by the nightly job after it rewrites
+    financial profiles, since it runs in a separate process.
+    """
+    # Loads keyed by the old generations stop being joined, and don't cache their results
+    if request.customer_ids is None:
+        profile_cache.clear()
+        return {"invalidated": "all"}
+    return {"invalidated": profile_cache.invalidate(*request.customer_ids)}
+
+# --- 7. Metrics ---
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus text-format metrics: request counts and latency per route, Firestore
+    operations per request, Nessie calls by endpoint and status, and sync job stages.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/profiles/{file_name}", status_code=200)
+async def get_profile(file_name: str):
+    """
+    Downloads a capture named in a profiled request's X-Profile-File header: folded
+    stacks (.folded) for flamegraph tools, or pstats (.prof) for snakeviz and pstats.
+    """
+    path = os.path.join(PROFILE_DIR, os.path.basename(file_name))
+    if not PROFILING_ENABLED or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return FileResponse(path, media_type="text/plain" if path.endswith('.folded') else "application/octet-stream")
 
-# --- 6. Run the Application ---
+# --- 8. Run the Application ---
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,113 @@
+# benchImportTime.py
+"""
+Tracks the API's cold-start budget: how long `import api` takes, which direct
+imports cost the most, and that importing it stays side-effect free.
+
+Each run is a fresh interpreter with `python -X importtime -c "import api"`
+(after one warm-up run, so bytecode is cached); the median of the runs is
+compared with the budget. It also fails if the import loads a module that
+should be deferred to first use (pandas, numpy, pyarrow, Firebase, requests,
+uvicorn) or creates a database client.
+
+Run from backend_scripts/:
+    python -m benchmarks.benchImportTime
+    python -m benchmarks.benchImportTime --runs 10 --budget-ms 500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Median `import api` time allowed, in milliseconds. Pulling the analytics stack back
+# into the import path costs about 300ms on its own, so this catches it.
+API_IMPORT_BUDGET_MS = 650
+# Imported on first use, never at startup.
+DEFERRED_MODULES = ('pandas', 'numpy', 'pyarrow', 'firebase_admin', 'google.cloud.firestore', 'requests', 'uvicorn')
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SIDE_EFFECT_CHECK = f"""
+import json, sys
+import {{module}}
+import storage
+print(json.dumps({{{{
+    'loaded': [m for m in {DEFERRED_MODULES!r} if m in sys.modules],
+    'client_created': storage._client is not None,
+}}}}))
+"""
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    # The default backend is Firestore, so a client created at import would try to reach it
+    env = {**os.environ, 'STORAGE_BACKEND': 'firestore'}
+    result = subprocess.run([sys.executable, *args], cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit status {result.returncode}"
+        print(f"❌ `python {' '.join(args)}` failed: {error}")
+        sys.exit(1)
+    return result
+
+
+def parse_importtime(stderr: str) -> list[tuple[int, str, int]]:
+    """(depth, module, cumulative microseconds) for each line of -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line: continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((depth, name.strip(), int(cumulative)))
+    return rows
+
+
+def measure(module: str) -> tuple[float, dict]:
+    """(total ms, {direct import: ms}) for one fresh `import module`."""
+    rows = parse_importtime(run_python('-X', 'importtime', '-c', f'import {module}').stderr)
+    total = next(cumulative for depth, name, cumulative in rows if depth == 0 and name == module)
+    # A module's direct imports are the depth-1 lines just before it
+    direct, index = {}, len(rows) - 1
+    while rows[index][1] != module: index -= 1
+    for depth, name, cumulative in reversed(rows[:index]):
+        if depth == 0: break
+        if depth == 1: direct[name] = cumulative / 1000
+    return total / 1000, direct
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='api')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=API_IMPORT_BUDGET_MS)
+    parser.add_argument('--top', type=int, default=10, help='Slowest direct imports to list.')
+    args = parser.parse_args()
+
+    measure(args.module)  # warm-up: compile and cache bytecode
+    runs = [measure(args.module) for _ in range(args.runs)]
+    totals = [total for total, _ in runs]
+    median = statistics.median(totals)
+
+    print(f"import {args.module}: median {median:.1f} ms over {args.runs} runs "
+          f"(min {min(totals):.1f}, max {max(totals):.1f}); budget {args.budget_ms:.0f} ms")
+    direct = {name: statistics.median(r[1].get(name, 0.0) for r in runs) for name in runs[0][1]}
+    print(f"\n{'direct import':<32}{'ms':>10}")
+    for name, ms in sorted(direct.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<32}{ms:>10.1f}")
+
+    side_effects = json.loads(run_python('-c', _SIDE_EFFECT_CHECK.format(module=args.module)).stdout)
+    failures = []
+    if median > args.budget_ms:
+        failures.append(f"median import time {median:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    if side_effects['loaded']:
+        failures.append(f"importing {args.module} loads deferred modules: {', '.join(side_effects['loaded'])}")
+    if side_effects['client_created']:
+        failures.append(f"importing {args.module} creates a database client")
+
+    if failures:
+        print('\n' + '\n'.join(f"❌ {failure}" for failure in failures))
+        sys.exit(1)
+    print(f"\n✅ Within budget; no deferred modules loaded and no clients created.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# benchNessieFetch.py
+"""
+Compares sequential per-account Nessie fetching against the concurrent fetcher.
+
+Run from backend_scripts/:
+    python -m benchmarks.benchNessieFetch --accounts 50 --latency 0.05
+"""
+import argparse
+import time
+
+import requests
+
+from benchmarks.fakeNessie import FakeNessieServer, build_dataset
+from nessieClient import TRANSACTION_ENDPOINTS, fetch_account_transactions
+
+
+def make_get_request(base_url: str):
+    def get_request(endpoint: str):
+        response = requests.get(f"{base_url}{endpoint}?key=bench", timeout=15)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+    return get_request
+
+
+def fetch_sequential(account_ids, get_request):
+    """The pre-existing access pattern: three GETs per account, one at a time."""
+    results = {}
+    for account_id in account_ids:
+        results[account_id] = []
+        for endpoint, txn_type in TRANSACTION_ENDPOINTS.items():
+            results[account_id] += [{**t, 'type': txn_type} for t in get_request(f"/accounts/{account_id}/{endpoint}") or []]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=50, help='Number of accounts to fetch.')
+    parser.add_argument('--latency', type=float, default=0.05, help='Artificial server delay per request, in seconds.')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 8, 16, 32])
+    args = parser.parse_args()
+
+    dataset = build_dataset(num_customers=args.accounts, accounts_per_customer=1)
+    account_ids = [acc['_id'] for acc in dataset['accounts']]
+
+    with FakeNessieServer(dataset, latency=args.latency) as server:
+        get_request = make_get_request(server.base_url)
+
+        start = time.perf_counter()
+        baseline = fetch_sequential(account_ids, get_request)
+        sequential_time = time.perf_counter() - start
+        print(f"{len(account_ids)} accounts, {len(account_ids) * len(TRANSACTION_ENDPOINTS)} requests, "
+              f"{args.latency * 1000:.0f} ms simulated latency")
+        print(f"{'mode':<16}{'seconds':>10}{'speedup':>10}")
+        print(f"{'sequential':<16}{sequential_time:>10.2f}{1.0:>10.1f}x")
+
+        for concurrency in args.concurrency:
+            start = time.perf_counter()
+            result = fetch_account_transactions(account_ids, get_request, max_concurrency=concurrency)
+            elapsed = time.perf_counter() - start
+            assert result == baseline, "concurrent fetch returned different transactions"
+            print(f"{f'concurrent x{concurrency}':<16}{elapsed:>10.2f}{sequential_time / elapsed:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
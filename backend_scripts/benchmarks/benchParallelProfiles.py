@@ -0,0 +1,49 @@
+# benchParallelProfiles.py
+"""
+Measures how the nightly analysis stage (profileEngine.analyze_customers)
+scales with the number of worker processes.
+
+Run from backend_scripts/:
+    python -m benchmarks.benchParallelProfiles --customers 400 --transactions 1000 --workers 1 2 4 8
+"""
+import argparse
+import contextlib
+import os
+import random
+import time
+
+from benchmarks.benchProfile import generate_transactions
+from profileEngine import analyze_customers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=400)
+    parser.add_argument('--transactions', type=int, default=1000, help='Transactions per customer.')
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='Worker counts to try (default: 1, 2, 4, ... up to the CPU count).')
+    parser.add_argument('--chunk-size', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    worker_counts = args.workers or sorted({1, *(2 ** i for i in range(1, cpu_count.bit_length())), cpu_count})
+
+    rng = random.Random(args.seed)
+    customers = [(f"cust{i:06d}", generate_transactions(rng, args.transactions)) for i in range(args.customers)]
+
+    print(f"{args.customers} customers x {args.transactions} transactions on {cpu_count} CPUs")
+    print(f"{'workers':<10}{'seconds':>10}{'customers/s':>14}{'speedup':>10}")
+    baseline = None
+    for workers in worker_counts:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            results = list(analyze_customers(iter(customers), workers=workers, chunk_size=args.chunk_size))
+            elapsed = time.perf_counter() - start
+        assert len(results) == len(customers)
+        baseline = baseline or elapsed
+        print(f"{workers:<10}{elapsed:>10.2f}{len(customers) / elapsed:>14.1f}{baseline / elapsed:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# benchProfile.py
+"""
+Checks the vectorized calculate_historical_profile against the original
+row-by-row implementation on generated data, and times both. Also checks the
+single-pass compute_financial_profile against the old two-step path
+(historical profile, then a separate outlier pass).
+
+Run from backend_scripts/:
+    python -m benchmarks.benchProfile --customers 200 --transactions 2000
+"""
+import argparse
+import calendar
+import contextlib
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pandas as pd
+from dateutil.parser import parse
+from dateutil.rrule import rrule, MONTHLY
+
+from profileEngine import adjust_for_current_month_outliers, calculate_historical_profile, compute_financial_profile
+
+
+def reference_historical_profile(transactions: list[dict]):
+    """The original dict-and-dateutil implementation, kept as the parity baseline."""
+    if not transactions: return None, None
+
+    monthly_data = defaultdict(lambda: {'income': 0.0, 'expenses': 0.0})
+    valid_dates = []
+
+    for t in transactions:
+        date_str = t.get('purchase_date') or t.get('transaction_date') or t.get('payment_date')
+        if not date_str: continue
+        try:
+            parsed_date = parse(date_str)
+            valid_dates.append(parsed_date)
+            month_key = parsed_date.strftime('%Y-%m')
+            amount = t.get('amount', 0)
+            if t.get('type') == 'deposit': monthly_data[month_key]['income'] += amount
+            elif t.get('type') in ['withdrawal', 'purchase']: monthly_data[month_key]['expenses'] += amount
+        except (ValueError, TypeError): continue
+
+    if not valid_dates: return None, None
+
+    start_date, end_date = min(valid_dates), max(valid_dates)
+    date_range = [dt.strftime('%Y-%m') for dt in rrule(MONTHLY, dtstart=start_date, until=end_date)]
+
+    income_series = pd.Series([monthly_data[m]['income'] for m in date_range], index=pd.to_datetime(date_range))
+    expenses_series = pd.Series([monthly_data[m]['expenses'] for m in date_range], index=pd.to_datetime(date_range))
+
+    today = datetime.now()
+    if not income_series.empty:
+        last_data_month = income_series.index[-1]
+        if last_data_month.year == today.year and last_data_month.month == today.month:
+            income_series = income_series[:-1]
+            expenses_series = expenses_series[:-1]
+
+    if len(income_series) < 2: return None, None
+
+    monthly_fcf_series = income_series - expenses_series
+    ewma_series = monthly_fcf_series.ewm(span=3, adjust=False).mean()
+    predicted_fcf = ewma_series.iloc[-1]
+
+    historical_profile = {
+        "ewma_predicted_fcf": round(float(predicted_fcf), 2),
+        "mean_free_cash_flow": round(float(monthly_fcf_series.mean()), 2),
+        "std_dev_free_cash_flow": round(float(monthly_fcf_series.std(ddof=0)), 2),
+        "months_analyzed": len(income_series),
+    }
+    return historical_profile, expenses_series
+
+
+def generate_transactions(rng: random.Random, count: int) -> list[dict]:
+    """
+    Paychecks, rent and a spread of purchases over a random window ending today,
+    plus a few malformed rows (missing or unparseable dates, odd types).
+    """
+    end = datetime.now()
+    start = end - timedelta(days=rng.randint(20, 900))
+    span = (end - start).days
+    transactions = []
+    for i in range(count):
+        txn_date = (start + timedelta(days=rng.randint(0, span))).strftime('%Y-%m-%d')
+        kind = rng.random()
+        if kind < 0.15:
+            transactions.append({'_id': f"d{i}", 'type': 'deposit', 'transaction_date': txn_date,
+                                 'amount': round(rng.uniform(1200, 1800), 2), 'description': 'Paycheck Deposit'})
+        elif kind < 0.25:
+            transactions.append({'_id': f"w{i}", 'type': 'withdrawal', 'transaction_date': txn_date,
+                                 'amount': rng.choice([1200.0, 485.75]), 'description': 'Monthly Rent Payment'})
+        else:
+            transactions.append({'_id': f"p{i}", 'type': 'purchase', 'purchase_date': txn_date,
+                                 'amount': round(rng.uniform(5, 150 if rng.random() < 0.98 else 3000), 2),
+                                 'description': 'Groceries'})
+    # The earliest transaction's day anchors the month range; make sure late anchors occur.
+    anchor_month = (start.replace(day=1) - timedelta(days=1))
+    anchor_day = min(rng.choice([1, 15, 29, 30, 31]), calendar.monthrange(anchor_month.year, anchor_month.month)[1])
+    transactions.append({'_id': 'anchor', 'type': 'purchase', 'amount': 10.0,
+                         'purchase_date': anchor_month.replace(day=anchor_day).strftime('%Y-%m-%d')})
+    if rng.random() < 0.3:
+        # A large current-month expense, so the outlier adjustment path is exercised.
+        transactions.append({'_id': 'outlier', 'type': 'purchase', 'amount': round(rng.uniform(20000, 60000), 2),
+                             'purchase_date': end.strftime('%Y-%m-%d'), 'description': 'Used Car'})
+    transactions += [
+        {'_id': 'nodate', 'type': 'purchase', 'amount': 12.5},
+        {'_id': 'baddate', 'type': 'purchase', 'amount': 12.5, 'purchase_date': 'not a date'},
+        {'_id': 'transfer', 'type': 'transfer', 'amount': 99.0, 'transaction_date': start.strftime('%Y-%m-%d')},
+        {'_id': 'payment', 'type': 'withdrawal', 'amount': 40.0, 'payment_date': start.strftime('%m/%d/%Y')},
+    ]
+    rng.shuffle(transactions)
+    return transactions
+
+
+def assert_same_profile(expected, actual):
+    expected_profile, expected_expenses = expected
+    actual_profile, actual_expenses = actual
+    assert expected_profile == actual_profile, f"{expected_profile} != {actual_profile}"
+    if expected_expenses is None:
+        assert actual_expenses is None
+    else:
+        pd.testing.assert_series_equal(expected_expenses, actual_expenses, check_freq=False, check_index_type=False)
+
+
+def two_step_final_profile(transactions: list[dict]):
+    profile, expenses = reference_historical_profile(transactions)
+    return adjust_for_current_month_outliers(transactions, expenses, profile) if profile else None
+
+
+def fused_final_profile(transactions: list[dict]):
+    return compute_financial_profile(transactions).final_profile
+
+
+def timed(fn, datasets):
+    # The profile code prints progress lines; keep them out of the report.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        results = [fn(transactions) for transactions in datasets]
+        return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--transactions', type=int, default=2000, help='Transactions per customer.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    datasets = [generate_transactions(rng, args.transactions) for _ in range(args.customers)]
+
+    reference_time, reference_results = timed(reference_historical_profile, datasets)
+    vectorized_time, vectorized_results = timed(calculate_historical_profile, datasets)
+    for expected, actual in zip(reference_results, vectorized_results):
+        assert_same_profile(expected, actual)
+
+    print(f"{args.customers} customers x {args.transactions} transactions: outputs identical")
+    print(f"{'implementation':<16}{'seconds':>10}{'ms/customer':>14}")
+    for name, elapsed in (('reference', reference_time), ('vectorized', vectorized_time)):
+        print(f"{name:<16}{elapsed:>10.2f}{elapsed / args.customers * 1000:>14.2f}")
+    print(f"speedup: {reference_time / vectorized_time:.1f}x")
+
+    # The old outlier pass raised on unparseable dates, so compare without that row.
+    pipeline_datasets = [[t for t in transactions if t['_id'] != 'baddate'] for transactions in datasets]
+    two_step_time, two_step_results = timed(two_step_final_profile, pipeline_datasets)
+    fused_time, fused_results = timed(fused_final_profile, pipeline_datasets)
+    for expected, actual in zip(two_step_results, fused_results):
+        assert expected == actual, f"{expected} != {actual}"
+
+    print(f"\nfinal profile (history + outliers): outputs identical")
+    for name, elapsed in (('two-step', two_step_time), ('single-pass', fused_time)):
+        print(f"{name:<16}{elapsed:>10.2f}{elapsed / args.customers * 1000:>14.2f}")
+    print(f"speedup: {two_step_time / fused_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
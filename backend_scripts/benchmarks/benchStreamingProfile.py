@@ -0,0 +1,135 @@
+# benchStreamingProfile.py
+"""
+Checks the streaming profile (running EWMA, Welford mean/variance and the
+expense quantile summary) against the batch path that recomputes everything
+over the whole series, and times closing one month with each.
+
+1. Statistics: random monthly series, folded month by month, against pandas.
+   Quartiles must be exact up to QUANTILE_SUMMARY_SIZE months; beyond that the
+   summary is approximate and the largest error is reported.
+2. Profiles: generated customers synced in random chunks into a rollup, against
+   compute_financial_profile over all their transactions (within a cent).
+
+Run from backend_scripts/:
+    python -m benchmarks.benchStreamingProfile --customers 200 --transactions 2000
+"""
+import argparse
+import contextlib
+import math
+import os
+import random
+import time
+
+import pandas as pd
+
+from benchmarks.benchProfile import generate_transactions
+from profileEngine import (
+    QUANTILE_SUMMARY_SIZE, StreamingProfile, build_monthly_rollup, compute_financial_profile, empty_rollup,
+    merge_monthly_rollups, profile_from_rollup,
+)
+
+# Relative tolerance for the running statistics against pandas.
+STATS_TOLERANCE = 1e-9
+# Profiles are rounded to cents, so a last-bit difference can move a value by one cent.
+PROFILE_TOLERANCE = 0.01 + 1e-9
+
+
+def close(expected: float, actual: float, tolerance: float = STATS_TOLERANCE) -> bool:
+    return math.isclose(expected, actual, rel_tol=tolerance, abs_tol=tolerance)
+
+
+def check_statistics(rng: random.Random, series_count: int, max_months: int) -> float:
+    """Folds random series into StreamingProfile and compares every step with pandas; returns the worst approximate-quartile error."""
+    worst_quartile_error = 0.0
+    for _ in range(series_count):
+        months = rng.randint(2, max_months)
+        income = [rng.uniform(1500, 6000) for _ in range(months)]
+        expenses = [rng.uniform(500, 5000) * (8 if rng.random() < 0.05 else 1) for _ in range(months)]
+        fcf = pd.Series(income) - pd.Series(expenses)
+        expected_ewma = fcf.ewm(span=3, adjust=False).mean()
+
+        state = StreamingProfile()
+        for i in range(months):
+            state.add_month(f"m{i}", income[i], expenses[i])
+            assert close(expected_ewma.iloc[i], state.ewma), f"ewma {expected_ewma.iloc[i]} != {state.ewma}"
+
+        assert close(fcf.mean(), state.mean), f"mean {fcf.mean()} != {state.mean}"
+        assert close(fcf.std(ddof=0), math.sqrt(state.m2 / state.months)), "std dev mismatch"
+
+        expense_series = pd.Series(expenses)
+        for q in (0.25, 0.75):
+            expected, actual = expense_series.quantile(q), state.expense_quantile(q)
+            if months <= QUANTILE_SUMMARY_SIZE:
+                assert close(expected, actual), f"q{q} {expected} != {actual} ({months} months)"
+            else:
+                iqr = expense_series.quantile(0.75) - expense_series.quantile(0.25)
+                worst_quartile_error = max(worst_quartile_error, abs(expected - actual) / iqr)
+    return worst_quartile_error
+
+
+def synced_rollup(rng: random.Random, transactions: list[dict]) -> dict:
+    """The rollup after syncing the transactions in random-sized chunks, as repeated syncs would."""
+    rollup, start = empty_rollup(), 0
+    while start < len(transactions):
+        size = rng.randint(1, max(1, len(transactions) // 3))
+        rollup = merge_monthly_rollups(rollup, build_monthly_rollup(transactions[start:start + size]))
+        start += size
+    return rollup
+
+
+def check_profiles(expected, actual):
+    assert (expected is None) == (actual is None), f"{expected} != {actual}"
+    if expected is None: return
+    assert expected.keys() == actual.keys(), f"{expected} != {actual}"
+    for key, value in expected.items():
+        assert abs(value - actual[key]) <= PROFILE_TOLERANCE, f"{key}: {value} != {actual[key]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--transactions', type=int, default=2000, help='Transactions per customer.')
+    parser.add_argument('--months', type=int, default=240, help='Longest random series in the statistics check.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    worst = check_statistics(rng, 500, args.months)
+    print(f"statistics: EWMA, mean and std dev within {STATS_TOLERANCE:g}; quartiles exact up to "
+          f"{QUANTILE_SUMMARY_SIZE} months, worst error beyond that {worst:.4f} x IQR")
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(args.customers):
+            transactions = [t for t in generate_transactions(rng, args.transactions) if t['_id'] != 'baddate']
+            rollup = synced_rollup(rng, transactions)
+            expected = compute_financial_profile(transactions).final_profile
+            check_profiles(expected, profile_from_rollup(rollup).final_profile)
+            check_profiles(expected, profile_from_rollup(rollup, streaming=False).final_profile)
+    print(f"profiles: {args.customers} customers x {args.transactions} transactions synced in chunks, "
+          f"streaming and batch within a cent of compute_financial_profile")
+
+    # Closing one month: fold it into the stored state vs recompute the whole series.
+    print(f"\n{'months':>8}{'batch ms':>12}{'streaming ms':>14}")
+    for months in (12, 60, 240):
+        rollup = {'months': {}, 'first_date': '2000-01-01T00:00:00', 'expense_amounts': {}}
+        for i in range(months):
+            key = f"{2000 + i // 12}-{i % 12 + 1:02d}"
+            rollup['months'][key] = {'income': rng.uniform(1500, 6000), 'expenses': rng.uniform(500, 5000)}
+        rollup['last_date'] = f"{key}-28T00:00:00"
+        repeats = 200
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                profile_from_rollup(rollup, streaming=False)
+            batch = (time.perf_counter() - start) / repeats
+            state = StreamingProfile()
+            start = time.perf_counter()
+            for _ in range(repeats):
+                state.add_month(key, 4000.0, 2500.0)
+                state.historical_profile(), state.outlier_fence()
+            streaming = (time.perf_counter() - start) / repeats
+        print(f"{months:>8}{batch * 1000:>12.3f}{streaming * 1000:>14.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+# fakeNessie.py
+"""
+A local stand-in for the Nessie API used by the benchmarks.
+
+Serves customers, accounts and per-account transactions from an in-memory
+dataset, with an optional artificial delay per request to mimic network wait,
+and accepts the POSTs generateUserData makes to create them.
+
+To serve a dataset file written by generateUserData, from backend_scripts/:
+    python -m benchmarks.fakeNessie --dataset customers.parquet --port 8001
+and point the other scripts at it with NESSIE_BASE_URL=http://127.0.0.1:8001.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+def build_dataset(num_customers: int, accounts_per_customer: int = 1, txns_per_endpoint: int = 20, seed: int = 0):
+    """Builds a small random dataset shaped like Nessie's JSON responses."""
+    rng = random.Random(seed)
+    customers, accounts, transactions = [], [], {}
+    start = date.today() - timedelta(days=365)
+    for c in range(num_customers):
+        customer_id = f"cust{c:06d}"
+        customers.append({'_id': customer_id, 'first_name': 'Bench', 'last_name': f"Customer{c}"})
+        for a in range(accounts_per_customer):
+            account_id = f"{customer_id}acct{a:02d}"
+            accounts.append({'_id': account_id, 'customer_id': customer_id, 'type': 'Checking',
+                             'nickname': 'Main Checking', 'balance': 1000, 'rewards': 0})
+            transactions[account_id] = {}
+            for endpoint, date_field in (('deposits', 'transaction_date'), ('purchases', 'purchase_date'),
+                                         ('withdrawals', 'transaction_date')):
+                transactions[account_id][endpoint] = [
+                    {'_id': f"{account_id}{endpoint[0]}{i:05d}", 'medium': 'balance',
+                     date_field: (start + timedelta(days=rng.randint(0, 364))).strftime('%Y-%m-%d'),
+                     'amount': round(rng.uniform(5.0, 1500.0), 2), 'description': endpoint}
+                    for i in range(txns_per_endpoint)
+                ]
+    return {'customers': customers, 'accounts': accounts, 'transactions': transactions}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class FakeNessieServer:
+    """Runs a threaded HTTP server answering the Nessie routes the sync code and generateUserData use."""
+
+    def __init__(self, dataset: dict, latency: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        self.dataset = dataset
+        self.latency = latency
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._customers = {c['_id']: c for c in dataset['customers']}
+        self._accounts_by_customer = {}
+        for account in dataset['accounts']:
+            self._accounts_by_customer.setdefault(account['customer_id'], []).append(account)
+        self._server = _Server((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def route(self, path: str):
+        """Returns the JSON payload for a path, or None for a 404."""
+        parts = [p for p in path.split('/') if p]
+        if parts == ['accounts']:
+            return self.dataset['accounts']
+        if len(parts) == 2 and parts[0] == 'customers':
+            return self._customers.get(parts[1])
+        if len(parts) == 3 and parts[0] == 'customers' and parts[2] == 'accounts':
+            return self._accounts_by_customer.get(parts[1], [])
+        if len(parts) == 3 and parts[0] == 'accounts':
+            return self.dataset['transactions'].get(parts[1], {}).get(parts[2])
+        return None
+
+    def create(self, path: str, payload: dict):
+        """Stores a POSTed object the way Nessie would and returns it, or None for a 404."""
+        parts = [p for p in path.split('/') if p]
+        obj = {'_id': uuid.uuid4().hex[:24], **payload}
+        with self._lock:
+            if parts == ['customers']:
+                self.dataset['customers'].append(obj)
+                self._customers[obj['_id']] = obj
+                return obj
+            if len(parts) == 3 and parts[0] == 'customers' and parts[2] == 'accounts' and parts[1] in self._customers:
+                obj['customer_id'] = parts[1]
+                self.dataset['accounts'].append(obj)
+                self._accounts_by_customer.setdefault(parts[1], []).append(obj)
+                self.dataset['transactions'][obj['_id']] = {'deposits': [], 'purchases': [], 'withdrawals': []}
+                return obj
+            if len(parts) == 3 and parts[0] == 'accounts' and parts[2] in self.dataset['transactions'].get(parts[1], {}):
+                obj.update({'status': 'pending', ('payee_id' if parts[2] == 'deposits' else 'payer_id'): parts[1]})
+                self.dataset['transactions'][parts[1]][parts[2]].append(obj)
+                return obj
+        return None
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without TCP_NODELAY each
+            # keep-alive request stalls on the client's delayed ACK.
+            disable_nagle_algorithm = True
+
+            def _begin(self):
+                with fake._lock:
+                    fake.request_count += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+            def _reply(self, status: int, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._begin()
+                payload = fake.route(urlparse(self.path).path)
+                if payload is None:
+                    self._reply(404, {'message': 'Not found'})
+                else:
+                    self._reply(200, payload)
+
+            def do_POST(self):
+                self._begin()
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    self._reply(400, {'code': 400, 'message': 'Invalid JSON'})
+                    return
+                created = fake.create(urlparse(self.path).path, payload)
+                if created is None:
+                    self._reply(404, {'code': 404, 'message': 'Not found'})
+                else:
+                    self._reply(201, {'code': 201, 'message': 'Created', 'objectCreated': created})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default=None, help='A .jsonl or .parquet file from generateUserData (default: start empty).')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of artificial delay per request.')
+    args = parser.parse_args()
+
+    if args.dataset:
+        from generateUserData import load_dataset
+        dataset = load_dataset(args.dataset)
+    else:
+        dataset = {'customers': [], 'accounts': [], 'transactions': {}}
+    server = FakeNessieServer(dataset, latency=args.latency, host=args.host, port=args.port)
+    print(f"Serving {len(dataset['customers'])} customers and {len(dataset['accounts'])} accounts at {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
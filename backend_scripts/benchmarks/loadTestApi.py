@@ -0,0 +1,88 @@
+# loadTestApi.py
+"""
+Drives a running API with many concurrent requests and reports throughput and
+latency percentiles per concurrency level.
+
+Start the API (python api.py), then run from backend_scripts/:
+    python -m benchmarks.loadTestApi --customer <firestore id> --concurrency 10 100 500
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values: return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_level(client: httpx.AsyncClient, paths: list[str], concurrency: int, total_requests: int) -> dict:
+    """Fires total_requests GETs, cycling through paths, with `concurrency` requests in flight."""
+    latencies, errors = [], 0
+    next_request = 0
+
+    async def worker():
+        nonlocal next_request, errors
+        while next_request < total_requests:
+            path = paths[next_request % len(paths)]
+            next_request += 1
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+async def run(args) -> list[dict]:
+    paths = [f"/customers/{args.customer}/{endpoint}" for endpoint in args.endpoints]
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        results = []
+        for concurrency in args.concurrency:
+            results.append(await run_level(client, paths, concurrency, args.requests or concurrency * 20))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--customer', required=True, help='Firestore customer ID to query.')
+    parser.add_argument('--endpoints', nargs='+', default=['analysis', 'purchases/recent'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--requests', type=int, default=None, help='Requests per level (default: 20 x concurrency).')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'concurrency':>12}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        print(f"{r['concurrency']:>12}{r['requests']:>10}{r['errors']:>8}{r['throughput_rps']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}")
+
+
+if __name__ == '__main__':
+    main()
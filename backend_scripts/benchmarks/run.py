@@ -0,0 +1,294 @@
+# run.py
+"""
+Benchmark suite for the profile calculation, the Nessie -> database sync and
+the API endpoints, on synthetic customers from generateUserData's patterns.
+Everything runs offline: Nessie is benchmarks.fakeNessie and the database is
+the in-memory local store (STORAGE_BACKEND=memory).
+
+Sizes are CUSTOMERSxTRANSACTIONS (transactions per customer). Results are
+written as JSON so runs from two commits can be compared.
+
+Run from backend_scripts/:
+    python -m benchmarks.run --preset smoke
+    python -m benchmarks.run --preset standard --only profile sync --output before.json
+    python -m benchmarks.run --compare before.json after.json
+"""
+import os
+os.environ['STORAGE_BACKEND'] = 'memory'  # never benchmark against the real database
+
+import argparse
+import asyncio
+import contextlib
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.fakeNessie import FakeNessieServer
+from benchmarks.loadTestApi import percentile
+from generateUserData import generate_customer, generate_dataset
+from localStore import LocalClient
+from nessieClient import TRANSACTION_ENDPOINTS
+import nessieClient
+import storage
+
+PRESETS = {
+    'smoke': ['10x100'],
+    'standard': ['10x100', '1000x100', '10x10000', '1000x1000'],
+    'full': ['10x100', '1000x100', '100000x100', '10x10000', '1000x10000'],
+}
+BENCHMARKS = ('profile', 'sync', 'api')
+# Requests timed per endpoint in the API benchmark.
+API_REQUESTS = 200
+
+
+def parse_size(size: str) -> tuple[int, int]:
+    customers, transactions = size.lower().split('x')
+    return int(customers), int(transactions)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silences the progress prints of the code under test."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    with quiet():
+        fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def latency_stats(latencies: list[float]) -> dict:
+    ordered = sorted(latencies)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+    }
+
+
+def tagged_transactions(records: dict) -> list[dict]:
+    """Flattens {endpoint: [records]} into transactions tagged with 'type', as the sync stores them."""
+    return [{**r, 'type': TRANSACTION_ENDPOINTS[endpoint]} for endpoint, rs in records.items() for r in rs]
+
+
+# --- Local Stand-ins ---
+
+def use_local_store() -> LocalClient:
+    """Points every module at a fresh in-memory store."""
+    import api
+    import profileAggregator
+    client = LocalClient()
+    storage.use_clients(client)
+    profileAggregator.db = api.db = storage.get_client()
+    api.adb = storage.get_async_client()
+    api.profile_cache.clear()
+    return client
+
+
+def seed_users(client: LocalClient, customers: list[dict]):
+    """Registers the customers in 'users', which the nightly sync requires before it syncs anyone."""
+    for start in range(0, len(customers), 500):
+        batch = client.batch()
+        for customer in customers[start:start + 500]:
+            data = {k: v for k, v in customer.items() if k != '_id'}
+            batch.set(client.collection('users').document(), {**data, 'nessie_id': customer['_id']})
+        batch.commit()
+
+
+# --- Benchmarks ---
+
+def bench_profile(customers: int, transactions: int, seed: int) -> dict:
+    """compute_financial_profile, one customer at a time; generation is not timed."""
+    from profileEngine import compute_financial_profile
+    latencies = []
+    with quiet():
+        for index in range(customers):
+            _, _, records = generate_customer(seed, index, transactions)
+            txns = tagged_transactions(records)
+            start = time.perf_counter()
+            compute_financial_profile(txns)
+            latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    return {
+        'seconds': round(total, 4),
+        'customers_per_s': round(customers / total, 1),
+        'transactions_per_s': round(customers * transactions / total, 1),
+        **latency_stats(latencies),
+    }
+
+
+def bench_sync(customers: int, transactions: int, seed: int) -> dict:
+    """The nightly job's sync (first and incremental runs) and the whole job, against the stand-ins."""
+    import profileAggregator
+    dataset = generate_dataset(customers, seed, transactions)
+    client = use_local_store()
+    seed_users(client, dataset['customers'])
+    with FakeNessieServer(dataset) as server:
+        nessieClient.NESSIE_BASE_URL = server.base_url
+        initial = timed(profileAggregator.sync_all_nessie_data)
+        initial_requests = server.request_count
+        incremental = timed(profileAggregator.sync_all_nessie_data)
+        nightly = timed(profileAggregator.main)
+    synced = len(client.collection('transactions').select([]).get())
+    return {
+        'initial_sync_s': round(initial, 4),
+        'incremental_sync_s': round(incremental, 4),
+        'nightly_job_s': round(nightly, 4),
+        'transactions_per_s': round(synced / initial, 1),
+        'nessie_requests': initial_requests,
+        'transactions_synced': synced,
+        'profiles_saved': len(client.collection('financial_profiles').select([]).get()),
+    }
+
+
+async def _time_requests(http, method: str, paths: list[str], before_each=None) -> dict:
+    latencies, errors = [], 0
+    for path in paths:
+        if before_each: before_each()
+        start = time.perf_counter()
+        response = await http.request(method, path)
+        latencies.append(time.perf_counter() - start)
+        errors += response.status_code >= 400
+    return {**latency_stats(latencies), 'errors': errors}
+
+
+async def _time_sync_jobs(http, nessie_ids: list[str]) -> dict:
+    """Queues a sync per customer, then polls every job until it finishes."""
+    start = time.perf_counter()
+    job_ids = [(await http.post(f"/sync/customers/{nessie_id}")).json()['job_id'] for nessie_id in nessie_ids]
+    failed = 0
+    for job_id in job_ids:
+        while True:
+            job = (await http.get(f"/sync/jobs/{job_id}")).json()
+            if job['status'] in ('succeeded', 'failed'): break
+            await asyncio.sleep(0.005)
+        failed += job['status'] == 'failed'
+    elapsed = time.perf_counter() - start
+    return {'jobs': len(job_ids), 'seconds': round(elapsed, 4), 'jobs_per_s': round(len(job_ids) / elapsed, 1),
+            'failed': failed}
+
+
+async def _bench_endpoints(customer_ids: list[str], nessie_ids: list[str]) -> dict:
+    import httpx
+    import api
+    await api.startup_event()
+    try:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as http:
+            analysis = [f"/customers/{customer_ids[i % len(customer_ids)]}/analysis" for i in range(API_REQUESTS)]
+            recent = [f"/customers/{customer_ids[i % len(customer_ids)]}/purchases/recent" for i in range(API_REQUESTS)]
+            sync = [f"/sync/customers/{nessie_id}" for nessie_id in nessie_ids[:20]]
+            with quiet():
+                return {
+                    'analysis_cold': await _time_requests(http, 'GET', analysis, before_each=api.profile_cache.clear),
+                    'analysis_warm': await _time_requests(http, 'GET', analysis),
+                    'purchases_recent': await _time_requests(http, 'GET', recent),
+                    # Queuing the sync (the response); the sync itself is timed by sync_jobs
+                    'sync_customer': await _time_requests(http, 'POST', sync),
+                    'sync_jobs': await _time_sync_jobs(http, nessie_ids[:20]),
+                }
+    finally:
+        await api.shutdown_event()
+
+
+def bench_api(customers: int, transactions: int, seed: int) -> dict:
+    """Per-request latency of the API endpoints, in-process over ASGI, on a synced and analyzed store."""
+    import profileAggregator
+    dataset = generate_dataset(customers, seed, transactions)
+    client = use_local_store()
+    seed_users(client, dataset['customers'])
+    with FakeNessieServer(dataset) as server:
+        nessieClient.NESSIE_BASE_URL = server.base_url
+        timed(profileAggregator.main)
+        customer_ids = [user.id for user in client.collection('users').stream()]
+        nessie_ids = [customer['_id'] for customer in dataset['customers']]
+        return asyncio.run(_bench_endpoints(customer_ids, nessie_ids))
+
+
+BENCHMARK_FUNCTIONS = {'profile': bench_profile, 'sync': bench_sync, 'api': bench_api}
+
+
+# --- Results ---
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def _flatten(metrics: dict, prefix: str = '') -> dict:
+    flat = {}
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(base_path: str, new_path: str):
+    """Prints every metric the two result files share, with the new/base ratio."""
+    with open(base_path) as f: base = json.load(f)
+    with open(new_path) as f: new = json.load(f)
+    base_results = {(r['benchmark'], r['size']): _flatten(r['metrics']) for r in base['results']}
+    print(f"base {base['environment'].get('commit')}  vs  new {new['environment'].get('commit')}")
+    print(f"{'benchmark':<10}{'size':<12}{'metric':<32}{'base':>14}{'new':>14}{'new/base':>10}")
+    for result in new['results']:
+        key = (result['benchmark'], result['size'])
+        if key not in base_results: continue
+        for metric, value in _flatten(result['metrics']).items():
+            if metric not in base_results[key]: continue
+            old = base_results[key][metric]
+            ratio = f"{value / old:.2f}x" if old else '-'
+            print(f"{key[0]:<10}{key[1]:<12}{metric:<32}{old:>14}{value:>14}{ratio:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--preset', choices=PRESETS, default='smoke')
+    parser.add_argument('--sizes', nargs='+', default=None, help='CUSTOMERSxTRANSACTIONS sizes; overrides --preset.')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='Compare two result files and exit.')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sizes = args.sizes or PRESETS[args.preset]
+    report = {'environment': environment(), 'preset': None if args.sizes else args.preset, 'seed': args.seed, 'results': []}
+    for name in args.only:
+        for size in sizes:
+            customers, transactions = parse_size(size)
+            print(f"{name:<8} {size:<12}", end='', flush=True)
+            metrics = BENCHMARK_FUNCTIONS[name](customers, transactions, args.seed)
+            report['results'].append({'benchmark': name, 'size': size, 'customers': customers,
+                                      'transactions': transactions, 'metrics': metrics})
+            print(json.dumps(metrics))
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+# firestoreSync.py
+from datetime import datetime, timezone
+from dateutil.parser import parse
+
+# --- 1. Configuration ---
+# Firestore accepts at most 500 writes in a single batch.
+FIRESTORE_BATCH_LIMIT = 500
+# Typed (UTC datetime) copy of each transaction's date, for range queries and ordering.
+TRANSACTION_TIMESTAMP_FIELD = 'txn_ts'
+
+# --- 2. Bulk De-duplicating Writer ---
+
+class BulkSyncWriter:
+    """
+    Syncs Nessie records into one Firestore collection, preventing duplicates.
+
+    Instead of querying for every record's 'nessie_id' before writing it, the
+    known ids are prefetched once per customer (or once for the whole collection)
+    and only records that are new get written, through batched writes. A sync then
+    costs O(batches) round trips instead of two per record.
+
+    Use as a context manager, or call flush() before reading the written data back.
+    With track_commits=True, the documents each flush committed are kept for
+    take_committed(), e.g. to mirror them into the local transaction store.
+    derived_fields(record) may return extra fields to store with each new record,
+    such as transaction_fields for transactions.
+    """
+
+    def __init__(self, db, collection_name: str, batch_size: int = FIRESTORE_BATCH_LIMIT, track_commits: bool = False,
+                 derived_fields=None):
+        self.db = db
+        self.collection_name = collection_name
+        self.batch_size = min(batch_size, FIRESTORE_BATCH_LIMIT)
+        self.track_commits = track_commits
+        self.derived_fields = derived_fields
+        self.known_ids = {}
+        self.created_count = 0
+        self.skipped_count = 0
+        self._prefetched_scopes = set()
+        self._batch = None
+        self._pending = 0
+        self._queued = []
+        self._committed = []
+
+    def prefetch(self, customer_firestore_id: str = None):
+        """
+        Loads the nessie_id -> Firestore document id map in a single query.
+        Pass a customer to scope the query, or nothing to load the whole collection.
+        """
+        if None in self._prefetched_scopes or customer_firestore_id in self._prefetched_scopes:
+            return
+        query = self.db.collection(self.collection_name)
+        if customer_firestore_id is not None:
+            query = query.where('customer_firestore_id', '==', customer_firestore_id)
+        for doc in query.select(['nessie_id']).stream():
+            nessie_id = (doc.to_dict() or {}).get('nessie_id')
+            if nessie_id:
+                self.known_ids.setdefault(nessie_id, doc.id)
+        self._prefetched_scopes.add(customer_firestore_id)
+
+    def sync(self, nessie_data: dict, extra_fields: dict = None):
+        """Queues a record for creation unless it is already known. Returns its Firestore ID."""
+        nessie_id = nessie_data.get('_id')
+        if not nessie_id: return None
+
+        if nessie_id in self.known_ids:
+            self.skipped_count += 1
+            return self.known_ids[nessie_id]
+
+        firestore_data = nessie_data.copy()
+        firestore_data['nessie_id'] = firestore_data.pop('_id')
+        if extra_fields:
+            firestore_data.update(extra_fields)
+        if self.derived_fields:
+            firestore_data.update(self.derived_fields(nessie_data))
+
+        doc_ref = self.db.collection(self.collection_name).document()
+        if self._batch is None:
+            self._batch = self.db.batch()
+        self._batch.set(doc_ref, firestore_data)
+        self._pending += 1
+        if self.track_commits:
+            self._queued.append((doc_ref.id, firestore_data))
+        self.known_ids[nessie_id] = doc_ref.id
+        self.created_count += 1
+
+        if self._pending >= self.batch_size:
+            self.flush()
+        return doc_ref.id
+
+    def sync_many(self, records: list[dict], extra_fields: dict = None):
+        """Syncs a list of records and returns their Firestore IDs in order."""
+        return [self.sync(record, extra_fields) for record in records]
+
+    def flush(self):
+        """Commits any queued writes."""
+        if self._batch is not None and self._pending:
+            self._batch.commit()
+            self._committed.extend(self._queued)
+        self._batch = None
+        self._pending = 0
+        self._queued = []
+
+    def take_committed(self) -> list[tuple[str, dict]]:
+        """Returns the (document id, data) pairs committed since the last call (needs track_commits)."""
+        committed, self._committed = self._committed, []
+        return committed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+# --- 3. Per-account Sync Cursors ---
+# One document per Nessie account id, holding the newest transaction date seen so far
+# and the ids seen on that date. Nessie has no "changed since" filter, so the cursor is
+# applied after download: only records past it are de-duplicated and written.
+SYNC_CURSORS_COLLECTION = 'sync_cursors'
+
+def transaction_date(txn: dict) -> str:
+    """Returns the transaction's date string as stored by Nessie, or '' if it has none."""
+    return txn.get('purchase_date') or txn.get('transaction_date') or txn.get('payment_date') or ''
+
+def transaction_timestamp(txn: dict):
+    """The transaction's date as a UTC datetime (dates without a zone are taken as UTC), or None."""
+    date_string = transaction_date(txn)
+    if not date_string: return None
+    try:
+        parsed = datetime.fromisoformat(date_string)
+    except ValueError:
+        try:
+            parsed = parse(date_string)
+        except (ValueError, OverflowError):
+            return None
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed.astimezone(timezone.utc)
+
+def transaction_fields(txn: dict) -> dict:
+    """Fields derived from a Nessie transaction when it is synced (see BulkSyncWriter's derived_fields)."""
+    timestamp = transaction_timestamp(txn)
+    return {TRANSACTION_TIMESTAMP_FIELD: timestamp} if timestamp else {}
+
+def backfill_transaction_timestamps(db, page_size: int = FIRESTORE_BATCH_LIMIT) -> int:
+    """
+    Adds TRANSACTION_TIMESTAMP_FIELD to transactions synced before it existed, paging
+    through the collection by document id. Returns the number of documents updated.
+    """
+    updated, last_id = 0, None
+    while True:
+        query = db.collection('transactions').order_by('__name__').limit(page_size)
+        if last_id:
+            query = query.start_after({'__name__': db.collection('transactions').document(last_id)})
+        page = query.get()
+        if not page: return updated
+        batch, pending = db.batch(), 0
+        for doc in page:
+            data = doc.to_dict()
+            if TRANSACTION_TIMESTAMP_FIELD in data: continue
+            fields = transaction_fields(data)
+            if not fields: continue
+            batch.update(doc.reference, fields)
+            pending += 1
+        if pending:
+            batch.commit()
+            updated += pending
+        last_id = page[-1].id
+
+def load_sync_cursors(db, nessie_account_ids: list[str]) -> dict:
+    """Reads the cursors for many accounts in one batched get. Returns {account_id: cursor}."""
+    if not nessie_account_ids: return {}
+    refs = [db.collection(SYNC_CURSORS_COLLECTION).document(account_id) for account_id in nessie_account_ids]
+    return {snap.id: snap.to_dict() for snap in db.get_all(refs) if snap.exists}
+
+def filter_new_transactions(transactions: list[dict], cursor: dict) -> list[dict]:
+    """
+    Keeps the records newer than the cursor: anything dated after its last date, plus
+    same-day records it hasn't seen. Undated or back-dated records are only picked up
+    by a full resync.
+    """
+    if not cursor: return list(transactions)
+    last_date = cursor.get('last_date', '')
+    seen_ids = set(cursor.get('last_ids', []))
+    return [
+        t for t in transactions
+        if transaction_date(t) > last_date or (transaction_date(t) == last_date and t.get('_id') not in seen_ids)
+    ]
+
+def advance_sync_cursor(cursor: dict, new_transactions: list[dict]) -> dict:
+    """Returns the cursor moved past the given (already written) transactions."""
+    last_date = (cursor or {}).get('last_date', '')
+    last_ids = set((cursor or {}).get('last_ids', []))
+    for t in new_transactions:
+        txn_date = transaction_date(t)
+        if txn_date > last_date:
+            last_date, last_ids = txn_date, set()
+        if txn_date == last_date and t.get('_id'):
+            last_ids.add(t['_id'])
+    return {'last_date': last_date, 'last_ids': sorted(last_ids)}
+
+def save_sync_cursors(db, cursors: dict, updated_at=None):
+    """Writes {account_id: cursor} in batches. Call only after the transactions are committed."""
+    items = list(cursors.items())
+    for start in range(0, len(items), FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for account_id, cursor in items[start:start + FIRESTORE_BATCH_LIMIT]:
+            data = {**cursor, 'updated_at_utc': updated_at} if updated_at else cursor
+            batch.set(db.collection(SYNC_CURSORS_COLLECTION).document(account_id), data)
+        batch.commit()
@@ -1,18 +1,16 @@
-import requests
+import argparse
 import json
+from concurrent.futures import ThreadPoolExecutor
+from nessieClient import NESSIE_MAX_CONCURRENCY, TRANSACTION_ENDPOINTS, get_session, nessie_post
 from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
 import random
 
-# --- Configuration ---
-API_KEY = '933f9b5bbbb8094ff92c2ea78ece8502'
-BASE_URL = 'http://api.nessieisreal.com'
-
 # --- Main Functions ---
 
 def create_customer(first_name, last_name, street_number, street_name, city, state, zip_code):
     """Creates a new customer."""
-    url = f'{BASE_URL}/customers?key={API_KEY}'
+    endpoint = '/customers'
     payload = {
         "first_name": first_name,
         "last_name": last_name,
@@ -24,7 +22,7 @@ def create_customer(first_name, last_name, street_number, street_name, city, sta
             "zip": zip_code
         }
     }
-    response = requests.post(url, headers={'Content-Type': 'application/json'}, data=json.dumps(payload))
+    response = nessie_post(endpoint, payload)
     if response.status_code == 201:
         print("Customer created successfully!")
         return response.json()['objectCreated']['_id']
@@ -34,14 +32,14 @@ def create_customer(first_name, last_name, street_number, street_name, city, sta
 
 def create_account(customer_id, account_type, nickname, opening_balance):
     """Creates a new account for a customer."""
-    url = f'{BASE_URL}/customers/{customer_id}/accounts?key={API_KEY}'
+    endpoint = f'/customers/{customer_id}/accounts'
     payload = {
         "type": account_type,
         "nickname": nickname,
         "balance": opening_balance,
         "rewards": 0,
     }
-    response = requests.post(url, headers={'Content-Type': 'application/json'}, data=json.dumps(payload))
+    response = nessie_post(endpoint, payload)
     if response.status_code == 201:
         print("Account created successfully!")
         return response.json()['objectCreated']['_id']
@@ -51,14 +49,14 @@ def create_account(customer_id, account_type, nickname, opening_balance):
 
 def create_deposit(account_id, amount, description, transaction_date):
     """Creates a deposit transaction."""
-    url = f'{BASE_URL}/accounts/{account_id}/deposits?key={API_KEY}'
+    endpoint = f'/accounts/{account_id}/deposits'
     payload = {
         "medium": "balance",
         "transaction_date": transaction_date,
         "amount": amount,
         "description": description
     }
-    response = requests.post(url, headers={'Content-Type': 'application/json'}, data=json.dumps(payload))
+    response = nessie_post(endpoint, payload)
     if response.status_code == 201:
         print(f"Paycheck deposit of ${amount} on {transaction_date} successful.")
     else:
@@ -66,7 +64,7 @@ def create_deposit(account_id, amount, description, transaction_date):
 
 def create_purchase(account_id, merchant_id, amount, description, purchase_date):
     """Creates a purchase transaction."""
-    url = f'{BASE_URL}/accounts/{account_id}/purchases?key={API_KEY}'
+    endpoint = f'/accounts/{account_id}/purchases'
     payload = {
         "merchant_id": merchant_id,
         "medium": "balance",
@@ -74,7 +72,7 @@ def create_purchase(account_id, merchant_id, amount, description, purchase_date)
         "amount": amount,
         "description": description
     }
-    response = requests.post(url, headers={'Content-Type': 'application/json'}, data=json.dumps(payload))
+    response = nessie_post(endpoint, payload)
     if response.status_code == 201:
         print(f"Purchase of ${amount} on {purchase_date} for '{description}' successful.")
     else:
@@ -82,28 +80,339 @@ def create_purchase(account_id, merchant_id, amount, description, purchase_date)
 
 def create_withdrawal(account_id, amount, description, transaction_date):
     """Creates a withdrawal transaction for payments like loans or rent."""
-    url = f'{BASE_URL}/accounts/{account_id}/withdrawals?key={API_KEY}'
+    endpoint = f'/accounts/{account_id}/withdrawals'
     payload = {
         "medium": "balance",
         "transaction_date": transaction_date,
         "amount": amount,
         "description": description
     }
-    response = requests.post(url, headers={'Content-Type': 'application/json'}, data=json.dumps(payload))
+    response = nessie_post(endpoint, payload)
     if response.status_code == 201:
         print(f"Withdrawal of ${amount} on {transaction_date} for '{description}' successful.")
     else:
         print(f"Error creating withdrawal: {response.text}")
 
-def get_random_merchant():
+MERCHANT_IDS = [
+    "57cf75cea73e494d8675ec49", "57cf75cea73e494d8675ec4a", "57cf75cea73e494d8675ec4b",
+    "57cf75cea73e494d8675ec4c", "57cf75cea73e494d8675ec4d", "57cf75cea73e494d8675ec4e"
+]
+DISCRETIONARY_DESCRIPTIONS = [
+    "Gas", "Dinner Out", "Online Shopping", "Coffee", "Movie Tickets",
+    "Lunch with Friends", "Clothing", "Pharmacy", "Convenience Store"
+]
+SUBSCRIPTIONS = {
+    "Netflix": 15.49,
+    "Spotify Premium": 10.99
+}
+
+def get_random_merchant(rng=random):
     """Returns a random merchant ID."""
-    merchants = [
-        "57cf75cea73e494d8675ec49", "57cf75cea73e494d8675ec4a", "57cf75cea73e494d8675ec4b",
-        "57cf75cea73e494d8675ec4c", "57cf75cea73e494d8675ec4d", "57cf75cea73e494d8675ec4e"
+    return rng.choice(MERCHANT_IDS)
+
+# --- Synthetic Data Patterns ---
+# Pure functions (no API calls) shared by the script below and the benchmarks.
+
+def _deposit(amount, description, transaction_date):
+    return 'deposits', {"medium": "balance", "transaction_date": transaction_date.strftime("%Y-%m-%d"),
+                        "amount": amount, "description": description}
+
+def _withdrawal(amount, description, transaction_date):
+    return 'withdrawals', {"medium": "balance", "transaction_date": transaction_date.strftime("%Y-%m-%d"),
+                           "amount": amount, "description": description}
+
+def _purchase(merchant_id, amount, description, purchase_date):
+    return 'purchases', {"merchant_id": merchant_id, "medium": "balance", "purchase_date": purchase_date.strftime("%Y-%m-%d"),
+                         "amount": amount, "description": description}
+
+def generate_discretionary_purchases(rng, start_date, end_date, count):
+    """Random everyday purchases spread uniformly between start_date and end_date."""
+    purchases = []
+    for _ in range(count):
+        purchase_date = start_date + timedelta(days=rng.randint(0, (end_date - start_date).days))
+        # Amounts reflect smaller, more typical discretionary spending
+        purchase_amount = round(rng.uniform(5.0, 150.0), 2)
+        purchases.append(_purchase(get_random_merchant(rng), purchase_amount, rng.choice(DISCRETIONARY_DESCRIPTIONS), purchase_date))
+    return purchases
+
+def generate_transactions(rng, start_date, end_date, discretionary_purchases=80):
+    """
+    Builds a lower-income customer's transactions between start_date and end_date:
+    variable biweekly paychecks, monthly rent, loan, insurance and utilities, weekly
+    groceries, subscriptions and random discretionary spending.
+
+    Returns (endpoint, payload) pairs in creation order, where endpoint is 'deposits',
+    'purchases' or 'withdrawals' and payload is the body Nessie expects for it.
+    """
+    transactions = []
+    months = (end_date.year - start_date.year) * 12 + end_date.month - start_date.month
+
+    # Biweekly paychecks with variable hours
+    paycheck_date = start_date + timedelta(days=(4 - start_date.weekday() + 7) % 7)  # First Friday
+    hourly_wage = 20
+    tax_rate = 0.22 # Approximate combined tax rate (Federal, State, FICA)
+    while paycheck_date <= end_date:
+        hours_week1 = rng.uniform(33, 50)
+        hours_week2 = rng.uniform(33, 50)
+        gross_pay = (hours_week1 + hours_week2) * hourly_wage
+        net_pay = round(gross_pay * (1 - tax_rate), 2)
+        transactions.append(_deposit(net_pay, "Paycheck Deposit", paycheck_date))
+        paycheck_date += timedelta(weeks=2)
+
+    # Monthly fixed necessity payments (rent, loan, insurance, utilities)
+    for i in range(months):
+        # Rent payment on the 1st of the month
+        rent_date = start_date + relativedelta(months=i, day=1)
+        if rent_date < end_date:
+            transactions.append(_withdrawal(1200.00, "Monthly Rent Payment", rent_date))
+
+        # Auto loan payment on the 5th of the month
+        loan_date = start_date + relativedelta(months=i, day=5)
+        if loan_date < end_date:
+            transactions.append(_withdrawal(485.75, "Auto Loan Payment", loan_date))
+
+        # Car Insurance payment on the 10th of the month
+        insurance_date = start_date + relativedelta(months=i, day=10)
+        if insurance_date < end_date:
+            transactions.append(_purchase(get_random_merchant(rng), 155.25, "Car Insurance", insurance_date))
+
+        # Utilities (Overheads) on the 20th, with variable cost
+        utilities_date = start_date + relativedelta(months=i, day=20)
+        if utilities_date < end_date:
+            utilities_amount = round(rng.uniform(100.0, 250.0), 2)
+            transactions.append(_purchase(get_random_merchant(rng), utilities_amount, "Gas & Electric Bill", utilities_date))
+
+    # Weekly grocery purchases
+    grocery_date = start_date + timedelta(days=(6 - start_date.weekday() + 7) % 7)  # First Sunday
+    while grocery_date <= end_date:
+        grocery_amount = round(rng.uniform(70.0, 150.0), 2)
+        transactions.append(_purchase(get_random_merchant(rng), grocery_amount, "Groceries", grocery_date))
+        grocery_date += timedelta(weeks=1)
+
+    # Recurring subscriptions on the 15th
+    for i in range(months):
+        subscription_date = start_date + relativedelta(months=i, day=15)
+        if subscription_date < end_date:
+            for service, amount in SUBSCRIPTIONS.items():
+                transactions.append(_purchase(get_random_merchant(rng), amount, f"{service} Subscription", subscription_date))
+
+    transactions.extend(generate_discretionary_purchases(rng, start_date, end_date, discretionary_purchases))
+    return transactions
+
+def _object_id(rng):
+    """A random 24-hex-digit ID like the ones Nessie assigns."""
+    return f"{rng.getrandbits(96):024x}"
+
+def generate_customer(seed, index, num_transactions=None, end_date=None):
+    """
+    Builds one synthetic customer with a checking account and a year of history, shaped
+    like Nessie's GET responses: (customer, account, {endpoint: [records]}).
+
+    num_transactions, when given, is hit exactly: discretionary spending fills the gap
+    above the fixed monthly pattern, or the pattern is sampled down below it. The result
+    depends only on (seed, index), so populations of different sizes share a prefix.
+    """
+    rng = random.Random(f"{seed}-{index}")
+    end_date = end_date or date.today()
+    start_date = end_date - relativedelta(years=1)
+
+    transactions = generate_transactions(rng, start_date, end_date, discretionary_purchases=0 if num_transactions is not None else 80)
+    if num_transactions is not None:
+        if num_transactions > len(transactions):
+            transactions.extend(generate_discretionary_purchases(rng, start_date, end_date, num_transactions - len(transactions)))
+        else:
+            keep = sorted(rng.sample(range(len(transactions)), num_transactions))
+            transactions = [transactions[i] for i in keep]
+
+    customer_id, account_id = _object_id(rng), _object_id(rng)
+    customer = {"_id": customer_id, "first_name": "Synthetic", "last_name": f"Customer{index}",
+                "address": {"street_number": "456", "street_name": "Oak Ave", "city": "Smalltown", "state": "TX", "zip": "67890"}}
+    account = {"_id": account_id, "type": "Checking", "nickname": "Main Checking", "rewards": 0,
+               "balance": 1000, "customer_id": customer_id}
+    records = {'deposits': [], 'purchases': [], 'withdrawals': []}
+    for endpoint, payload in transactions:
+        party = 'payer_id' if endpoint != 'deposits' else 'payee_id'
+        records[endpoint].append({"_id": _object_id(rng), "status": "executed", party: account_id, **payload})
+    return customer, account, records
+
+def iter_customers(num_customers, seed=0, num_transactions=None, end_date=None):
+    """Lazily yields generate_customer() for customers 0..num_customers-1."""
+    for index in range(num_customers):
+        yield generate_customer(seed, index, num_transactions, end_date)
+
+def build_dataset(customers):
+    """
+    Collects (customer, account, records) triples into the shape benchmarks.fakeNessie serves:
+    {'customers': [...], 'accounts': [...], 'transactions': {account_id: {endpoint: [records]}}}.
+    """
+    dataset = {'customers': [], 'accounts': [], 'transactions': {}}
+    for customer, account, records in customers:
+        dataset['customers'].append(customer)
+        dataset['accounts'].append(account)
+        dataset['transactions'][account['_id']] = records
+    return dataset
+
+def generate_dataset(num_customers, seed=0, num_transactions=None, end_date=None):
+    """A synthetic population, as build_dataset() returns it."""
+    return build_dataset(iter_customers(num_customers, seed, num_transactions, end_date))
+
+# --- Bulk Output ---
+# Datasets are written one customer per line (.jsonl) or one transaction per row (.parquet),
+# where the customer and account are repeated as JSON columns so the file round-trips.
+
+# Customers per Parquet row group (and per upload round); bounds memory for large populations.
+BULK_CHUNK_SIZE = 500
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Parquet files need pyarrow (pip install pyarrow); use a .jsonl path instead.") from e
+    return pyarrow, pyarrow.parquet
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _parquet_rows(customer, account, records):
+    customer_json, account_json = json.dumps(customer), json.dumps(account)
+    rows = [
+        {"customer": customer_json, "account": account_json, "endpoint": endpoint, "_id": r["_id"],
+         "date": r.get("purchase_date") or r.get("transaction_date"), "amount": r["amount"],
+         "description": r.get("description"), "merchant_id": r.get("merchant_id"),
+         "medium": r.get("medium"), "status": r.get("status")}
+        for endpoint, endpoint_records in records.items() for r in endpoint_records
     ]
-    return random.choice(merchants)
+    # Customers without transactions still get a row, so they survive the round trip.
+    return rows or [{"customer": customer_json, "account": account_json}]
 
-if __name__ == "__main__":
+def _record_from_row(row, account_id):
+    date_field = 'purchase_date' if row['endpoint'] == 'purchases' else 'transaction_date'
+    party = 'payer_id' if row['endpoint'] != 'deposits' else 'payee_id'
+    record = {"_id": row["_id"], "status": row["status"], party: account_id}
+    if row["merchant_id"] is not None:
+        record["merchant_id"] = row["merchant_id"]
+    record.update({"medium": row["medium"], date_field: row["date"], "amount": row["amount"], "description": row["description"]})
+    return record
+
+def write_dataset(path, customers):
+    """Writes (customer, account, records) triples to a .jsonl or .parquet file. Returns the customer count."""
+    count = 0
+    if path.endswith('.parquet'):
+        pa, pq = _require_pyarrow()
+        string = pa.string()
+        schema = pa.schema([("customer", string), ("account", string), ("endpoint", string), ("_id", string),
+                            ("date", string), ("amount", pa.float64()), ("description", string),
+                            ("merchant_id", string), ("medium", string), ("status", string)])
+        with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+            for chunk in _chunks(customers, BULK_CHUNK_SIZE):
+                rows = [row for customer in chunk for row in _parquet_rows(*customer)]
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                count += len(chunk)
+        return count
+    with open(path, 'w') as f:
+        for customer, account, records in customers:
+            f.write(json.dumps({"customer": customer, "account": account, "transactions": records}) + "\n")
+            count += 1
+    return count
+
+def read_customers(path):
+    """Lazily yields the (customer, account, records) triples stored by write_dataset()."""
+    if path.endswith('.parquet'):
+        _, pq = _require_pyarrow()
+        current, current_account_json = None, None
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=65536):
+            for row in batch.to_pylist():
+                if row["account"] != current_account_json:
+                    if current: yield current
+                    account = json.loads(row["account"])
+                    current = (json.loads(row["customer"]), account, {'deposits': [], 'purchases': [], 'withdrawals': []})
+                    current_account_json = row["account"]
+                if row["endpoint"] is not None:
+                    current[2][row["endpoint"]].append(_record_from_row(row, current[1]["_id"]))
+        if current: yield current
+        return
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry["customer"], entry["account"], entry["transactions"]
+
+def load_dataset(path):
+    """Loads a whole file written by write_dataset(), e.g. for benchmarks.fakeNessie to serve."""
+    return build_dataset(read_customers(path))
+
+def iter_customer_transactions(path):
+    """
+    Yields (customer_id, transactions tagged with 'type') from a dataset file, the input
+    profileEngine.analyze_customers() takes, without going through Nessie or the database.
+    """
+    for customer, _, records in read_customers(path):
+        yield customer["_id"], [{**r, 'type': TRANSACTION_ENDPOINTS[endpoint]} for endpoint, rs in records.items() for r in rs]
+
+# --- Bulk Upload ---
+
+def _create_object(endpoint, payload):
+    """POSTs one object and returns its new Nessie ID, or None (printing the error)."""
+    import requests
+    try:
+        response = nessie_post(endpoint, payload)
+    except requests.exceptions.RequestException as e:
+        # One dropped connection fails this object, not the whole upload
+        print(f"  Error creating {endpoint}: {e}")
+        return None
+    if response.status_code == 201:
+        return response.json()['objectCreated']['_id']
+    print(f"  Error creating {endpoint}: {response.text}")
+    return None
+
+def _create_customer_and_account(customer, account):
+    customer_payload = {k: customer[k] for k in ("first_name", "last_name", "address")}
+    customer_id = _create_object('/customers', customer_payload)
+    if not customer_id: return None
+    account_payload = {k: account[k] for k in ("type", "nickname", "balance", "rewards")}
+    return _create_object(f'/customers/{customer_id}/accounts', account_payload)
+
+def _submit_transaction(account_id, endpoint, record):
+    """POSTs one generated transaction, minus the fields Nessie assigns itself."""
+    payload = {k: v for k, v in record.items() if k not in ("_id", "status", "payer_id", "payee_id")}
+    return _create_object(f'/accounts/{account_id}/{endpoint}', payload) is not None
+
+def upload_customers(customers, concurrency=None):
+    """
+    Creates the generated customers, their accounts and every transaction through the
+    Nessie API, with `concurrency` requests in flight. Customers go in rounds of
+    BULK_CHUNK_SIZE: accounts first, then all of the round's transactions.
+    Returns (customers created, transactions created, requests failed).
+    """
+    created_customers = created_txns = failed = 0
+    concurrency = concurrency or NESSIE_MAX_CONCURRENCY
+    # One pooled connection per request in flight
+    get_session(pool_size=concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for chunk in _chunks(customers, BULK_CHUNK_SIZE):
+            account_ids = list(executor.map(lambda c: _create_customer_and_account(c[0], c[1]), chunk))
+            jobs = [
+                (account_id, endpoint, record)
+                for account_id, (_, _, records) in zip(account_ids, chunk) if account_id
+                for endpoint, endpoint_records in records.items() for record in endpoint_records
+            ]
+            results = list(executor.map(lambda job: _submit_transaction(*job), jobs))
+            created_customers += sum(1 for account_id in account_ids if account_id)
+            created_txns += sum(results)
+            failed += account_ids.count(None) + results.count(False)
+            print(f"  Uploaded {created_customers} customers and {created_txns} transactions ({failed} failed)...")
+    return created_customers, created_txns, failed
+
+def create_sample_customer():
+    """The original walkthrough: one customer with a year of data, created one request at a time."""
     # --- 1. Create a Customer and Account for a Lower-Income Profile ---
     print("--- Creating Customer and Account ---")
     customer_id = create_customer("Jane", "Smith", "456", "Oak Ave", "Smalltown", "TX", "67890")
@@ -116,74 +425,38 @@ if __name__ == "__main__":
             end_date = date.today()
             start_date = end_date - relativedelta(years=1)
 
-            # --- 2. Generate Biweekly Paychecks with Variable Hours ---
-            print("\n--- Simulating Variable Biweekly Paychecks ---")
-            paycheck_date = start_date + timedelta(days=(4 - start_date.weekday() + 7) % 7)  # First Friday
-            hourly_wage = 20
-            tax_rate = 0.22 # Approximate combined tax rate (Federal, State, FICA)
-
-            while paycheck_date <= end_date:
-                hours_week1 = random.uniform(33, 50)
-                hours_week2 = random.uniform(33, 50)
-                gross_pay = (hours_week1 + hours_week2) * hourly_wage
-                net_pay = round(gross_pay * (1 - tax_rate), 2)
-                create_deposit(account_id, net_pay, "Paycheck Deposit", paycheck_date.strftime("%Y-%m-%d"))
-                paycheck_date += timedelta(weeks=2)
-
-            # --- 3. Generate Monthly Fixed Necessity Payments ---
-            print("\n--- Simulating Monthly Necessity Payments (Rent, Loan, Utilities, Insurance) ---")
-            for i in range(12):
-                # Rent payment on the 1st of the month
-                rent_date = start_date + relativedelta(months=i, day=1)
-                if rent_date < end_date:
-                    create_withdrawal(account_id, 1200.00, "Monthly Rent Payment", rent_date.strftime("%Y-%m-%d"))
-
-                # Auto loan payment on the 5th of the month
-                loan_date = start_date + relativedelta(months=i, day=5)
-                if loan_date < end_date:
-                    create_withdrawal(account_id, 485.75, "Auto Loan Payment", loan_date.strftime("%Y-%m-%d"))
-                
-                # Car Insurance payment on the 10th of the month
-                insurance_date = start_date + relativedelta(months=i, day=10)
-                if insurance_date < end_date:
-                    create_purchase(account_id, get_random_merchant(), 155.25, "Car Insurance", insurance_date.strftime("%Y-%m-%d"))
-
-                # Utilities (Overheads) on the 20th, with variable cost
-                utilities_date = start_date + relativedelta(months=i, day=20)
-                if utilities_date < end_date:
-                    utilities_amount = round(random.uniform(100.0, 250.0), 2)
-                    create_purchase(account_id, get_random_merchant(), utilities_amount, "Gas & Electric Bill", utilities_date.strftime("%Y-%m-%d"))
-
-            # --- 4. Generate Regular Grocery Purchases ---
-            print("\n--- Simulating Weekly Grocery Purchases ---")
-            grocery_date = start_date + timedelta(days=(6 - start_date.weekday() + 7) % 7)  # First Sunday
-            while grocery_date <= end_date:
-                grocery_amount = round(random.uniform(70.0, 150.0), 2)
-                create_purchase(account_id, get_random_merchant(), grocery_amount, "Groceries", grocery_date.strftime("%Y-%m-%d"))
-                grocery_date += timedelta(weeks=1)
-
-            # --- 5. Generate Recurrent Subscriptions ---
-            print("\n--- Simulating Recurring Subscriptions ---")
-            subscriptions = {
-                "Netflix": 15.49,
-                "Spotify Premium": 10.99
-            }
-            for i in range(12):
-                subscription_date = start_date + relativedelta(months=i, day=15)
-                if subscription_date < end_date:
-                    for service, amount in subscriptions.items():
-                        create_purchase(account_id, get_random_merchant(), amount, f"{service} Subscription", subscription_date.strftime("%Y-%m-%d"))
-
-            # --- 6. Generate Discretionary (Random) Spending ---
-            print("\n--- Simulating Random Discretionary Spending ---")
-            for _ in range(80):  # Number of random purchases over the year
-                purchase_date = start_date + timedelta(days=random.randint(0, (end_date - start_date).days))
-                # Amounts reflect smaller, more typical discretionary spending
-                purchase_amount = round(random.uniform(5.0, 150.0), 2)
-                purchase_description = random.choice([
-                    "Gas", "Dinner Out", "Online Shopping", "Coffee", "Movie Tickets",
-                    "Lunch with Friends", "Clothing", "Pharmacy", "Convenience Store"
-                ])
-                create_purchase(account_id, get_random_merchant(), purchase_amount, purchase_description, purchase_date.strftime("%Y-%m-%d"))
-
-            print("\n--- Data Generation Complete ---")
\ No newline at end of file
+            for endpoint, payload in generate_transactions(random, start_date, end_date):
+                if endpoint == 'deposits':
+                    create_deposit(account_id, payload['amount'], payload['description'], payload['transaction_date'])
+                elif endpoint == 'withdrawals':
+                    create_withdrawal(account_id, payload['amount'], payload['description'], payload['transaction_date'])
+                else:
+                    create_purchase(account_id, payload['merchant_id'], payload['amount'], payload['description'], payload['purchase_date'])
+
+            print("\n--- Data Generation Complete ---")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generates synthetic customers with a year of transactions. With no options, creates one "
+                    "sample customer in Nessie (NESSIE_BASE_URL); with --customers, uploads many concurrently; "
+                    "with --output, writes them to a .jsonl or .parquet file instead."
+    )
+    parser.add_argument('--customers', type=int, default=None, help='Number of customers to generate.')
+    parser.add_argument('--transactions', type=int, default=None, help='Transactions per customer (default: about 230).')
+    parser.add_argument('--seed', type=int, default=0, help='Same seed, same customers.')
+    parser.add_argument('--output', default=None, help='Write to this .jsonl or .parquet file instead of uploading.')
+    parser.add_argument('--concurrency', type=int, default=NESSIE_MAX_CONCURRENCY, help='Nessie requests in flight.')
+    args = parser.parse_args()
+
+    if args.customers is None and args.output is None:
+        create_sample_customer()
+    else:
+        customers = iter_customers(args.customers or 1, args.seed, args.transactions)
+        if args.output:
+            count = write_dataset(args.output, customers)
+            print(f"--- Wrote {count} customers to {args.output} ---")
+        else:
+            print(f"--- Uploading {args.customers} customers (concurrency {args.concurrency}) ---")
+            created_customers, created_txns, failed = upload_customers(customers, args.concurrency)
+            print(f"--- Upload Complete: {created_customers} customers, {created_txns} transactions, {failed} failed ---")
@@ -0,0 +1,98 @@
+# jobCheckpoints.py
+import hashlib
+from collections import defaultdict
+from datetime import datetime
+
+# --- 1. Configuration ---
+# One document per (run, customer), '<run_id>:<customer_id>', recording how the nightly
+# job finished with that customer. Successful ones are written in the same batch as
+# the customer's profile, so a checkpoint never gets ahead of the profile it covers.
+CHECKPOINTS_COLLECTION = 'job_checkpoints'
+# One document per (run, shard), '<run_id>:<index>of<count>': running, then complete.
+JOB_SHARDS_COLLECTION = 'job_shards'
+# Outcomes a rerun of the same run skips; 'failed' customers are tried again.
+DONE_STATUSES = ('success', 'skipped')
+CHECKPOINT_STATUSES = ('success', 'skipped', 'failed')
+# Checkpoints read per get_all call.
+CHECKPOINT_READ_BATCH_SIZE = 300
+
+# --- 2. Runs and Shards ---
+
+def default_run_id(now: datetime = None) -> str:
+    """One run per UTC day, so a rerun the same night resumes it. Pass --run-id to choose another."""
+    return f"nightly-{(now or datetime.utcnow()):%Y-%m-%d}"
+
+def shard_of(customer_id: str, shard_count: int) -> int:
+    """The shard (0 to shard_count - 1) a customer belongs to; stable across processes and machines, unlike hash()."""
+    digest = hashlib.sha256(customer_id.encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+def _shard_ref(db, run_id: str, shard_index: int, shard_count: int):
+    return db.collection(JOB_SHARDS_COLLECTION).document(f"{run_id}:{shard_index}of{shard_count}")
+
+def start_shard(db, run_id: str, shard_index: int, shard_count: int):
+    _shard_ref(db, run_id, shard_index, shard_count).set({
+        'run_id': run_id, 'shard_index': shard_index, 'shard_count': shard_count,
+        'status': 'running', 'started_at_utc': datetime.utcnow(),
+    })
+
+def finish_shard(db, run_id: str, shard_index: int, shard_count: int, customers: int):
+    """Marks the shard complete; `customers` is how many it had to process, including ones done by earlier attempts."""
+    _shard_ref(db, run_id, shard_index, shard_count).update({
+        'status': 'complete', 'customers': customers, 'finished_at_utc': datetime.utcnow(),
+    })
+
+# --- 3. Per-customer Checkpoints ---
+
+def checkpoint(run_id: str, customer_id: str, shard_index: int, shard_count: int, status: str, reason: str = None) -> dict:
+    data = {
+        'run_id': run_id, 'customer_id': customer_id, 'shard_index': shard_index, 'shard_count': shard_count,
+        'status': status, 'completed_at_utc': datetime.utcnow(),
+    }
+    if reason: data['reason'] = reason
+    return data
+
+def checkpoint_ref(db, run_id: str, customer_id: str):
+    return db.collection(CHECKPOINTS_COLLECTION).document(f"{run_id}:{customer_id}")
+
+def load_completed(db, run_id: str, customer_ids: list[str]) -> set:
+    """The customers among customer_ids that this run already finished with (see DONE_STATUSES)."""
+    completed = set()
+    for start in range(0, len(customer_ids), CHECKPOINT_READ_BATCH_SIZE):
+        refs = [checkpoint_ref(db, run_id, c) for c in customer_ids[start:start + CHECKPOINT_READ_BATCH_SIZE]]
+        for snapshot in db.get_all(refs):
+            if snapshot.exists and snapshot.to_dict().get('status') in DONE_STATUSES:
+                completed.add(snapshot.to_dict()['customer_id'])
+    return completed
+
+# --- 4. Merged Summary ---
+
+def run_summary(db, run_id: str) -> str:
+    """
+    A table of a run's outcomes per shard and in total, merged from every shard's
+    checkpoints. Customers are counted under the shard that last checkpointed them;
+    'pending' are those a completed shard had but never checkpointed (e.g. failed saves).
+    """
+    shards = {}
+    for snapshot in db.collection(JOB_SHARDS_COLLECTION).where('run_id', '==', run_id).stream():
+        data = snapshot.to_dict()
+        shards[(data['shard_index'], data['shard_count'])] = data
+    counts = defaultdict(lambda: dict.fromkeys(CHECKPOINT_STATUSES, 0))
+    for snapshot in db.collection(CHECKPOINTS_COLLECTION).where('run_id', '==', run_id).stream():
+        data = snapshot.to_dict()
+        counts[(data['shard_index'], data['shard_count'])][data['status']] += 1
+
+    complete = sum(shard['status'] == 'complete' for shard in shards.values())
+    lines = [f"Run {run_id}: {complete}/{len(shards)} shards complete",
+             f"{'shard':<8}{'status':<10}" + ''.join(f"{s:>9}" for s in CHECKPOINT_STATUSES) + f"{'pending':>9}"]
+    totals = dict.fromkeys(CHECKPOINT_STATUSES + ('pending',), 0)
+    for key in sorted(set(shards) | set(counts)):
+        shard, shard_counts = shards.get(key, {}), counts[key]
+        pending = max(shard['customers'] - sum(shard_counts.values()), 0) if 'customers' in shard else 0
+        for status in CHECKPOINT_STATUSES:
+            totals[status] += shard_counts[status]
+        totals['pending'] += pending
+        lines.append(f"{f'{key[0]}/{key[1]}':<8}{shard.get('status', '-'):<10}"
+                     + ''.join(f"{shard_counts[s]:>9}" for s in CHECKPOINT_STATUSES) + f"{pending:>9}")
+    lines.append(f"{'total':<18}" + ''.join(f"{totals[s]:>9}" for s in CHECKPOINT_STATUSES) + f"{totals['pending']:>9}")
+    return '\n'.join(lines)
@@ -0,0 +1,468 @@
+# localStore.py
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+
+# --- 1. Configuration ---
+# Firestore rejects batches with more writes than this, and 'in' filters with more values.
+MAX_BATCH_WRITES = 500
+MAX_IN_VALUES = 30
+
+_OPERATORS = {'==': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>=', 'in': 'IN', 'not-in': 'NOT IN'}
+
+class NotFound(LookupError):
+    """Raised by update() on a document that does not exist, as Firestore does."""
+
+# --- 2. Value Encoding ---
+# Documents are stored as JSON. Datetimes are tagged so they come back as (UTC) datetimes,
+# and are written in a fixed-width ISO format so they compare correctly in queries.
+
+def _encode_datetime(value: datetime) -> str:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': _encode_datetime(value)}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+def _decode(value):
+    if isinstance(value, dict):
+        if len(value) == 1 and '__datetime__' in value:
+            return datetime.strptime(value['__datetime__'], '%Y-%m-%dT%H:%M:%S.%f').replace(tzinfo=timezone.utc)
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+def _sql_value(value):
+    """A filter or cursor value as SQLite compares it against json_extract()."""
+    if isinstance(value, datetime):
+        return _encode_datetime(value)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+def _field_expr(field_path: str, value=None) -> str:
+    """The SQL expression for a (possibly dotted) field; datetime comparisons use the tagged string."""
+    if field_path == '__name__':
+        return 'id'
+    parts = field_path.split('.')
+    if isinstance(value, datetime):
+        parts.append('__datetime__')
+    return "json_extract(data, '$." + '.'.join(f'"{part}"' for part in parts) + "')"
+
+def _get_field(data: dict, field_path: str):
+    for part in field_path.split('.'):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+def _auto_id() -> str:
+    return uuid.uuid4().hex[:20]
+
+# --- 3. Documents ---
+
+class DocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self):
+        return None if self._data is None else _decode(self._data)
+
+    def get(self, field_path: str):
+        return _decode(_get_field(self._data or {}, field_path))
+
+class DocumentReference:
+    def __init__(self, client, collection_name: str, document_id: str):
+        self._client = client
+        self.collection_name = collection_name
+        self.id = document_id
+
+    @property
+    def path(self) -> str:
+        return f"{self.collection_name}/{self.id}"
+
+    def get(self, transaction=None) -> DocumentSnapshot:
+        rows = self._client._fetchall('SELECT data FROM documents WHERE collection = ? AND id = ?',
+                                      (self.collection_name, self.id))
+        return DocumentSnapshot(self, json.loads(rows[0][0]) if rows else None)
+
+    def set(self, data: dict, merge: bool = False):
+        with self._client._lock, self._client._conn:
+            self._client._write(self, data, merge=merge)
+
+    def update(self, data: dict):
+        with self._client._lock, self._client._conn:
+            self._client._write(self, data, merge=True, must_exist=True)
+
+    def delete(self):
+        with self._client._lock, self._client._conn:
+            self._client._delete(self)
+
+class WriteBatch:
+    """Collects writes and applies them atomically, in one SQLite transaction, on commit()."""
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, reference: DocumentReference, data: dict, merge: bool = False):
+        self._writes.append(('set', reference, data, merge))
+        return self
+
+    def update(self, reference: DocumentReference, data: dict):
+        self._writes.append(('update', reference, data, True))
+        return self
+
+    def delete(self, reference: DocumentReference):
+        self._writes.append(('delete', reference, None, False))
+        return self
+
+    def commit(self):
+        if len(self._writes) > MAX_BATCH_WRITES:
+            raise ValueError(f"A batch can contain at most {MAX_BATCH_WRITES} writes, got {len(self._writes)}.")
+        with self._client._lock, self._client._conn:
+            for op, reference, data, merge in self._writes:
+                if op == 'delete':
+                    self._client._delete(reference)
+                else:
+                    self._client._write(reference, data, merge=merge, must_exist=op == 'update')
+        self._writes = []
+
+class Transaction(WriteBatch):
+    """
+    A read-modify-write: run(fn) holds the store's lock while fn reads and until its
+    writes are committed, so no other writer can change what it read in between.
+    """
+
+    def run(self, fn):
+        with self._client._lock:
+            result = fn(self)
+            self.commit()
+            return result
+
+# --- 4. Queries ---
+
+class Query:
+    """
+    An immutable query over one collection, with Firestore's semantics for the
+    parts this project uses: where, order_by (ties broken by document ID, which is
+    also the default order), limit, select and start_after.
+    """
+
+    def __init__(self, client, collection_name: str, filters=(), orders=(), limit_count=None,
+                 projection=None, cursor=None):
+        self._client = client
+        self.collection_name = collection_name
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._projection = projection
+        self._cursor = cursor
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, limit_count=self._limit,
+                     projection=self._projection, cursor=self._cursor)
+        state.update(changes)
+        return Query(self._client, self.collection_name, **state)
+
+    def where(self, field_path: str = None, op_string: str = None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in _OPERATORS:
+            raise ValueError(f"Unsupported operator '{op_string}'.")
+        if op_string in ('in', 'not-in'):
+            value = list(value)
+            if not value or len(value) > MAX_IN_VALUES:
+                raise ValueError(f"'{op_string}' filters take 1 to {MAX_IN_VALUES} values, got {len(value)}.")
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = 'ASCENDING'):
+        return self._copy(orders=self._orders + ((field_path, direction.upper()),))
+
+    def limit(self, count: int):
+        return self._copy(limit_count=count)
+
+    def select(self, field_paths):
+        return self._copy(projection=list(field_paths))
+
+    def start_after(self, document_fields):
+        """Resumes after a snapshot, or after a dict holding the order_by field values (plus '__name__')."""
+        if isinstance(document_fields, DocumentSnapshot):
+            values = {field: document_fields.get(field) for field, _ in self._orders}
+            values['__name__'] = document_fields.id
+        else:
+            values = dict(document_fields)
+            if '__name__' in values:
+                # Firestore takes a document reference for the id; accept a plain id too
+                values['__name__'] = getattr(values['__name__'], 'id', values['__name__'])
+        return self._copy(cursor=values)
+
+    def _sql(self):
+        clauses, params = ['collection = ?'], [self.collection_name]
+        # With an equality filter present, the unary '+' keeps SQLite from picking a
+        # (usually far less selective) range index for the other terms instead.
+        has_equality = any(op_string in ('==', 'in') for _, op_string, _ in self._filters)
+        for field_path, op_string, value in self._filters:
+            demote = '+' if has_equality and op_string not in ('==', 'in') else ''
+            if op_string in ('in', 'not-in'):
+                expr = demote + _field_expr(field_path, value[0])
+                clauses.append(f"{expr} {_OPERATORS[op_string]} ({', '.join('?' * len(value))})")
+                params.extend(_sql_value(v) for v in value)
+            else:
+                clauses.append(f"{demote}{_field_expr(field_path, value)} {_OPERATORS[op_string]} ?")
+                params.append(_sql_value(value))
+
+        # Like Firestore, ordering on a field leaves out documents that don't have it.
+        for field_path, _ in self._orders:
+            if field_path != '__name__':
+                clauses.append(f"+{_field_expr(field_path)} IS NOT NULL")
+
+        orders = list(self._orders)
+        if not orders:
+            # Firestore orders by the inequality-filtered fields first when no order is given.
+            for field_path, op_string, _ in self._filters:
+                if op_string not in ('==', 'in') and (field_path, 'ASCENDING') not in orders:
+                    orders.append((field_path, 'ASCENDING'))
+        last_direction = orders[-1][1] if orders else 'ASCENDING'
+        if not any(field == '__name__' for field, _ in orders):
+            orders.append(('__name__', last_direction))
+
+        if self._cursor is not None:
+            # Keyset pagination: rows strictly after the cursor in the query's order.
+            alternatives = []
+            for i, (field_path, direction) in enumerate(orders):
+                if field_path not in self._cursor: break
+                terms = []
+                for prior_field, _ in orders[:i]:
+                    prior_value = self._cursor[prior_field]
+                    terms.append(f"{_field_expr(prior_field, prior_value)} = ?")
+                    params.append(_sql_value(prior_value))
+                value = self._cursor[field_path]
+                terms.append(f"{_field_expr(field_path, value)} {'>' if direction == 'ASCENDING' else '<'} ?")
+                params.append(_sql_value(value))
+                alternatives.append('(' + ' AND '.join(terms) + ')')
+            if alternatives:
+                clauses.append('(' + ' OR '.join(alternatives) + ')')
+
+        order_sql = ', '.join(
+            f"{_field_expr(field_path)} {'ASC' if direction == 'ASCENDING' else 'DESC'}" for field_path, direction in orders
+        )
+        sql = f"SELECT id, data FROM documents WHERE {' AND '.join(clauses)} ORDER BY {order_sql}"
+        if self._limit is not None:
+            sql += ' LIMIT ?'
+            params.append(self._limit)
+        return sql, params
+
+    def stream(self):
+        for field_path in {field for field, _, _ in self._filters} | {field for field, _ in self._orders}:
+            self._client._ensure_index(field_path)
+        sql, params = self._sql()
+        for document_id, raw in self._client._fetchall(sql, params):
+            data = json.loads(raw)
+            if self._projection is not None:
+                data = {field: data[field] for field in self._projection if field in data}
+            yield DocumentSnapshot(DocumentReference(self._client, self.collection_name, document_id), data)
+
+    def get(self) -> list:
+        return list(self.stream())
+
+class CollectionReference(Query):
+    def __init__(self, client, collection_name: str):
+        super().__init__(client, collection_name)
+        self.id = collection_name
+
+    def document(self, document_id: str = None) -> DocumentReference:
+        return DocumentReference(self._client, self.collection_name, document_id or _auto_id())
+
+    def add(self, data: dict, document_id: str = None):
+        reference = self.document(document_id)
+        reference.set(data)
+        return datetime.now(timezone.utc), reference
+
+# --- 5. Clients ---
+
+class LocalClient:
+    """
+    A Firestore client stand-in backed by SQLite, for running the API, the
+    nightly job and the benchmarks on one machine without network. Pass a file
+    path to persist data between runs; the default keeps everything in memory.
+    """
+
+    def __init__(self, path: str = ':memory:'):
+        self.path = path
+        self._lock = threading.RLock()
+        self._indexed_fields = set()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS documents ('
+                'collection TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, PRIMARY KEY (collection, id))'
+            )
+
+    def _ensure_index(self, field_path: str):
+        """
+        Firestore indexes every field automatically; the first query on a field
+        here creates the equivalent expression index, so lookups don't scan.
+        """
+        if field_path == '__name__' or field_path in self._indexed_fields: return
+        name = 'idx_' + ''.join(c if c.isalnum() else '_' for c in field_path) + f"_{len(self._indexed_fields)}"
+        with self._lock, self._conn:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON documents (collection, {_field_expr(field_path)}, id)")
+        self._indexed_fields.add(field_path)
+
+    def _fetchall(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _write(self, reference: DocumentReference, data: dict, merge: bool = False, must_exist: bool = False):
+        """Caller holds the lock and an open transaction."""
+        data = _encode(data)
+        if merge or must_exist:
+            row = self._conn.execute('SELECT data FROM documents WHERE collection = ? AND id = ?',
+                                     (reference.collection_name, reference.id)).fetchone()
+            if row is None and must_exist:
+                raise NotFound(f"No document to update: {reference.path}")
+            if row is not None:
+                data = {**json.loads(row[0]), **data}
+        self._conn.execute('INSERT OR REPLACE INTO documents (collection, id, data) VALUES (?, ?, ?)',
+                           (reference.collection_name, reference.id, json.dumps(data)))
+
+    def _delete(self, reference: DocumentReference):
+        self._conn.execute('DELETE FROM documents WHERE collection = ? AND id = ?',
+                           (reference.collection_name, reference.id))
+
+    def collection(self, collection_name: str) -> CollectionReference:
+        return CollectionReference(self, collection_name)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def transaction(self) -> Transaction:
+        return Transaction(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        for reference in references:
+            snapshot = reference.get()
+            if field_paths is not None and snapshot.exists:
+                snapshot._data = {field: snapshot._data[field] for field in field_paths if field in snapshot._data}
+            yield snapshot
+
+    def close(self):
+        self._conn.close()
+
+# The async twins wrap the same objects, so a LocalClient and its AsyncLocalClient
+# see the same data (like firestore.client() and firestore_async.client()).
+
+class AsyncDocumentReference:
+    def __init__(self, reference: DocumentReference):
+        self._reference = reference
+        self.id = reference.id
+        self.path = reference.path
+
+    async def get(self) -> DocumentSnapshot:
+        return self._reference.get()
+
+    async def set(self, data: dict, merge: bool = False):
+        self._reference.set(data, merge=merge)
+
+    async def update(self, data: dict):
+        self._reference.update(data)
+
+    async def delete(self):
+        self._reference.delete()
+
+class AsyncQuery:
+    def __init__(self, query: Query):
+        self._query = query
+
+    def where(self, *args, **kwargs):
+        return AsyncQuery(self._query.where(*args, **kwargs))
+
+    def order_by(self, *args, **kwargs):
+        return AsyncQuery(self._query.order_by(*args, **kwargs))
+
+    def limit(self, count: int):
+        return AsyncQuery(self._query.limit(count))
+
+    def select(self, field_paths):
+        return AsyncQuery(self._query.select(field_paths))
+
+    def start_after(self, document_fields):
+        return AsyncQuery(self._query.start_after(document_fields))
+
+    async def stream(self):
+        for snapshot in self._query.stream():
+            yield snapshot
+
+    async def get(self) -> list:
+        return self._query.get()
+
+class AsyncCollectionReference(AsyncQuery):
+    def __init__(self, collection: CollectionReference):
+        super().__init__(collection)
+        self.id = collection.id
+
+    def document(self, document_id: str = None) -> AsyncDocumentReference:
+        return AsyncDocumentReference(self._query.document(document_id))
+
+    async def add(self, data: dict, document_id: str = None):
+        update_time, reference = self._query.add(data, document_id)
+        return update_time, AsyncDocumentReference(reference)
+
+class AsyncWriteBatch:
+    def __init__(self, batch: WriteBatch):
+        self._batch = batch
+
+    def __len__(self):
+        return len(self._batch)
+
+    def set(self, reference: AsyncDocumentReference, data: dict, merge: bool = False):
+        self._batch.set(reference._reference, data, merge=merge)
+        return self
+
+    def update(self, reference: AsyncDocumentReference, data: dict):
+        self._batch.update(reference._reference, data)
+        return self
+
+    def delete(self, reference: AsyncDocumentReference):
+        self._batch.delete(reference._reference)
+        return self
+
+    async def commit(self):
+        self._batch.commit()
+
+class AsyncLocalClient:
+    def __init__(self, client: LocalClient):
+        self._client = client
+
+    def collection(self, collection_name: str) -> AsyncCollectionReference:
+        return AsyncCollectionReference(self._client.collection(collection_name))
+
+    def batch(self) -> AsyncWriteBatch:
+        return AsyncWriteBatch(self._client.batch())
+
+    async def get_all(self, references, field_paths=None):
+        for snapshot in self._client.get_all([r._reference for r in references], field_paths):
+            yield snapshot
+
+    def close(self):
+        self._client.close()
@@ -0,0 +1,193 @@
+# meteredStore.py
+from metrics import record_firestore
+
+# --- 1. Firestore Accounting ---
+# Thin wrappers around a Firestore (or local store) client that count, per metrics
+# scope, the queries run, documents read and documents written, as Firestore bills
+# them. They wrap the blocking and the async clients alike: with is_async, the
+# wrapped calls return awaitables and streams are async generators.
+
+def _unwrap(value):
+    """The underlying reference (or transaction) for a wrapped one, including inside a start_after() dict."""
+    if isinstance(value, (MeteredDocument, MeteredTransaction)):
+        return value._target
+    if isinstance(value, dict):
+        return {key: _unwrap(item) for key, item in value.items()}
+    return value
+
+def _recorded(result, is_async: bool, op: str, count=lambda result: 1):
+    """Records `op` once the call completes (awaiting it first when async), and returns its result."""
+    if not is_async:
+        record_firestore(op, count(result))
+        return result
+
+    async def wait():
+        value = await result
+        record_firestore(op, count(value))
+        return value
+    return wait()
+
+def _read_stream(snapshots, is_async: bool):
+    """Counts one read per streamed document."""
+    if not is_async:
+        def stream():
+            for snapshot in snapshots:
+                record_firestore('read')
+                yield snapshot
+        return stream()
+
+    async def stream_async():
+        async for snapshot in snapshots:
+            record_firestore('read')
+            yield snapshot
+    return stream_async()
+
+class _Metered:
+    def __init__(self, target, is_async: bool):
+        self._target = target
+        self._async = is_async
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+def _unwrapped(kwargs: dict) -> dict:
+    """Keyword arguments with a wrapped transaction= replaced by the underlying one."""
+    return {key: _unwrap(value) for key, value in kwargs.items()}
+
+class MeteredDocument(_Metered):
+    def get(self, *args, **kwargs):
+        return _recorded(self._target.get(*args, **_unwrapped(kwargs)), self._async, 'read')
+
+    def set(self, *args, **kwargs):
+        return _recorded(self._target.set(*args, **kwargs), self._async, 'write')
+
+    def create(self, *args, **kwargs):
+        return _recorded(self._target.create(*args, **kwargs), self._async, 'write')
+
+    def update(self, *args, **kwargs):
+        return _recorded(self._target.update(*args, **kwargs), self._async, 'write')
+
+    def delete(self, *args, **kwargs):
+        return _recorded(self._target.delete(*args, **kwargs), self._async, 'write')
+
+    def collection(self, *args, **kwargs):
+        return MeteredQuery(self._target.collection(*args, **kwargs), self._async)
+
+class MeteredQuery(_Metered):
+    def _query(self, query):
+        return MeteredQuery(query, self._async)
+
+    def where(self, *args, **kwargs):
+        return self._query(self._target.where(*args, **kwargs))
+
+    def order_by(self, *args, **kwargs):
+        return self._query(self._target.order_by(*args, **kwargs))
+
+    def limit(self, *args, **kwargs):
+        return self._query(self._target.limit(*args, **kwargs))
+
+    def offset(self, *args, **kwargs):
+        return self._query(self._target.offset(*args, **kwargs))
+
+    def select(self, *args, **kwargs):
+        return self._query(self._target.select(*args, **kwargs))
+
+    def start_after(self, document_fields):
+        return self._query(self._target.start_after(_unwrap(document_fields)))
+
+    def stream(self, *args, **kwargs):
+        record_firestore('query')
+        return _read_stream(self._target.stream(*args, **kwargs), self._async)
+
+    def get(self, *args, **kwargs):
+        record_firestore('query')
+        return _recorded(self._target.get(*args, **kwargs), self._async, 'read', len)
+
+    def document(self, *args, **kwargs):
+        return MeteredDocument(self._target.document(*args, **kwargs), self._async)
+
+    def add(self, *args, **kwargs):
+        record_firestore('write')
+        result = self._target.add(*args, **kwargs)
+        if not self._async:
+            update_time, reference = result
+            return update_time, MeteredDocument(reference, False)
+
+        async def wait():
+            update_time, reference = await result
+            return update_time, MeteredDocument(reference, True)
+        return wait()
+
+class MeteredBatch(_Metered):
+    def __init__(self, target, is_async: bool):
+        super().__init__(target, is_async)
+        self._writes = 0
+
+    def __len__(self):
+        return self._writes
+
+    def _write(self, method, reference, *args, **kwargs):
+        method(_unwrap(reference), *args, **kwargs)
+        self._writes += 1
+        return self
+
+    def set(self, reference, *args, **kwargs):
+        return self._write(self._target.set, reference, *args, **kwargs)
+
+    def create(self, reference, *args, **kwargs):
+        return self._write(self._target.create, reference, *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        return self._write(self._target.update, reference, *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        return self._write(self._target.delete, reference, *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        writes, self._writes = self._writes, 0
+        return _recorded(self._target.commit(*args, **kwargs), self._async, 'write', lambda _: writes)
+
+class MeteredTransaction(_Metered):
+    """Counts a transaction's writes as they are added; it commits when the transactional function returns."""
+
+    def _write(self, method, reference, *args, **kwargs):
+        record_firestore('write')
+        method(_unwrap(reference), *args, **kwargs)
+        return self
+
+    def set(self, reference, *args, **kwargs):
+        return self._write(self._target.set, reference, *args, **kwargs)
+
+    def create(self, reference, *args, **kwargs):
+        return self._write(self._target.create, reference, *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        return self._write(self._target.update, reference, *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        return self._write(self._target.delete, reference, *args, **kwargs)
+
+    def run(self, fn):
+        """Local store only: runs fn with this wrapper rather than the local transaction."""
+        return self._target.run(lambda _: fn(self))
+
+class MeteredClient(_Metered):
+    def collection(self, *args, **kwargs):
+        return MeteredQuery(self._target.collection(*args, **kwargs), self._async)
+
+    def document(self, *args, **kwargs):
+        return MeteredDocument(self._target.document(*args, **kwargs), self._async)
+
+    def batch(self):
+        return MeteredBatch(self._target.batch(), self._async)
+
+    def transaction(self, *args, **kwargs):
+        return MeteredTransaction(self._target.transaction(*args, **kwargs), self._async)
+
+    def get_all(self, references, *args, **kwargs):
+        return _read_stream(self._target.get_all([_unwrap(r) for r in references], *args, **_unwrapped(kwargs)),
+                            self._async)
+
+def metered(client, async_client):
+    """Wraps a blocking client and its async twin for Firestore accounting."""
+    return MeteredClient(client, False), MeteredClient(async_client, True)
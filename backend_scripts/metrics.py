@@ -0,0 +1,265 @@
+# metrics.py
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# --- 1. Configuration ---
+# Set METRICS_ENABLED=0 to skip the Firestore accounting wrappers and the request middleware.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+# Where a batch job writes its metrics in the Prometheus text format when it finishes
+# (e.g. a node_exporter textfile collector directory); unset to only print the summary.
+METRICS_TEXTFILE = os.environ.get('METRICS_TEXTFILE')
+# Histogram bounds, in seconds for latencies and in operations for per-request counts.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+FIRESTORE_OPS = ('query', 'read', 'write')
+
+# --- 2. Counters and Histograms ---
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra: pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value) -> str:
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+class Histogram:
+    """Observations bucketed by upper bound per label combination, with their sum and count."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+_registry = []
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+# --- 3. Metrics ---
+
+http_requests = _register(Counter(
+    'http_requests_total', 'API requests by route template, method and status.', ('route', 'method', 'status')))
+http_request_seconds = _register(Histogram(
+    'http_request_duration_seconds', 'API latency until the response body is sent.', ('route', 'method')))
+http_request_firestore_ops = _register(Histogram(
+    'http_request_firestore_operations', 'Firestore queries, documents read and documents written per API request.',
+    ('route', 'op'), COUNT_BUCKETS))
+nessie_requests = _register(Counter(
+    'nessie_requests_total', 'Nessie calls by method, endpoint template and final status (error: no response).',
+    ('method', 'endpoint', 'status')))
+nessie_request_seconds = _register(Histogram(
+    'nessie_request_duration_seconds', 'Nessie call latency, including retries.', ('method', 'endpoint')))
+firestore_operations = _register(Counter(
+    'firestore_operations_total', 'Firestore queries run, documents read and documents written.', ('op',)))
+job_stage_seconds = _register(Counter(
+    'job_stage_seconds_total', 'Time spent in each batch job stage, excluding nested stages.', ('job', 'stage')))
+job_stage_items = _register(Counter(
+    'job_stage_items_total', 'Items (accounts, customers, profiles) processed by each batch job stage.', ('job', 'stage')))
+job_stage_firestore_ops = _register(Counter(
+    'job_stage_firestore_operations_total', 'Firestore operations made by each batch job stage.', ('job', 'stage', 'op')))
+job_stage_nessie_calls = _register(Counter(
+    'job_stage_nessie_requests_total', 'Nessie calls made by each batch job stage.', ('job', 'stage')))
+job_stage_nessie_seconds = _register(Counter(
+    'job_stage_nessie_seconds_total', 'Time spent in Nessie calls by each batch job stage, summed over threads.',
+    ('job', 'stage')))
+
+# --- 4. Scopes ---
+# The work being accounted for: an API request or a batch job stage. It's a context
+# variable, so it follows asyncio tasks and asyncio.to_thread; code that starts its
+# own threads passes it on with contextvars.copy_context().
+
+class Scope:
+    """Firestore and Nessie calls made while a request or stage is running."""
+
+    def __init__(self):
+        self.firestore = dict.fromkeys(FIRESTORE_OPS, 0)
+        self.nessie_calls = 0
+        self.nessie_seconds = 0.0
+        self.child_seconds = 0.0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def count(self, items: int = 1):
+        """Adds to the number of items the stage processed."""
+        with self._lock:
+            self.items += items
+
+_current_scope = contextvars.ContextVar('metrics_scope', default=None)
+
+def record_firestore(op: str, count: int = 1):
+    firestore_operations.inc(op, amount=count)
+    scope = _current_scope.get()
+    if scope is not None:
+        with scope._lock:
+            scope.firestore[op] += count
+
+def record_nessie(method: str, endpoint: str, status, seconds: float):
+    nessie_requests.inc(method, endpoint, str(status))
+    nessie_request_seconds.observe(seconds, method, endpoint)
+    scope = _current_scope.get()
+    if scope is not None:
+        with scope._lock:
+            scope.nessie_calls += 1
+            scope.nessie_seconds += seconds
+
+@contextmanager
+def stage(job: str, name: str):
+    """
+    Accounts for a batch job stage: its own time (nested stages are subtracted) and
+    the Firestore and Nessie calls made inside it. Re-entering a stage adds to it,
+    so interleaved stages (e.g. one fetch per analyzed chunk) can each be wrapped.
+    """
+    parent = _current_scope.get()
+    scope = Scope()
+    token = _current_scope.set(scope)
+    start = time.perf_counter()
+    try:
+        yield scope
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_scope.reset(token)
+        if parent is not None:
+            with parent._lock:
+                parent.child_seconds += elapsed
+        job_stage_seconds.inc(job, name, amount=max(elapsed - scope.child_seconds, 0.0))
+        job_stage_items.inc(job, name, amount=scope.items)
+        for op, count in scope.firestore.items():
+            job_stage_firestore_ops.inc(job, name, op, amount=count)
+        job_stage_nessie_calls.inc(job, name, amount=scope.nessie_calls)
+        job_stage_nessie_seconds.inc(job, name, amount=scope.nessie_seconds)
+
+def staged(job: str, name: str, iterable):
+    """Yields from `iterable`, accounting the time spent producing each item (one item each) to the stage."""
+    iterator = iter(iterable)
+    while True:
+        with stage(job, name) as scope:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            scope.count()
+        yield item
+
+def _stage_values(counter, job: str) -> dict:
+    with counter._lock:
+        return {labels[1:]: value for labels, value in counter._values.items() if labels[0] == job}
+
+def stage_summary(job: str) -> str:
+    """A table of a job's stages so far: time, items, Firestore operations and Nessie calls."""
+    seconds = _stage_values(job_stage_seconds, job)
+    items = _stage_values(job_stage_items, job)
+    ops = _stage_values(job_stage_firestore_ops, job)
+    calls = _stage_values(job_stage_nessie_calls, job)
+    nessie_seconds = _stage_values(job_stage_nessie_seconds, job)
+    lines = [f"{'stage':<10}{'seconds':>10}{'items':>8}{'queries':>9}{'reads':>9}{'writes':>9}{'nessie':>8}{'nessie s':>10}"]
+    for (name,), value in seconds.items():
+        lines.append(
+            f"{name:<10}{value:>10.3f}{int(items.get((name,), 0)):>8}"
+            + ''.join(f"{int(ops.get((name, op), 0)):>9}" for op in FIRESTORE_OPS)
+            + f"{int(calls.get((name,), 0)):>8}{nessie_seconds.get((name,), 0.0):>10.3f}"
+        )
+    return '\n'.join(lines)
+
+def write_textfile(path: str = None):
+    """Writes every metric to `path` (default METRICS_TEXTFILE), replacing the file atomically."""
+    path = path or METRICS_TEXTFILE
+    if not path: return
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w') as f:
+        f.write(render())
+    os.replace(temporary, path)
+
+# --- 5. API Middleware ---
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording each request's count, latency and Firestore operations,
+    labelled by the matched route's path template (unmatched paths share one label).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        request_scope = Scope()
+        token = _current_scope.set(request_scope)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_scope.reset(token)
+            route = getattr(scope.get('route'), 'path', None) or 'unmatched'
+            method = scope['method']
+            http_requests.inc(route, method, str(status))
+            http_request_seconds.observe(time.perf_counter() - start, route, method)
+            for op, count in request_scope.firestore.items():
+                http_request_firestore_ops.observe(count, route, op)
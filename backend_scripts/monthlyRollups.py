@@ -0,0 +1,105 @@
+# monthlyRollups.py
+from collections import defaultdict
+from datetime import datetime
+from profileEngine import build_monthly_rollup, empty_rollup, merge_monthly_rollups, parse_transactions
+from transactionStore import store_enabled, read_or_backfill, read_profile_frame
+from storage import run_transaction
+
+# --- 1. Configuration ---
+# One document per customer, keyed by their Firestore id; see profileEngine for the fields.
+ROLLUPS_COLLECTION = 'monthly_rollups'
+# Rollup documents read per get_all call, and written per batch (Firestore's batch limit is 500).
+ROLLUP_BATCH_SIZE = 300
+# Each rollup keeps the ids of the most recently folded transaction documents (newest
+# last), so folding the same documents again, e.g. after a failed sync, changes nothing.
+ROLLUP_FOLDED_IDS_KEPT = 1000
+
+# --- 2. Rebuilding ---
+
+def _transaction_frame(db, customer_id: str):
+    """
+    The customer's full history, with each row's 'transaction_firestore_id': from the
+    local transaction store when enabled, else Firestore.
+    """
+    if store_enabled():
+        return read_or_backfill(read_profile_frame, db, customer_id, True)
+    documents = list(db.collection('transactions').where('customer_firestore_id', '==', customer_id).stream())
+    frame = parse_transactions([doc.to_dict() for doc in documents])
+    return frame.assign(transaction_firestore_id=[documents[position].id for position in frame.index])
+
+def rebuild_rollup(db, customer_id: str, today: datetime = None) -> dict:
+    """(Re)builds a customer's rollup from their whole transaction history and saves it."""
+    frame = _transaction_frame(db, customer_id)
+    rollup = build_monthly_rollup(frame, today)
+    # The newest documents are the ones a sync that committed them may still be about to fold
+    newest = frame.sort_values('date', kind='stable')['transaction_firestore_id'].tolist()
+    rollup['folded_ids'] = newest[-ROLLUP_FOLDED_IDS_KEPT:]
+    db.collection(ROLLUPS_COLLECTION).document(customer_id).set(rollup)
+    return rollup
+
+# --- 3. Incremental Updates ---
+
+def fold_documents(rollup: dict, documents: dict, today: datetime = None):
+    """
+    The rollup with the {Firestore id: transaction document} it hasn't folded yet added
+    and their ids recorded, or None if it already holds them all.
+    """
+    folded_ids = rollup.get('folded_ids', [])
+    seen = set(folded_ids)
+    new_ids = [doc_id for doc_id in documents if doc_id not in seen]
+    if not new_ids: return None
+    delta = build_monthly_rollup([documents[doc_id] for doc_id in new_ids], today)
+    merged = merge_monthly_rollups(rollup, delta, today)
+    merged['folded_ids'] = (folded_ids + new_ids)[-ROLLUP_FOLDED_IDS_KEPT:]
+    return merged
+
+def update_rollups(db, documents: list[tuple[str, dict]], today: datetime = None):
+    """
+    Folds newly committed (Firestore id, transaction document) pairs into their
+    customers' rollups. Call it after the documents are committed: a customer
+    without a rollup yet is rebuilt from their full history instead, which
+    already includes them. Each chunk of rollups is read and written in one
+    transaction, so concurrent syncs of a customer don't overwrite each other's
+    fold, and documents a rollup has already folded are skipped.
+    """
+    by_customer = defaultdict(dict)
+    for doc_id, data in documents:
+        by_customer[data['customer_firestore_id']][doc_id] = data
+
+    customer_ids = list(by_customer)
+    for start in range(0, len(customer_ids), ROLLUP_BATCH_SIZE):
+        chunk = customer_ids[start:start + ROLLUP_BATCH_SIZE]
+        refs = [db.collection(ROLLUPS_COLLECTION).document(customer_id) for customer_id in chunk]
+
+        def fold_chunk(transaction):
+            # All reads come before the writes, as Firestore transactions require
+            snapshots = list(db.get_all(refs, transaction=transaction))
+            missing = []
+            for snapshot in snapshots:
+                if not snapshot.exists:
+                    missing.append(snapshot.id)
+                    continue
+                merged = fold_documents(snapshot.to_dict(), by_customer[snapshot.id], today)
+                if merged is not None:
+                    transaction.set(snapshot.reference, merged)
+            return missing
+
+        for customer_id in run_transaction(db, fold_chunk):
+            rebuild_rollup(db, customer_id, today)
+
+# --- 4. Reading ---
+
+def load_rollups(db, customer_ids, today: datetime = None):
+    """Yields (customer_id, rollup) for each customer, rebuilding any rollup that doesn't exist yet."""
+    customer_ids = list(customer_ids)
+    # The profile fields only; folded_ids is for update_rollups
+    field_paths = list(empty_rollup())
+    for start in range(0, len(customer_ids), ROLLUP_BATCH_SIZE):
+        refs = [db.collection(ROLLUPS_COLLECTION).document(c) for c in customer_ids[start:start + ROLLUP_BATCH_SIZE]]
+        for snapshot in db.get_all(refs, field_paths=field_paths):
+            yield snapshot.id, snapshot.to_dict() if snapshot.exists else rebuild_rollup(db, snapshot.id, today)
+
+def load_rollup(db, customer_id: str, today: datetime = None) -> dict:
+    for _, rollup in load_rollups(db, [customer_id], today):
+        return rollup
+    return empty_rollup()
@@ -0,0 +1,183 @@
+# nessieCache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# --- 1. Configuration ---
+# SQLite file for cached Nessie GET responses; unset (the default) disables the cache.
+# The nightly job, the API and testdashboard.py can share one file.
+NESSIE_CACHE_PATH = os.environ.get('NESSIE_CACHE_PATH')
+# The oldest entries (by last use) are evicted once the cached bodies exceed this size.
+NESSIE_CACHE_MAX_BYTES = int(os.environ.get('NESSIE_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+# Seconds a response stays fresh, by endpoint template; others use NESSIE_CACHE_DEFAULT_TTL.
+# Transaction lists change most often, customer records least. Override entries with
+# NESSIE_CACHE_TTLS, e.g. "/accounts=300,/accounts/{id}/purchases=60".
+NESSIE_CACHE_DEFAULT_TTL = float(os.environ.get('NESSIE_CACHE_DEFAULT_TTL', '300'))
+NESSIE_CACHE_TTLS = {
+    '/customers/{id}': 3600,
+    '/customers/{id}/accounts': 900,
+    '/accounts': 900,
+    '/accounts/{id}/deposits': 300,
+    '/accounts/{id}/purchases': 300,
+    '/accounts/{id}/withdrawals': 300,
+}
+for _entry in filter(None, os.environ.get('NESSIE_CACHE_TTLS', '').split(',')):
+    _template, _, _seconds = _entry.partition('=')
+    NESSIE_CACHE_TTLS[_template.strip()] = float(_seconds)
+
+# Hits note last_used in memory; it's written with the next store, or once this many
+# hits are pending, so reads don't take the SQLite write lock (see ResponseCache.get).
+NESSIE_CACHE_TOUCH_BATCH = int(os.environ.get('NESSIE_CACHE_TOUCH_BATCH', '1000'))
+
+# Returned by get() on a miss, since None is a legitimate response.
+MISSING = object()
+
+# --- 2. Response Cache ---
+
+class ResponseCache:
+    """
+    A persistent, size-bounded cache of Nessie GET response bodies in SQLite, keyed
+    by URL (and API key, since each key sees its own customers). Entries expire after
+    their endpoint's TTL and the least recently used are evicted past max_bytes.
+    Each body's content hash is kept, so refetches of unchanged data are counted.
+    Safe to share between threads, and between processes through the file. Calls
+    block on SQLite, so async callers run them in a thread.
+    """
+
+    def __init__(self, path: str, max_bytes: int = NESSIE_CACHE_MAX_BYTES, ttls: dict = None,
+                 default_ttl: float = NESSIE_CACHE_DEFAULT_TTL, clock=time.time):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = NESSIE_CACHE_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # {key: last used} for hits not yet written
+        self._touched = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._conn:
+            if path != ':memory:':
+                self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, body BLOB NOT NULL, content_hash TEXT NOT NULL, '
+                'size INTEGER NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+        self._bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.stores = 0
+        self.unchanged = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(base_url: str, endpoint: str, api_key: str) -> str:
+        """The cache key for a GET; the API key is hashed, not stored."""
+        return f"{hashlib.sha256(api_key.encode()).hexdigest()[:16]} {base_url.rstrip('/')}{endpoint}"
+
+    def get(self, key: str):
+        """Returns the cached body (bytes), or MISSING if absent or expired."""
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute('SELECT body, expires_at FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return MISSING
+            body, expires_at = row
+            if expires_at <= now:
+                # Kept until it's refetched, to tell whether the data changed
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            # Written later in one go: another process's write must not hold up a read
+            self._touched[key] = now
+            if len(self._touched) >= NESSIE_CACHE_TOUCH_BATCH:
+                with self._conn:
+                    self._write_touched()
+            self.hits += 1
+            return body
+
+    def set(self, key: str, endpoint: str, body: bytes):
+        """Stores a response body for its endpoint template's TTL, then evicts past max_bytes."""
+        now = self._clock()
+        content_hash = hashlib.sha256(body).hexdigest()
+        expires_at = now + self.ttls.get(endpoint, self.default_ttl)
+        with self._lock:
+            previous = self._conn.execute('SELECT content_hash, size FROM responses WHERE key = ?', (key,)).fetchone()
+            with self._conn:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO responses (key, endpoint, body, content_hash, size, expires_at, last_used) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', (key, endpoint, body, content_hash, len(body), expires_at, now)
+                )
+                self._touched.pop(key, None)
+                self._write_touched()
+            self.stores += 1
+            if previous is not None:
+                self.unchanged += previous[0] == content_hash
+                self._bytes -= previous[1]
+            self._bytes += len(body)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _write_touched(self):
+        """Writes the pending hits' last_used, keeping a newer one from another process. Caller holds the lock, in a transaction."""
+        self._conn.executemany('UPDATE responses SET last_used = MAX(last_used, ?) WHERE key = ?',
+                               [(used, key) for key, used in self._touched.items()])
+        self._touched.clear()
+
+    def _evict(self):
+        """Drops the least recently used entries until the cache is back under 90% of max_bytes. Caller holds the lock."""
+        # Other processes write the same file, so start from the real total
+        self._bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        target = self.max_bytes * 0.9
+        if self._bytes <= self.max_bytes: return
+        evicted = []
+        for key, size in self._conn.execute('SELECT key, size FROM responses ORDER BY last_used'):
+            if self._bytes <= target: break
+            evicted.append((key,))
+            self._bytes -= size
+        with self._conn:
+            self._conn.executemany('DELETE FROM responses WHERE key = ?', evicted)
+        self.evictions += len(evicted)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM responses')
+            self._touched.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expirations": self.expirations,
+            "stores": self.stores,
+            "unchanged_on_refetch": self.unchanged,
+            "evictions": self.evictions,
+        }
+
+# --- 3. Process-wide Cache ---
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Returns the process-wide cache at NESSIE_CACHE_PATH, opened on first use, or None if it isn't set."""
+    global _cache
+    if not NESSIE_CACHE_PATH: return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(NESSIE_CACHE_PATH)
+        return _cache
@@ -0,0 +1,190 @@
+# nessieClient.py
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from metrics import record_nessie
+import nessieCache
+from nessieCache import MISSING, ResponseCache, get_response_cache
+
+# --- 1. Configuration ---
+NESSIE_API_KEY = os.environ.get('NESSIE_API_KEY', '933f9b5bbbb8094ff92c2ea78ece8502')
+NESSIE_BASE_URL = os.environ.get('NESSIE_BASE_URL', 'http://api.nessieisreal.com')
+# Seconds to wait for a Nessie response.
+NESSIE_TIMEOUT = float(os.environ.get('NESSIE_TIMEOUT', '15'))
+# Retries for connection errors and transient statuses, with exponential backoff between attempts.
+NESSIE_MAX_RETRIES = int(os.environ.get('NESSIE_MAX_RETRIES', '3'))
+NESSIE_BACKOFF_FACTOR = float(os.environ.get('NESSIE_BACKOFF_FACTOR', '0.5'))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Upper bound on Nessie requests in flight at once (override with NESSIE_MAX_CONCURRENCY).
+NESSIE_MAX_CONCURRENCY = int(os.environ.get('NESSIE_MAX_CONCURRENCY', '8'))
+
+# Per-account Nessie endpoints, mapped to the 'type' stored on each synced transaction.
+TRANSACTION_ENDPOINTS = {
+    'deposits': 'deposit',
+    'purchases': 'purchase',
+    'withdrawals': 'withdrawal',
+}
+
+# --- 2. Pooled Session ---
+
+_session = None
+_session_pool_size = 0
+_session_lock = threading.Lock()
+
+def get_session(pool_size: int = None) -> 'requests.Session':
+    """
+    Returns the process-wide requests session for Nessie, created on first use.
+    Connections are kept alive and pooled (one slot per concurrent fetch), and
+    GETs are retried on connection errors and RETRY_STATUSES. POSTs are only
+    retried when the connection failed before the request was sent.
+    Callers running more than NESSIE_MAX_CONCURRENCY requests at once pass that
+    number as pool_size, so the pool grows instead of discarding connections.
+    """
+    global _session, _session_pool_size
+    pool_size = max(pool_size or NESSIE_MAX_CONCURRENCY, 10)
+    with _session_lock:
+        if _session is None:
+            # requests is imported on first use: the API only needs it once a sync runs
+            import requests
+            _session = requests.Session()
+        if pool_size > _session_pool_size:
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            retry = Retry(
+                total=NESSIE_MAX_RETRIES,
+                backoff_factor=NESSIE_BACKOFF_FACTOR,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset(['GET']),
+                raise_on_status=False,
+            )
+            # Replaces a smaller pool; its connections close once in-flight requests are done
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+            _session_pool_size = pool_size
+        return _session
+
+def endpoint_template(endpoint: str) -> str:
+    """The endpoint with its ids replaced, for metric labels: /accounts/{id}/purchases."""
+    segments = endpoint.split('?')[0].strip('/').split('/')
+    return '/' + '/'.join('{id}' if i % 2 else segment for i, segment in enumerate(segments))
+
+def _timed_request(method: str, endpoint: str, send):
+    """Sends the request and records its latency and final status (after retries) for the metrics."""
+    start, status = time.perf_counter(), 'error'
+    try:
+        response = send()
+        status = response.status_code
+        return response
+    finally:
+        record_nessie(method, endpoint_template(endpoint), status, time.perf_counter() - start)
+
+def _cached_response(base_url: str, endpoint: str):
+    """(cache, key, cached body or MISSING) for a GET; the cache is None unless NESSIE_CACHE_PATH is set."""
+    cache = get_response_cache()
+    if cache is None:
+        return None, None, MISSING
+    key = ResponseCache.key(base_url, endpoint, NESSIE_API_KEY)
+    return cache, key, cache.get(key)
+
+def nessie_get(endpoint: str, timeout: float = None):
+    """
+    GETs a Nessie endpoint and returns the parsed JSON, or None on a 404.
+    Other failures raise requests exceptions for the caller to handle.
+    With NESSIE_CACHE_PATH set, successful responses are served from the
+    on-disk cache until their endpoint's TTL runs out.
+    """
+    cache, key, body = _cached_response(NESSIE_BASE_URL, endpoint)
+    if body is not MISSING:
+        return json.loads(body)
+    response = _timed_request('GET', endpoint, lambda: get_session().get(
+        f"{NESSIE_BASE_URL}{endpoint}", params={'key': NESSIE_API_KEY}, timeout=timeout or NESSIE_TIMEOUT
+    ))
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    if cache is not None:
+        cache.set(key, endpoint_template(endpoint), response.content)
+    return response.json()
+
+def nessie_post(endpoint: str, payload: dict, timeout: float = None) -> 'requests.Response':
+    """POSTs a JSON payload to a Nessie endpoint and returns the response for the caller to inspect."""
+    return _timed_request('POST', endpoint, lambda: get_session().post(
+        f"{NESSIE_BASE_URL}{endpoint}", params={'key': NESSIE_API_KEY}, json=payload, timeout=timeout or NESSIE_TIMEOUT
+    ))
+
+# --- 3. Async Client ---
+
+def create_async_client() -> httpx.AsyncClient:
+    """Creates a pooled httpx client for Nessie; the owner is responsible for closing it."""
+    limits = httpx.Limits(max_connections=max(NESSIE_MAX_CONCURRENCY, 10), max_keepalive_connections=max(NESSIE_MAX_CONCURRENCY, 10))
+    return httpx.AsyncClient(base_url=NESSIE_BASE_URL, timeout=NESSIE_TIMEOUT, limits=limits)
+
+async def nessie_get_async(client: httpx.AsyncClient, endpoint: str):
+    """
+    The async counterpart of nessie_get, with the same retry policy: returns the
+    parsed JSON, or None on a 404, and raises httpx exceptions otherwise. It
+    shares the on-disk cache too, read and written in a thread since it's SQLite.
+    """
+    if nessieCache.NESSIE_CACHE_PATH:
+        cache, key, body = await asyncio.to_thread(_cached_response, str(client.base_url), endpoint)
+    else:
+        cache, key, body = None, None, MISSING
+    if body is not MISSING:
+        return json.loads(body)
+    start, status = time.perf_counter(), 'error'
+    try:
+        for attempt in range(NESSIE_MAX_RETRIES + 1):
+            last_attempt = attempt == NESSIE_MAX_RETRIES
+            try:
+                response = await client.get(endpoint, params={'key': NESSIE_API_KEY})
+            except httpx.TransportError:
+                status = 'error'
+                if last_attempt: raise
+            else:
+                status = response.status_code
+                if response.status_code == 404:
+                    return None
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    response.raise_for_status()
+                    if cache is not None:
+                        await asyncio.to_thread(cache.set, key, endpoint_template(endpoint), response.content)
+                    return response.json()
+            await asyncio.sleep(NESSIE_BACKOFF_FACTOR * (2 ** attempt))
+    finally:
+        record_nessie('GET', endpoint_template(endpoint), status, time.perf_counter() - start)
+
+# --- 4. Concurrent Fetching ---
+
+def fetch_account_transactions(account_ids, get_request, max_concurrency: int = None):
+    """
+    Fetches deposits, purchases and withdrawals for many accounts concurrently.
+
+    Every (account, endpoint) pair is fanned out over one bounded thread pool, so
+    the whole batch costs roughly the slowest request instead of the sum of all.
+    `get_request` is the caller's Nessie GET helper, which keeps each script's own
+    error handling. Returns {account_id: [transactions tagged with 'type']}.
+    """
+    account_ids = list(dict.fromkeys(account_ids))
+    jobs = [(account_id, endpoint) for account_id in account_ids for endpoint in TRANSACTION_ENDPOINTS]
+    if not jobs: return {}
+
+    workers = max(1, min(max_concurrency or NESSIE_MAX_CONCURRENCY, len(jobs)))
+    get_session(pool_size=workers)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nessie') as executor:
+        futures = [executor.submit(get_request, f"/accounts/{account_id}/{endpoint}") for account_id, endpoint in jobs]
+        responses = [future.result() for future in futures]
+
+    return _group_by_account(account_ids, jobs, responses)
+
+def _group_by_account(account_ids, jobs, responses):
+    """Assembles {account_id: [transactions tagged with 'type']} from per-endpoint responses."""
+    transactions_by_account = {account_id: [] for account_id in account_ids}
+    for (account_id, endpoint), records in zip(jobs, responses):
+        txn_type = TRANSACTION_ENDPOINTS[endpoint]
+        transactions_by_account[account_id].extend({**t, 'type': txn_type} for t in records or [])
+    return transactions_by_account
@@ -1,69 +1,60 @@
 # profile_aggregator.py
 import os
-import math
+import argparse
+import csv
+import time
+from collections import deque
 from datetime import datetime
-from collections import defaultdict
-import numpy as np
-import pandas as pd
 import requests
-# Import Google Cloud and helper libraries
-import firebase_admin
-from firebase_admin import credentials, firestore
-from dateutil.rrule import rrule, MONTHLY
-from dateutil.parser import parse
-from dateutil.relativedelta import relativedelta
-import requests
-import json
+from nessieClient import NESSIE_MAX_CONCURRENCY, nessie_get
+from profileEngine import profile_from_rollup, analyze_customers, PROFILE_WORKERS
+from storage import get_client
+from transactionStore import store_enabled, record_synced_transactions, backfill_customer
+from monthlyRollups import load_rollups, update_rollups, rebuild_rollup
+from firestoreSync import (
+    load_sync_cursors, filter_new_transactions, advance_sync_cursor, save_sync_cursors,
+    backfill_transaction_timestamps
+)
+from syncPipeline import run_sync_pipeline
+from metrics import stage, staged, stage_summary, write_textfile
+from profiling import PROFILE_MODES, capture, capture_path
+from nessieCache import get_response_cache
+from jobCheckpoints import (
+    default_run_id, shard_of, start_shard, finish_shard, checkpoint, checkpoint_ref, load_completed, run_summary
+)
 
 # --- 1. Configuration ---
-# The URL of your running FastAPI application
-BASE_URL = "http://127.0.0.1:8000"
+# The running API (e.g. http://127.0.0.1:8000), told to drop cached analysis results for
+# the profiles the job rewrites; unset (the default) skips that.
+API_BASE_URL = os.environ.get('API_BASE_URL', '').rstrip('/')
 # The Nessie Customer ID you want to sync
 
 
-# Construct the full endpoint URL
-NESSIE_API_KEY = '933f9b5bbbb8094ff92c2ea78ece8502'
-NESSIE_BASE_URL = 'http://api.nessieisreal.com'
 # --- 1. Configuration & Initialization ---
-CREDENTIALS_PATH = 'ubuntu/mvidia-c10e5-firebase-adminsdk-fbsvc-b0e12b6e77.json'
+# Financial profiles are saved in Firestore batches of this many documents.
+PROFILE_WRITE_BATCH_SIZE = 200
 def nessie_get_request(endpoint: str):
     """Makes a GET request to the Nessie API and handles common errors."""
-    url = f"{NESSIE_BASE_URL}{endpoint}?key={NESSIE_API_KEY}"
     try:
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        return response.json()
+        return nessie_get(endpoint)
     except requests.exceptions.RequestException as e:
         print(f"  ERROR: Could not connect to Nessie API at {endpoint}. Reason: {e}")
         return None
 
-def sync_document(collection_name: str, nessie_data: dict, extra_fields: dict = None):
-    """Syncs a Nessie record to Firestore, preventing duplicates."""
-    nessie_id = nessie_data.get('_id')
-    if not nessie_id: return None
-
-    docs = db.collection(collection_name).where('nessie_id', '==', nessie_id).limit(1).stream()
-    existing_doc = next(docs, None)
-
-    if existing_doc:
-        return existing_doc.id
-    else:
-        firestore_data = nessie_data.copy()
-        firestore_data['nessie_id'] = firestore_data.pop('_id')
-        if extra_fields:
-            firestore_data.update(extra_fields)
-        
-        _update_time, doc_ref = db.collection(collection_name).add(firestore_data)
-        return doc_ref.id
-
 # --- 3. New Master Sync Function ---
 
-def sync_all_nessie_data():
+def sync_all_nessie_data(full_resync: bool = False, customer_timings: dict = None, select_customers=None):
     """
     Fetches all accounts from Nessie, but ONLY syncs data for customers
     that already exist in the Firestore 'users' collection.
+
+    By default each account is synced incrementally from its stored cursor;
+    pass full_resync=True to re-check the account's whole history. With a
+    customer_timings dict, each synced customer's fetch and write times are added to it.
+    select_customers(firestore_ids) returns the customers to sync, e.g. one shard's.
     """
     print("\n--- 🔄 Starting Controlled Sync from Nessie API ---")
+    init_db()
 
     # 1. Get all existing customers from Firestore first.
     # Create a map of {nessie_id: firestore_id} for fast lookups.
@@ -80,6 +71,11 @@ def sync_all_nessie_data():
         return []
     
     print(f"Found {len(existing_customers_map)} existing customers to process.")
+    if select_customers is not None:
+        selected = select_customers(list(existing_customers_map.values()))
+        existing_customers_map = {n: f for n, f in existing_customers_map.items() if f in selected}
+        print(f"Selected {len(existing_customers_map)} of them for this run.")
+        if not existing_customers_map: return []
 
     # 2. Fetch all accounts from Nessie.
     all_accounts = nessie_get_request('/accounts')
@@ -93,44 +89,110 @@ def sync_all_nessie_data():
     ]
     print(f"Found {len(accounts_to_sync)} accounts belonging to existing customers.")
     
-    # 4. Sync the filtered accounts and their transactions.
-    synced_customer_firestore_ids = set()
-
-    for account in accounts_to_sync:
-        nessie_customer_id = account['customer_id']
-        customer_firestore_id = existing_customers_map[nessie_customer_id]
-        synced_customer_firestore_ids.add(customer_firestore_id)
-
-        nessie_account_id = account['_id']
-        account_firestore_id = sync_document('accounts', account, {'customer_firestore_id': customer_firestore_id})
-        
-        # Fetch and sync all transaction types
-        deposits = nessie_get_request(f"/accounts/{nessie_account_id}/deposits") or []
-        purchases = nessie_get_request(f"/accounts/{nessie_account_id}/purchases") or []
-        withdrawals = nessie_get_request(f"/accounts/{nessie_account_id}/withdrawals") or []
-        
-        all_txns = (
-            [{**t, 'type': 'deposit'} for t in deposits] +
-            [{**t, 'type': 'purchase'} for t in purchases] +
-            [{**t, 'type': 'withdrawal'} for t in withdrawals]
+    # 4. Load each account's sync cursor; only the records past it are written. A full
+    # resync ignores the cursors and re-checks every record against Firestore.
+    cursors = {} if full_resync else load_sync_cursors(db, [acc['_id'] for acc in accounts_to_sync])
+    print(f"Sync mode: {'full resync' if full_resync else 'incremental'} ({len(cursors)} accounts have a cursor).")
+
+    # 5. Fetch and write through the sync pipeline: accounts download (concurrency
+    # NESSIE_MAX_CONCURRENCY) while earlier ones are being written. Known nessie_ids are
+    # prefetched only where there is something to write, and new records are batch-written.
+    print(f"Syncing transactions for {len(accounts_to_sync)} accounts (concurrency {NESSIE_MAX_CONCURRENCY})...")
+    synced_customer_firestore_ids = {existing_customers_map[acc['customer_id']] for acc in accounts_to_sync}
+    updated_cursors = {}
+    synced_counts = {}
+    # Accounts with an endpoint that failed to download; records the others returned are
+    # still written, but the cursor stays put so the next sync fetches the failed one again.
+    failed_accounts = set()
+
+    def get_account_records(endpoint):
+        """nessie_get_request for an /accounts/{id}/... endpoint, noting the account when the download fails."""
+        try:
+            return nessie_get(endpoint)
+        except requests.exceptions.RequestException as e:
+            print(f"  ERROR: Could not connect to Nessie API at {endpoint}. Reason: {e}")
+            failed_accounts.add(endpoint.split('/')[2])
+            return None
+
+    def advance_cursor(account, new_txns):
+        synced_counts[account['_id']] = len(new_txns)
+        if account['_id'] in failed_accounts:
+            print(f"  WARNING: Not advancing the cursor of account {account['_id']}; an endpoint failed to download.")
+        elif new_txns:
+            updated_cursors[account['_id']] = advance_sync_cursor(cursors.get(account['_id']), new_txns)
+
+    try:
+        result = run_sync_pipeline(
+            db, accounts_to_sync, {acc['_id']: existing_customers_map[acc['customer_id']] for acc in accounts_to_sync},
+            get_account_records,
+            # Accounts only get a cursor once synced, so one without a cursor may be new.
+            write_account=lambda account: account['_id'] not in cursors,
+            select_transactions=lambda account, txns: filter_new_transactions(txns, cursors.get(account['_id'])),
+            on_account_written=advance_cursor,
+            prefetch_all=full_resync,
         )
+    except Exception as e:
+        # The next sync's de-dup skips what is already committed, so fold it in now
+        if getattr(e, 'committed', None):
+            print(f"  Sync failed; folding the {len(e.committed)} transactions committed before the failure.")
+            if store_enabled():
+                record_synced_transactions(db, e.committed)
+            update_rollups(db, e.committed)
+        raise
+
+    # Fold the committed transactions into the store and the monthly rollups. A full
+    # resync rebuilds both from each customer's whole history instead, which also
+    # repairs any that missed transactions committed by an earlier, failed sync.
+    committed = result['committed']
+    if full_resync:
+        for customer_id in synced_customer_firestore_ids:
+            if store_enabled():
+                backfill_customer(db, customer_id)
+            rebuild_rollup(db, customer_id)
+    else:
+        if store_enabled():
+            record_synced_transactions(db, committed)
+        update_rollups(db, committed)
 
-        print(f"  Syncing {len(all_txns)} transactions for account {nessie_account_id}...")
-        for txn in all_txns:
-            sync_document('transactions', txn, {'customer_firestore_id': customer_firestore_id})
+    # Cursors move only after the transactions they cover are committed.
+    save_sync_cursors(db, updated_cursors, updated_at=datetime.utcnow())
 
+    print(f"  Created {result['accounts_created']} accounts and {result['transactions_created']} transactions "
+          f"({result['transactions_skipped']} transactions already synced, {len(updated_cursors)} cursors advanced).")
     print("--- ✅ Controlled Sync Complete ---")
+
+    if customer_timings is not None:
+        for acc in accounts_to_sync:
+            timings = customer_timings.setdefault(existing_customers_map[acc['customer_id']], new_customer_timings())
+            account_timings = result['account_timings'].get(acc['_id'], {})
+            timings['accounts'] += 1
+            timings['transactions'] += synced_counts.get(acc['_id'], 0)
+            timings['fetch_s'] += account_timings.get('fetch_s', 0.0)
+            timings['write_s'] += account_timings.get('write_s', 0.0)
     return list(synced_customer_firestore_ids)
-try:
-    cred = credentials.Certificate(CREDENTIALS_PATH)
-    if not firebase_admin._apps:
-        firebase_admin.initialize_app(cred)
-except Exception as e:
-    print(f"Error initializing Firebase Admin SDK: {e}")
-    print("Ensure the credentials path is correct and the file is accessible.")
-    exit()
 
-db = firestore.client()
+def new_customer_timings() -> dict:
+    return {'accounts': 0, 'transactions': 0, 'fetch_s': 0.0, 'write_s': 0.0, 'analyze_s': 0.0}
+
+def save_customer_timings(path: str, customer_timings: dict):
+    """Writes one CSV row per customer, slowest (fetch + write + analyze) first."""
+    columns = list(new_customer_timings())
+    rows = sorted(customer_timings.items(), key=lambda item: -(item[1]['fetch_s'] + item[1]['write_s'] + item[1]['analyze_s']))
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['customer_id', *columns])
+        for customer_id, timings in rows:
+            writer.writerow([customer_id, *(round(v, 6) if isinstance(v, float) else v for v in (timings[c] for c in columns))])
+# Firestore, or the local stand-in when STORAGE_BACKEND is 'memory' or 'sqlite'; created
+# on first use by init_db() so importing this module has no side effects
+db = None
+
+def init_db():
+    """Creates the database client unless already set (e.g. by a benchmark)."""
+    global db
+    if db is None:
+        db = get_client()
+    return db
 
 # --- 2. Data Fetching Functions ---
 
@@ -144,168 +206,185 @@ def get_all_customer_ids():
         print(f"  ERROR: Could not fetch customer IDs. Reason: {e}")
         return []
 
-def get_transactions_for_customer(customer_firestore_id: str):
-    """Retrieves all transactions for a given customer from Firestore."""
+def save_financial_profiles(profiles: dict, checkpoints: list[dict] = ()):
+    """Writes {customer_id: profile} to 'financial_profiles', and the job's checkpoints, in a single batch."""
+    batch = db.batch()
+    for customer_id, profile in profiles.items():
+        batch.set(db.collection('financial_profiles').document(customer_id), profile)
+    for data in checkpoints:
+        batch.set(checkpoint_ref(db, data['run_id'], data['customer_id']), data)
+    batch.commit()
+
+def invalidate_api_profile_cache(customer_ids: list[str]):
+    """Tells the running API at API_BASE_URL to drop its cached analysis results for these customers (best effort)."""
+    if not API_BASE_URL: return
     try:
-        accounts_query = db.collection('accounts').where('customer_firestore_id', '==', customer_firestore_id).stream()
-        account_ids = [account.id for account in accounts_query]
-        if not account_ids: return []
-        if len(account_ids) > 30:
-            print(f"  WARNING: Customer {customer_firestore_id} has >30 accounts. Skipping.")
-            return []
-        transactions_query = db.collection('transactions').where('customer_firestore_id', '==', customer_firestore_id).stream()
-        return [t.to_dict() for t in transactions_query]
-    except Exception as e:
-        print(f"  ERROR: Could not fetch transactions for {customer_firestore_id}. Reason: {e}")
-        return []
-
-# --- 3. Analysis Functions ---
-
-def calculate_historical_profile(transactions: list[dict]):
-    """
-    Calculates a baseline financial profile using ONLY completed historical months.
-    """
-    if not transactions: return None, None
-    
-    monthly_data = defaultdict(lambda: {'income': 0.0, 'expenses': 0.0})
-    valid_dates = []
-    
-    for t in transactions:
-        date_str = t.get('purchase_date') or t.get('transaction_date') or t.get('payment_date')
-        if not date_str: continue
-        try:
-            parsed_date = parse(date_str)
-            valid_dates.append(parsed_date)
-            month_key = parsed_date.strftime('%Y-%m')
-            amount = t.get('amount', 0)
-            if t.get('type') == 'deposit': monthly_data[month_key]['income'] += amount
-            elif t.get('type') in ['withdrawal', 'purchase']: monthly_data[month_key]['expenses'] += amount
-        except (ValueError, TypeError): continue
-
-    if not valid_dates: return None, None
-    
-    start_date, end_date = min(valid_dates), max(valid_dates)
-    date_range = [dt.strftime('%Y-%m') for dt in rrule(MONTHLY, dtstart=start_date, until=end_date)]
-    
-    income_series = pd.Series([monthly_data[m]['income'] for m in date_range], index=pd.to_datetime(date_range))
-    expenses_series = pd.Series([monthly_data[m]['expenses'] for m in date_range], index=pd.to_datetime(date_range))
-
-    # Exclude the current, partial month to ensure a stable baseline
-    today = datetime.now()
-    if not income_series.empty:
-        last_data_month = income_series.index[-1]
-        if last_data_month.year == today.year and last_data_month.month == today.month:
-            print(f"  INFO: Excluding partial data for {today.strftime('%Y-%m')} from historical analysis.")
-            income_series = income_series[:-1]
-            expenses_series = expenses_series[:-1]
-
-    if len(income_series) < 2: return None, None
-
-    monthly_fcf_series = income_series - expenses_series
-    ewma_series = monthly_fcf_series.ewm(span=3, adjust=False).mean()
-    predicted_fcf = ewma_series.iloc[-1]
-    
-    historical_profile = {
-        "ewma_predicted_fcf": round(float(predicted_fcf), 2),
-        "mean_free_cash_flow": round(float(monthly_fcf_series.mean()), 2),
-        "std_dev_free_cash_flow": round(float(monthly_fcf_series.std(ddof=0)), 2),
-        "months_analyzed": len(income_series),
-    }
-    
-    return historical_profile, expenses_series
-
-def adjust_for_current_month_outliers(all_transactions: list[dict], historical_expenses: pd.Series, baseline_profile: dict):
-    """
-    Finds outliers in the current month and amortizes their impact on the baseline prediction.
-    """
-    if historical_expenses is None or historical_expenses.empty:
-        return {**baseline_profile, "final_adjusted_fcf": baseline_profile.get("ewma_predicted_fcf", 0)}
-
-    today = datetime.now()
-    
-    current_month_transactions = [
-        t for t in all_transactions 
-        if parse(t.get('purchase_date') or t.get('transaction_date', '1900-01-01')).strftime('%Y-%m') == today.strftime('%Y-%m')
-    ]
-
-    if not current_month_transactions:
-        return {**baseline_profile, "final_adjusted_fcf": baseline_profile.get("ewma_predicted_fcf", 0)}
-
-    q1 = historical_expenses.quantile(0.25)
-    q3 = historical_expenses.quantile(0.75)
-    iqr = q3 - q1
-    outlier_fence = q3 + 1.5 * iqr
-
-    current_outliers = [
-        t['amount'] for t in current_month_transactions
-        if t.get('type') in ['withdrawal', 'purchase'] and t['amount'] > outlier_fence
-    ]
-    
-    total_outlier_cost = sum(current_outliers)
-    adjusted_profile = baseline_profile.copy()
-    
-    if total_outlier_cost > 0:
-        amortization_period_months = 3
-        monthly_outlier_impact = total_outlier_cost / amortization_period_months
-        print(f"  INFO: Found ${total_outlier_cost:.2f} in current-month outliers. Adjusting forecast by ${monthly_outlier_impact:.2f}/month.")
-        adjusted_profile["current_month_outlier_impact"] = round(monthly_outlier_impact, 2)
-        adjusted_profile["final_adjusted_fcf"] = round(baseline_profile["ewma_predicted_fcf"] - monthly_outlier_impact, 2)
-    else:
-        # If no outliers, the final prediction is the same as the baseline
-        adjusted_profile["current_month_outlier_impact"] = 0.0
-        adjusted_profile["final_adjusted_fcf"] = baseline_profile["ewma_predicted_fcf"]
-
-    return adjusted_profile
+        response = requests.post(f"{API_BASE_URL}/cache/profiles/invalidate", json={'customer_ids': customer_ids}, timeout=5)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"  WARNING: Could not invalidate the API profile cache. Reason: {e}")
 
 # --- 4. Main Orchestration Logic ---
-def main():
+def main(full_resync: bool = False, workers: int = None, customer_timings: dict = None,
+         run_id: str = None, shard_index: int = 0, shard_count: int = 1):
     """
     Main function to run the entire data pipeline:
-    1. Sync all data from Nessie.
-    2. Analyze the synced data to create financial profiles.
+    1. Sync all data from Nessie (incrementally, unless full_resync is set).
+    2. Analyze the synced customers' monthly rollups to create financial profiles,
+       spread across `workers` processes, and save them in batches.
+
+    Only customers whose Firestore id hashes to shard_index (of shard_count) are
+    processed, so shards can run on separate machines. Each customer's outcome is
+    checkpointed under run_id (default: today's run); running the same run and shard
+    again skips the customers it already finished, syncing included.
+
+    With a customer_timings dict, each customer's fetch, write and analysis times are
+    collected into it; the analysis then runs in-process so it can be timed.
     """
-    print(f"--- ⚙️ Starting nightly job at {datetime.now()} ---")
-    
+    run_id = run_id or default_run_id()
+    init_db()
+    print(f"--- ⚙️ Starting nightly job at {datetime.now()} (run {run_id}, shard {shard_index} of {shard_count}) ---")
+    if not API_BASE_URL:
+        print("  INFO: API_BASE_URL is not set; the API's cached analysis results won't be invalidated.")
+    start_shard(db, run_id, shard_index, shard_count)
+    completed = set()
+
+    def select_customers(customer_ids):
+        in_shard = [c for c in customer_ids if shard_of(c, shard_count) == shard_index]
+        completed.update(load_completed(db, run_id, in_shard))
+        if completed:
+            print(f"Resuming run {run_id}: {len(completed)} of this shard's {len(in_shard)} customers are already done.")
+        return set(in_shard) - completed
+
     # 1. Run the master sync to discover and update all customer data
-    customer_ids_to_process = sync_all_nessie_data()
-    
+    with stage('nightly', 'sync') as sync_stage:
+        customer_ids_to_process = sync_all_nessie_data(
+            full_resync=full_resync, customer_timings=customer_timings, select_customers=select_customers)
+        sync_stage.count(len(customer_ids_to_process))
+
     if not customer_ids_to_process:
         print("No customers to process after sync. Exiting.")
+        finish_shard(db, run_id, shard_index, shard_count, customers=len(completed))
+        print(f"\n--- 📋 Run summary (all shards) ---\n{run_summary(db, run_id)}")
         return
 
-    print("\n--- 🧠 Starting Financial Profile Analysis ---")
+    workers = 1 if customer_timings is not None else workers or PROFILE_WORKERS
+    print(f"\n--- 🧠 Starting Financial Profile Analysis ({workers} workers) ---")
     success_count, failure_count = 0, 0
+    pending_profiles = {}
+    # Every customer's outcome; flushed with the profiles, so a batch is at most
+    # 2 * PROFILE_WRITE_BATCH_SIZE writes.
+    pending_checkpoints = []
+
+    def record_outcome(customer_id, status, reason=None):
+        pending_checkpoints.append(checkpoint(run_id, customer_id, shard_index, shard_count, status, reason))
+        if len(pending_checkpoints) >= PROFILE_WRITE_BATCH_SIZE:
+            flush_profiles()
+
+    def customers_with_rollups():
+        nonlocal failure_count
+        for customer_id, rollup in staged('nightly', 'fetch', load_rollups(db, customer_ids_to_process)):
+            if not rollup['transaction_count']:
+                print(f"  INFO: No transactions found for {customer_id}.")
+                failure_count += 1
+                record_outcome(customer_id, 'skipped', 'no transactions')
+                continue
+            yield customer_id, rollup
 
-    # 2. Loop through the customers that were just synced
-    for customer_id in customer_ids_to_process:
-        print(f"\nAnalyzing customer: {customer_id}")
-        
-        all_transactions = get_transactions_for_customer(customer_id)
-        if not all_transactions:
-            print(f"  INFO: No transactions found for {customer_id}.")
+    def flush_profiles():
+        nonlocal success_count, failure_count
+        if not pending_checkpoints: return
+        try:
+            with stage('nightly', 'write') as write_stage:
+                save_financial_profiles(pending_profiles, pending_checkpoints)
+                write_stage.count(len(pending_profiles))
+            if pending_profiles:
+                print(f"  ✅ SUCCESS: Saved {len(pending_profiles)} financial profiles to Firestore.")
+                success_count += len(pending_profiles)
+                invalidate_api_profile_cache(list(pending_profiles))
+        except Exception as e:
+            print(f"  ❌ ERROR: Could not save {len(pending_profiles)} profiles. Reason: {e}")
+            failure_count += len(pending_profiles)
+        pending_profiles.clear()
+        pending_checkpoints.clear()
+
+    # In-process, results come back in input order, so each one's compute time is next in line
+    compute_seconds = deque()
+
+    def timed_profile_from_rollup(rollup, today):
+        start = time.perf_counter()
+        try:
+            return profile_from_rollup(rollup, today)
+        finally:
+            compute_seconds.append(time.perf_counter() - start)
+
+    # 2. Read the synced customers' rollups and analyze them across the worker pool
+    compute = profile_from_rollup if customer_timings is None else timed_profile_from_rollup
+    rollup_profiles = analyze_customers(customers_with_rollups(), workers=workers, compute=compute)
+    for customer_id, final_profile, error in staged('nightly', 'analyze', rollup_profiles):
+        if customer_timings is not None:
+            customer_timings.setdefault(customer_id, new_customer_timings())['analyze_s'] = compute_seconds.popleft()
+        if error:
+            print(f"  ❌ ERROR: Could not analyze {customer_id}. Reason: {error}")
             failure_count += 1
-            continue
-
-        historical_profile, historical_expenses = calculate_historical_profile(all_transactions)
-        
-        if historical_profile:
-            final_profile = adjust_for_current_month_outliers(all_transactions, historical_expenses, historical_profile)
+            record_outcome(customer_id, 'failed', str(error))
+        elif final_profile:
             final_profile["last_updated_utc"] = datetime.utcnow()
-            
-            try:
-                doc_ref = db.collection('financial_profiles').document(customer_id)
-                doc_ref.set(final_profile)
-                print(f"  ✅ SUCCESS: Financial profile for {customer_id} saved to Firestore.")
-                success_count += 1
-            except Exception as e:
-                print(f"  ❌ ERROR: Could not save profile for {customer_id}. Reason: {e}")
-                failure_count += 1
+            pending_profiles[customer_id] = final_profile
+            record_outcome(customer_id, 'success')
         else:
             print(f"  INFO: Not enough historical data to create a profile for {customer_id}.")
             failure_count += 1
-            
+            record_outcome(customer_id, 'skipped', 'not enough history')
+    flush_profiles()
+    finish_shard(db, run_id, shard_index, shard_count, customers=len(completed) + len(customer_ids_to_process))
+
     print(f"\n--- Job complete ---")
     print(f"Successfully analyzed: {success_count} | Failed or skipped: {failure_count}")
+    print(f"\n--- 📋 Run summary (all shards) ---\n{run_summary(db, run_id)}")
+    print(f"\n--- 📊 Stage metrics ---\n{stage_summary('nightly')}")
+    nessie_cache = get_response_cache()
+    if nessie_cache:
+        stats = nessie_cache.stats()
+        print(f"Nessie cache: {stats['hits']} hits, {stats['misses']} misses ({stats['expirations']} expired), "
+              f"{stats['unchanged_on_refetch']} refetched unchanged, {stats['entries']} entries / {stats['bytes']} bytes.")
+    write_textfile()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Nightly Nessie sync and financial profile job.")
+    parser.add_argument('--full-resync', action='store_true',
+                        help="Ignore per-account sync cursors and re-check every account's full history.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help=f"Processes for the analysis stage (default: PROFILE_WORKERS, currently {PROFILE_WORKERS}).")
+    parser.add_argument('--backfill-timestamps', action='store_true',
+                        help="Add the typed txn_ts field to transactions synced before it existed, then exit.")
+    parser.add_argument('--profile', nargs='?', const='cprofile', choices=list(PROFILE_MODES), default=None,
+                        help="Profile the whole run (cprofile: pstats of the main thread, the default; sample: "
+                             "folded stacks of every thread) and write per-customer timings, under PROFILE_DIR. "
+                             "The analysis runs in-process.")
+    parser.add_argument('--run-id', default=None,
+                        help="Checkpoint under this run; rerunning a run resumes it. Every shard of a run must use "
+                             "the same id (default: one run per UTC day, e.g. nightly-2026-01-31).")
+    parser.add_argument('--shard-index', type=int, default=0,
+                        help="Process only the customers whose id hashes to this shard (0 to --shard-count - 1).")
+    parser.add_argument('--shard-count', type=int, default=1, help="Total number of shards the run is split into.")
+    parser.add_argument('--summary', action='store_true',
+                        help="Print the run's success/failure counts merged across its shards, then exit.")
+    args = parser.parse_args()
+    if not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index must be between 0 and --shard-count - 1.")
+    shard = dict(run_id=args.run_id, shard_index=args.shard_index, shard_count=args.shard_count)
+    if args.summary:
+        print(run_summary(init_db(), args.run_id or default_run_id()))
+    elif args.backfill_timestamps:
+        print(f"Added txn_ts to {backfill_transaction_timestamps(init_db())} transactions.")
+    elif args.profile:
+        customer_timings = {}
+        run_path = capture_path('nightly', args.profile)
+        with capture(args.profile, run_path):
+            main(full_resync=args.full_resync, customer_timings=customer_timings, **shard)
+        timings_path = os.path.splitext(run_path)[0] + '-customers.csv'
+        save_customer_timings(timings_path, customer_timings)
+        print(f"🔬 Run profile: {run_path}\n🔬 Per-customer timings: {timings_path}")
+    else:
+        main(full_resync=args.full_resync, workers=args.workers, **shard)
\ No newline at end of file
@@ -0,0 +1,121 @@
+# profileCache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- 1. Configuration ---
+PROFILE_CACHE_MAX_ENTRIES = int(os.environ.get('PROFILE_CACHE_MAX_ENTRIES', '10000'))
+# Upper bound on staleness if an invalidation is ever missed (e.g. the API was down during the nightly job).
+PROFILE_CACHE_TTL_SECONDS = float(os.environ.get('PROFILE_CACHE_TTL_SECONDS', '600'))
+
+# Returned by get() on a miss, since None is a legitimate cached value.
+MISSING = object()
+
+# --- 2. LRU + TTL Cache ---
+
+class ProfileCache:
+    """
+    A thread-safe, in-process LRU cache with a per-entry TTL, keyed by customer
+    Firestore ID. Entries are dropped explicitly with invalidate() whenever a
+    sync or the nightly job rewrites the customer's financial profile.
+
+    A read that was already running when its key was invalidated must not put its
+    now stale value back: take generation(key) before reading and pass it to set(),
+    which then skips the write if an invalidate() or clear() came in between. The
+    generation also tells reads of the same key apart, e.g. for request coalescing.
+    """
+
+    def __init__(self, max_entries: int = PROFILE_CACHE_MAX_ENTRIES, ttl_seconds: float = PROFILE_CACHE_TTL_SECONDS,
+                 clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()
+        # The generation at which each key was last invalidated, oldest first. Only the
+        # newest max_entries are kept; generations before _floor count as invalidated.
+        self._generation = 0
+        self._invalidated = OrderedDict()
+        self._floor = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_sets = 0
+
+    def get(self, key: str):
+        """Returns the cached value, or MISSING if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _key_generation(self, key: str) -> int:
+        return max(self._invalidated.get(key, 0), self._floor)
+
+    def generation(self, key: str) -> int:
+        """The key's generation, which changes whenever it is invalidated; a token for set()."""
+        with self._lock:
+            return self._key_generation(key)
+
+    def set(self, key: str, value, generation: int = None) -> bool:
+        """Caches the value, unless the key was invalidated after `generation` was taken. Returns whether it did."""
+        with self._lock:
+            if generation is not None and generation < self._key_generation(key):
+                self.stale_sets += 1
+                return False
+            self._entries[key] = (self._clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, *keys: str):
+        """Drops the given customers' entries. Returns how many were present."""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._invalidated[key] = self._generation
+                self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.max_entries:
+                _, self._floor = self._invalidated.popitem(last=False)
+            removed = sum(self._entries.pop(key, None) is not None for key in keys)
+            self.invalidations += removed
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._floor = self._generation
+            self._invalidated.clear()
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_sets": self.stale_sets,
+            }
@@ -0,0 +1,545 @@
+# profileEngine.py
+import math
+import multiprocessing
+import os
+from bisect import bisect_left
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from datetime import datetime
+from typing import NamedTuple, Optional
+import numpy as np
+import pandas as pd
+from dateutil.parser import parse
+
+# --- 1. Configuration ---
+EXPENSE_TYPES = ['withdrawal', 'purchase']
+
+# --- 2. Transaction Frame Helpers ---
+
+def _transaction_columns(transactions: list[dict]):
+    """
+    Pulls the date string, amount and type out of each record in a single pass;
+    the date is the first non-empty of purchase, transaction and payment date.
+    """
+    date_strings = pd.Series(
+        [t.get('purchase_date') or t.get('transaction_date') or t.get('payment_date') for t in transactions],
+        dtype=object,
+    )
+    amounts = pd.Series([t.get('amount', 0) for t in transactions], dtype=object)
+    types = pd.Series([t.get('type') for t in transactions], dtype=object)
+    return date_strings, amounts, types
+
+def _parse_or_nat(value):
+    try:
+        return pd.Timestamp(parse(value))
+    except (ValueError, TypeError, OverflowError):
+        return pd.NaT
+
+def _parse_dates(date_strings: pd.Series) -> pd.Series:
+    """
+    Parses a column of date strings in one pass. ISO dates (everything Nessie
+    returns) go through pandas' fast path; anything else falls back to dateutil.
+    """
+    date_strings = date_strings.where(date_strings.map(lambda v: isinstance(v, str)))
+    try:
+        parsed = pd.to_datetime(date_strings, errors='coerce', format='ISO8601')
+    except (ValueError, TypeError):
+        parsed = pd.Series(pd.NaT, index=date_strings.index)
+    fallback = date_strings.notna() & parsed.isna()
+    if fallback.any():
+        parsed = parsed.where(~fallback, pd.to_datetime(date_strings[fallback].map(_parse_or_nat)))
+    return parsed
+
+def _numeric_amounts(amounts: pd.Series) -> pd.Series:
+    """Amounts as floats; missing or non-numeric values count as 0."""
+    amounts = amounts.where(amounts.map(lambda v: isinstance(v, (int, float))))
+    return pd.to_numeric(amounts, errors='coerce').fillna(0.0)
+
+def _month_range(start: pd.Timestamp, end: pd.Timestamp, first: pd.Period = None) -> pd.PeriodIndex:
+    """
+    The months between the first and last transaction, following
+    rrule(MONTHLY, dtstart=start, until=end): months are anchored on the first
+    transaction's day, so months without that day are skipped, and the final
+    month is left out when its anchor falls after the last transaction.
+    `first` optionally starts the range at a later month.
+    """
+    first = max(start.to_period('M'), first) if first is not None else start.to_period('M')
+    months = pd.period_range(first, end.to_period('M'), freq='M')
+    months = months[months.days_in_month >= start.day]
+    if len(months) and months[-1] == end.to_period('M') and start.replace(year=end.year, month=end.month) > end:
+        months = months[:-1]
+    return months
+
+def parse_transactions(transactions: list[dict], keep_invalid: bool = False) -> pd.DataFrame:
+    """
+    Parses and types the transactions once: a frame of 'date', 'amount' (float)
+    and 'type' with rows in input order, keeping only rows with a usable date
+    (or every row, with NaT dates, when keep_invalid is set).
+    """
+    date_strings, amounts, types = _transaction_columns(transactions)
+    dates = _parse_dates(date_strings)
+    frame = pd.DataFrame({'date': dates, 'amount': _numeric_amounts(amounts), 'type': types})
+    return frame if keep_invalid else frame[dates.notna()]
+
+# --- 3. Analysis Functions ---
+
+class ProfileResult(NamedTuple):
+    historical_profile: Optional[dict]
+    historical_expenses: Optional[pd.Series]
+    final_profile: Optional[dict]
+
+def _monthly_totals(frame: pd.DataFrame):
+    """
+    Income and expense totals per calendar month, as arrays indexed by each row's
+    month code (months since the first month, a year * 12 + month - 1 number). Sums
+    use np.add.at, which adds row by row in input order, so they match a plain
+    Python accumulation to the last bit.
+    """
+    dates, amounts, types = frame['date'], frame['amount'], frame['type']
+    month_numbers = (dates.dt.year * 12 + dates.dt.month - 1).to_numpy()
+    first_month = month_numbers.min()
+    codes = month_numbers - first_month
+    income_totals = np.zeros(codes.max() + 1)
+    expense_totals = np.zeros(codes.max() + 1)
+    np.add.at(income_totals, codes, amounts.where(types == 'deposit', 0.0).to_numpy(dtype=float))
+    np.add.at(expense_totals, codes, amounts.where(types.isin(EXPENSE_TYPES), 0.0).to_numpy(dtype=float))
+    return first_month, codes, income_totals, expense_totals
+
+def _profile_from_monthly_series(income_series: pd.Series, expenses_series: pd.Series, today: datetime):
+    """The baseline profile from monthly income and expense series indexed by month start."""
+    # Exclude the current, partial month to ensure a stable baseline
+    if not income_series.empty:
+        last_data_month = income_series.index[-1]
+        if last_data_month.year == today.year and last_data_month.month == today.month:
+            print(f"  INFO: Excluding partial data for {today.strftime('%Y-%m')} from historical analysis.")
+            income_series = income_series[:-1]
+            expenses_series = expenses_series[:-1]
+
+    if len(income_series) < 2: return None, None
+
+    monthly_fcf_series = income_series - expenses_series
+    ewma_series = monthly_fcf_series.ewm(span=3, adjust=False).mean()
+    predicted_fcf = ewma_series.iloc[-1]
+
+    historical_profile = {
+        "ewma_predicted_fcf": round(float(predicted_fcf), 2),
+        "mean_free_cash_flow": round(float(monthly_fcf_series.mean()), 2),
+        "std_dev_free_cash_flow": round(float(monthly_fcf_series.std(ddof=0)), 2),
+        "months_analyzed": len(income_series),
+    }
+
+    return historical_profile, expenses_series
+
+def _historical_profile_from_frame(frame: pd.DataFrame, today: datetime):
+    """The body of calculate_historical_profile, working on an already parsed frame."""
+    if frame.empty: return None, None
+
+    first_month, _, income_totals, expense_totals = _monthly_totals(frame)
+
+    date_range = _month_range(frame['date'].min(), frame['date'].max())
+    positions = date_range.year * 12 + date_range.month - 1 - first_month
+    index = pd.to_datetime(date_range.strftime('%Y-%m'))
+
+    income_series = pd.Series(income_totals[positions], index=index)
+    expenses_series = pd.Series(expense_totals[positions], index=index)
+    return _profile_from_monthly_series(income_series, expenses_series, today)
+
+def _outlier_fence(historical_expenses: pd.Series) -> float:
+    """Tukey's upper fence over the monthly expenses: Q3 + 1.5 * IQR."""
+    q1 = historical_expenses.quantile(0.25)
+    q3 = historical_expenses.quantile(0.75)
+    iqr = q3 - q1
+    return q3 + 1.5 * iqr
+
+def _apply_outlier_adjustment(baseline_profile: dict, outlier_fence: float, has_current: bool, current_expense_amounts):
+    """
+    Amortizes the current month's outlier expenses (those above outlier_fence) against
+    the baseline. has_current says whether the current month has any transactions at
+    all; current_expense_amounts are the amounts of its withdrawals and purchases.
+    """
+    if not has_current:
+        return {**baseline_profile, "final_adjusted_fcf": baseline_profile.get("ewma_predicted_fcf", 0)}
+
+    current_outliers = [amount for amount in current_expense_amounts if amount > outlier_fence]
+
+    total_outlier_cost = sum(current_outliers)
+    adjusted_profile = baseline_profile.copy()
+
+    if total_outlier_cost > 0:
+        amortization_period_months = 3
+        monthly_outlier_impact = total_outlier_cost / amortization_period_months
+        print(f"  INFO: Found ${total_outlier_cost:.2f} in current-month outliers. Adjusting forecast by ${monthly_outlier_impact:.2f}/month.")
+        adjusted_profile["current_month_outlier_impact"] = round(monthly_outlier_impact, 2)
+        adjusted_profile["final_adjusted_fcf"] = round(baseline_profile["ewma_predicted_fcf"] - monthly_outlier_impact, 2)
+    else:
+        # If no outliers, the final prediction is the same as the baseline
+        adjusted_profile["current_month_outlier_impact"] = 0.0
+        adjusted_profile["final_adjusted_fcf"] = baseline_profile["ewma_predicted_fcf"]
+
+    return adjusted_profile
+
+def compute_financial_profile(transactions, today: datetime = None) -> ProfileResult:
+    """
+    The single entry point shared by the API and the nightly job: parses the
+    transactions once, then derives the historical profile, the monthly expense
+    series and the outlier-adjusted final profile from the same frame.
+    `transactions` may also be a frame already in parse_transactions() form.
+    final_profile is None when there isn't enough history for a profile.
+    """
+    today = today or datetime.now()
+    if transactions is None or len(transactions) == 0: return ProfileResult(None, None, None)
+
+    frame = transactions if isinstance(transactions, pd.DataFrame) else parse_transactions(transactions)
+    historical_profile, historical_expenses = _historical_profile_from_frame(frame, today)
+    if not historical_profile:
+        return ProfileResult(None, None, None)
+
+    current = frame[(frame['date'].dt.year == today.year) & (frame['date'].dt.month == today.month)]
+    final_profile = _apply_outlier_adjustment(
+        historical_profile, _outlier_fence(historical_expenses), not current.empty,
+        current['amount'][current['type'].isin(EXPENSE_TYPES)].tolist(),
+    )
+    return ProfileResult(historical_profile, historical_expenses, final_profile)
+
+def calculate_historical_profile(transactions: list[dict]):
+    """
+    Calculates a baseline financial profile using ONLY completed historical months.
+    """
+    if not transactions: return None, None
+    return _historical_profile_from_frame(parse_transactions(transactions), datetime.now())
+
+def adjust_for_current_month_outliers(all_transactions: list[dict], historical_expenses: pd.Series, baseline_profile: dict):
+    """
+    Finds outliers in the current month and amortizes their impact on the baseline prediction.
+    Prefer compute_financial_profile, which reuses the dates parsed for the history.
+    """
+    if historical_expenses is None or historical_expenses.empty:
+        return {**baseline_profile, "final_adjusted_fcf": baseline_profile.get("ewma_predicted_fcf", 0)}
+
+    today = datetime.now()
+
+    current_month_transactions = [
+        t for t in all_transactions
+        if parse(t.get('purchase_date') or t.get('transaction_date', '1900-01-01')).strftime('%Y-%m') == today.strftime('%Y-%m')
+    ]
+
+    return _apply_outlier_adjustment(
+        baseline_profile, _outlier_fence(historical_expenses), bool(current_month_transactions),
+        [t['amount'] for t in current_month_transactions if t.get('type') in EXPENSE_TYPES],
+    )
+
+# --- 4. Streaming Profile ---
+# Exponential smoothing factor of ewm(span=3, adjust=False).
+EWMA_ALPHA = 2 / (3 + 1)
+# Centroids kept by the monthly expense summary; up to this many months its quartiles are exact.
+QUANTILE_SUMMARY_SIZE = 64
+
+def _lerp(a: float, b: float, t: float) -> float:
+    """Linear interpolation the way numpy's quantile does it, so exact summaries match to the bit."""
+    return b - (b - a) * (1 - t) if t >= 0.5 else a + (b - a) * t
+
+class StreamingProfile:
+    """
+    The historical profile's statistics, updated in O(1) as each month closes instead
+    of being recomputed over the whole series: the running EWMA of free cash flow,
+    Welford's mean and variance, and a bounded quantile summary of monthly expenses
+    for the outlier fence. It matches the batch path within floating-point tolerance.
+    `through` is the last month folded in.
+    """
+
+    def __init__(self, state: dict = None):
+        state = state or {}
+        self.through = state.get('through')
+        self.months = state.get('months', 0)
+        self.ewma = state.get('ewma')
+        self.mean = state.get('mean', 0.0)
+        self.m2 = state.get('m2', 0.0)
+        # Sorted centroids of the monthly expenses; parallel lists, as Firestore can't nest arrays
+        self.expense_values = list(state.get('expense_values', []))
+        self.expense_weights = list(state.get('expense_weights', []))
+
+    def to_dict(self) -> dict:
+        return {
+            'through': self.through, 'months': self.months, 'ewma': self.ewma, 'mean': self.mean, 'm2': self.m2,
+            'expense_values': list(self.expense_values), 'expense_weights': list(self.expense_weights),
+        }
+
+    def add_month(self, month_key: str, income: float, expenses: float):
+        fcf = income - expenses
+        self.months += 1
+        self.ewma = fcf if self.ewma is None else (1 - EWMA_ALPHA) * self.ewma + EWMA_ALPHA * fcf
+        delta = fcf - self.mean
+        self.mean += delta / self.months
+        self.m2 += delta * (fcf - self.mean)
+        self._add_expense(expenses)
+        self.through = month_key
+
+    def _add_expense(self, value: float):
+        position = bisect_left(self.expense_values, value)
+        self.expense_values.insert(position, value)
+        self.expense_weights.insert(position, 1)
+        if len(self.expense_values) <= QUANTILE_SUMMARY_SIZE: return
+        # Merge the two closest neighbouring centroids into their weighted mean
+        gaps = [b - a for a, b in zip(self.expense_values, self.expense_values[1:])]
+        i = gaps.index(min(gaps))
+        (a, b), (wa, wb) = self.expense_values[i:i + 2], self.expense_weights[i:i + 2]
+        self.expense_values[i:i + 2] = [(a * wa + b * wb) / (wa + wb)]
+        self.expense_weights[i:i + 2] = [wa + wb]
+
+    def _expense_at(self, rank: int) -> float:
+        """The rank-th smallest monthly expense, treating each centroid as `weight` equal values."""
+        for value, weight in zip(self.expense_values, self.expense_weights):
+            if rank < weight: return value
+            rank -= weight
+        return self.expense_values[-1]
+
+    def expense_quantile(self, q: float) -> float:
+        """Linear-interpolated quantile, like Series.quantile(q) over the monthly expenses."""
+        position = (sum(self.expense_weights) - 1) * q
+        lower = math.floor(position)
+        return _lerp(self._expense_at(lower), self._expense_at(lower + 1), position - lower)
+
+    def outlier_fence(self) -> float:
+        q1, q3 = self.expense_quantile(0.25), self.expense_quantile(0.75)
+        return q3 + 1.5 * (q3 - q1)
+
+    def historical_profile(self):
+        """The dict calculate_historical_profile builds, or None with fewer than two months."""
+        if self.months < 2: return None
+        return {
+            "ewma_predicted_fcf": round(float(self.ewma), 2),
+            "mean_free_cash_flow": round(float(self.mean), 2),
+            "std_dev_free_cash_flow": round(math.sqrt(max(self.m2, 0.0) / self.months), 2),
+            "months_analyzed": self.months,
+        }
+
+def _series_months(rollup: dict, today: datetime, after: str = None) -> list[str]:
+    """
+    The month keys of the rollup's historical series (see _month_range; the current
+    month is left out when it is the last), optionally only those after `after`.
+    """
+    start, end = pd.Timestamp(rollup['first_date']), pd.Timestamp(rollup['last_date'])
+    first = pd.Period(after, freq='M') + 1 if after else None
+    keys = list(_month_range(start, end, first).strftime('%Y-%m'))
+    if keys and keys[-1] == today.strftime('%Y-%m'):
+        keys.pop()
+    return keys
+
+def _month_totals(months: dict, key: str) -> tuple[float, float]:
+    month = months.get(key)
+    return (month['income'], month['expenses']) if month else (0.0, 0.0)
+
+def _advance_streaming(rollup: dict, today: datetime) -> dict:
+    """
+    Folds the rollup's closed months into its streaming state. A month is closed
+    once it is before both the current month and the last transaction's month, as
+    only then is its place in the series settled.
+    """
+    streaming = StreamingProfile(rollup.get('streaming'))
+    if rollup['months']:
+        close_before = min(today.strftime('%Y-%m'), rollup['last_date'][:7])
+        for key in _series_months(rollup, today, after=streaming.through):
+            if key >= close_before: break
+            streaming.add_month(key, *_month_totals(rollup['months'], key))
+    rollup['streaming'] = streaming.to_dict()
+    return rollup
+
+# --- 5. Monthly Rollups ---
+# A rollup holds everything a profile needs from a customer's history, so it can be
+# maintained as transactions are synced instead of re-reading all of them:
+#   months            {'YYYY-MM': {'income', 'expenses', 'count', 'max_expense'}}
+#   first_date/last_date   ISO timestamps of the earliest and latest transaction
+#   expense_amounts   {'YYYY-MM': [amounts]} of withdrawals and purchases, kept only
+#                     for the current month on, for the outlier adjustment
+#   transaction_count transactions with a usable date
+#   streaming         StreamingProfile state of the closed months
+
+def _month_key(month_number: int) -> str:
+    return f"{month_number // 12:04d}-{month_number % 12 + 1:02d}"
+
+def empty_rollup() -> dict:
+    return {'months': {}, 'first_date': None, 'last_date': None, 'expense_amounts': {}, 'transaction_count': 0,
+            'streaming': StreamingProfile().to_dict()}
+
+def build_monthly_rollup(transactions, today: datetime = None) -> dict:
+    """Builds a rollup from transactions (or a frame in parse_transactions() form)."""
+    today = today or datetime.now()
+    frame = transactions if isinstance(transactions, pd.DataFrame) else parse_transactions(transactions)
+    if frame.empty: return empty_rollup()
+
+    first_month, codes, income_totals, expense_totals = _monthly_totals(frame)
+    is_expense = frame['type'].isin(EXPENSE_TYPES).to_numpy()
+    amounts = frame['amount'].to_numpy(dtype=float)
+    counts = np.bincount(codes, minlength=len(income_totals))
+    max_expenses = np.full(len(income_totals), -np.inf)
+    np.maximum.at(max_expenses, codes[is_expense], amounts[is_expense])
+
+    months = {
+        _month_key(first_month + code): {
+            'income': float(income_totals[code]),
+            'expenses': float(expense_totals[code]),
+            'count': int(counts[code]),
+            'max_expense': float(max_expenses[code]) if np.isfinite(max_expenses[code]) else None,
+        }
+        for code in np.flatnonzero(counts)
+    }
+    current_key = today.strftime('%Y-%m')
+    expense_amounts = {}
+    for code, amount in zip(codes[is_expense], amounts[is_expense]):
+        key = _month_key(first_month + code)
+        if key >= current_key:
+            expense_amounts.setdefault(key, []).append(float(amount))
+
+    return _advance_streaming({
+        'months': months,
+        'first_date': frame['date'].min().isoformat(),
+        'last_date': frame['date'].max().isoformat(),
+        'expense_amounts': expense_amounts,
+        'transaction_count': len(frame),
+    }, today)
+
+def merge_monthly_rollups(base: dict, delta: dict, today: datetime = None) -> dict:
+    """
+    Adds the rollup of newly synced transactions to an existing one. Expense amounts
+    of months before the current one are dropped; they can never be current again.
+    Transactions landing in an already folded month reset the streaming state, which
+    is then rebuilt from the months.
+    """
+    today = today or datetime.now()
+    months = {key: dict(month) for key, month in base['months'].items()}
+    for key, month in delta['months'].items():
+        if key not in months:
+            months[key] = dict(month)
+            continue
+        merged = months[key]
+        merged['income'] += month['income']
+        merged['expenses'] += month['expenses']
+        merged['count'] += month['count']
+        candidates = [m for m in (merged['max_expense'], month['max_expense']) if m is not None]
+        merged['max_expense'] = max(candidates) if candidates else None
+
+    current_key = today.strftime('%Y-%m')
+    expense_amounts = {}
+    for rollup in (base, delta):
+        for key, amounts in rollup['expense_amounts'].items():
+            if key >= current_key:
+                expense_amounts.setdefault(key, []).extend(amounts)
+
+    streaming = base.get('streaming')
+    through = (streaming or {}).get('through')
+    if through and delta['months'] and min(delta['months']) <= through:
+        streaming = None
+
+    dates = [pd.Timestamp(d) for r in (base, delta) for d in (r['first_date'], r['last_date']) if d]
+    return _advance_streaming({
+        'months': months,
+        'first_date': min(dates).isoformat() if dates else None,
+        'last_date': max(dates).isoformat() if dates else None,
+        'expense_amounts': expense_amounts,
+        'transaction_count': base['transaction_count'] + delta['transaction_count'],
+        'streaming': streaming,
+    }, today)
+
+def profile_from_rollup(rollup: dict, today: datetime = None, streaming: bool = True) -> ProfileResult:
+    """
+    compute_financial_profile from a rollup instead of the transactions. By default
+    the rollup's streaming state is used, so only the months since it was last
+    advanced are folded in (historical_expenses is then None); streaming=False
+    rebuilds the series at a cost of O(months).
+    """
+    today = today or datetime.now()
+    if not rollup or not rollup.get('months'): return ProfileResult(None, None, None)
+
+    months = rollup['months']
+    current_key = today.strftime('%Y-%m')
+    if streaming:
+        state = StreamingProfile(rollup.get('streaming'))
+        for key in _series_months(rollup, today, after=state.through):
+            state.add_month(key, *_month_totals(months, key))
+        historical_profile = state.historical_profile()
+        if not historical_profile:
+            return ProfileResult(None, None, None)
+        final_profile = _apply_outlier_adjustment(
+            historical_profile, state.outlier_fence(), current_key in months,
+            rollup.get('expense_amounts', {}).get(current_key, []),
+        )
+        return ProfileResult(historical_profile, None, final_profile)
+
+    date_range = _month_range(pd.Timestamp(rollup['first_date']), pd.Timestamp(rollup['last_date']))
+    keys = date_range.strftime('%Y-%m')
+    index = pd.to_datetime(keys)
+    income_series = pd.Series([months[k]['income'] if k in months else 0.0 for k in keys], index=index, dtype=float)
+    expenses_series = pd.Series([months[k]['expenses'] if k in months else 0.0 for k in keys], index=index, dtype=float)
+
+    historical_profile, historical_expenses = _profile_from_monthly_series(income_series, expenses_series, today)
+    if not historical_profile:
+        return ProfileResult(None, None, None)
+
+    final_profile = _apply_outlier_adjustment(
+        historical_profile, _outlier_fence(historical_expenses), current_key in months,
+        rollup.get('expense_amounts', {}).get(current_key, []),
+    )
+    return ProfileResult(historical_profile, historical_expenses, final_profile)
+
+# --- 6. Parallel Analysis ---
+# Worker processes for the nightly analysis stage (override with PROFILE_WORKERS).
+PROFILE_WORKERS = int(os.environ.get('PROFILE_WORKERS', os.cpu_count() or 1))
+# Customers handed to a worker at a time; big enough to amortize pickling overhead.
+PROFILE_CHUNK_SIZE = int(os.environ.get('PROFILE_CHUNK_SIZE', '25'))
+# How workers are started. Forking a process that holds a Firestore gRPC client, its
+# threads and the Nessie cache's SQLite connection can deadlock the child, so workers
+# come from a clean forkserver process instead (spawn where that isn't available).
+PROFILE_START_METHOD = os.environ.get(
+    'PROFILE_START_METHOD', 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+def _chunked(items, size: int):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _analyze_chunk(chunk: list[tuple], today: datetime, compute=compute_financial_profile) -> list[tuple]:
+    """Worker entry point: [(customer_id, transactions)] -> [(customer_id, final_profile, error)]."""
+    results = []
+    for customer_id, transactions in chunk:
+        try:
+            results.append((customer_id, compute(transactions, today).final_profile, None))
+        except Exception as e:
+            results.append((customer_id, None, str(e)))
+    return results
+
+def analyze_customers(customers, workers: int = None, chunk_size: int = None, today: datetime = None,
+                      compute=compute_financial_profile):
+    """
+    Computes final profiles for an iterable of (customer_id, transactions) pairs,
+    spreading chunks of customers across a process pool. `compute` is
+    compute_financial_profile, or profile_from_rollup for (customer_id, rollup) pairs. The input is consumed
+    lazily and at most two chunks per worker are in flight, so memory stays bounded.
+
+    Yields (customer_id, final_profile or None, error or None) as chunks finish,
+    which is not necessarily input order. workers=1 runs in-process.
+    """
+    workers = workers or PROFILE_WORKERS
+    chunk_size = chunk_size or PROFILE_CHUNK_SIZE
+    today = today or datetime.now()
+    chunks = _chunked(customers, chunk_size)
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _analyze_chunk(chunk, today, compute)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(PROFILE_START_METHOD)) as executor:
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(_analyze_chunk, chunk, today, compute))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        for future in as_completed(pending):
+            yield from future.result()
@@ -0,0 +1,159 @@
+# profiling.py
+import cProfile
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import parse_qs
+
+# --- 1. Configuration ---
+# Per-request profiling is off unless PROFILING_ENABLED=1: captures slow the request down
+# and expose code internals, so only switch it on where the API isn't public.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+# Where captures are written.
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+# Seconds between stack samples in 'sample' mode.
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.005'))
+# 'sample' writes folded stacks (.folded) for flamegraph.pl, speedscope or inferno;
+# 'cprofile' writes pstats (.prof) for snakeviz, flameprof or `python -m pstats`.
+PROFILE_MODES = {'sample': 'folded', 'cprofile': 'prof'}
+
+# --- 2. Stack Sampler ---
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+class StackSampler:
+    """
+    Samples every thread's Python stack every `interval` seconds from a background
+    thread, and counts them as folded stacks ("thread;outer;...;inner count"). Unlike
+    cProfile it sees all threads, e.g. the sync pipeline's fetch threads, and adds
+    little overhead; short functions may be missed. It measures wall-clock time, so
+    threads waiting on I/O or a queue show up too.
+    """
+
+    def __init__(self, interval: float = None):
+        self.interval = interval or PROFILE_SAMPLE_INTERVAL
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id: continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+# --- 3. Captures ---
+# One capture runs at a time: cProfile can't nest, and overlapping captures would each
+# include the other's overhead. A capture requested while another runs is skipped.
+
+_capture_lock = threading.Lock()
+
+def capture_path(name: str, mode: str, directory: str = None) -> str:
+    """A new file path for a capture: <directory>/<timestamp>-<name>-<id>.<ext>."""
+    stamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+    safe_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name).strip('_') or 'capture'
+    return os.path.join(directory or PROFILE_DIR, f"{stamp}-{safe_name}-{uuid.uuid4().hex[:8]}.{PROFILE_MODES[mode]}")
+
+@contextmanager
+def capture(mode: str, path: str):
+    """
+    Profiles the enclosed code with `mode` ('sample' or 'cprofile') and writes the
+    result to `path`. Yields whether the capture is running: False when another one is.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode '{mode}'; expected one of {', '.join(PROFILE_MODES)}.")
+    if not _capture_lock.acquire(blocking=False):
+        yield False
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if mode == 'sample':
+            sampler = StackSampler()
+            sampler.start()
+            try:
+                yield True
+            finally:
+                sampler.stop()
+                with open(path, 'w') as f:
+                    f.write(sampler.folded())
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield True
+            finally:
+                profiler.disable()
+                profiler.dump_stats(path)
+    finally:
+        _capture_lock.release()
+
+# --- 4. Per-Request Profiling ---
+
+def requested_mode(headers, query_string: bytes):
+    """The mode asked for with an X-Profile header or ?profile= flag ('1' means 'sample'), or None."""
+    value = dict(headers).get(b'x-profile', b'').decode().strip().lower()
+    if not value:
+        value = (parse_qs(query_string.decode()).get('profile') or [''])[0].strip().lower()
+    if not value or value in ('0', 'false', 'off'):
+        return None
+    return value if value in PROFILE_MODES else 'sample'
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles a request sent with `X-Profile: sample|cprofile` (or
+    ?profile=...). The capture is written under PROFILE_DIR and named in the response's
+    X-Profile-File header, or X-Profile-File: busy if another capture was running. Other
+    requests handled at the same time on the event loop show up in the capture too.
+    `skip` lists (method, path prefix) routes that profile their own background work
+    instead, e.g. the sync job a POST queues; those requests are passed through.
+    """
+
+    def __init__(self, app, skip=()):
+        self.app = app
+        self.skip = tuple(skip)
+
+    async def __call__(self, scope, receive, send):
+        mode = requested_mode(scope['headers'], scope['query_string']) if scope['type'] == 'http' else None
+        if mode is not None and any(scope['method'] == method and scope['path'].startswith(prefix)
+                                    for method, prefix in self.skip):
+            mode = None
+        if mode is None:
+            return await self.app(scope, receive, send)
+        path = capture_path(f"{scope['method']}-{scope['path']}", mode)
+        start = time.perf_counter()
+        with capture(mode, path) as running:
+            header = os.path.basename(path).encode() if running else b'busy'
+
+            async def send_with_header(message):
+                if message['type'] == 'http.response.start':
+                    message = {**message, 'headers': [*message.get('headers', []), (b'x-profile-file', header)]}
+                await send(message)
+
+            await self.app(scope, receive, send_with_header)
+        if running:
+            print(f"  🔬 Profiled {scope['method']} {scope['path']} ({mode}, {time.perf_counter() - start:.3f}s) -> {path}")
@@ -0,0 +1,46 @@
+# singleFlight.py
+import asyncio
+
+# --- 1. Request Coalescing ---
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical reads on one event loop: while a call for a key
+    is in flight, later callers with the same key await its result (or exception)
+    instead of starting their own. Nothing is kept once the call finishes; caching
+    completed results is ProfileCache's job. Callers put a cache generation in the
+    key so a call started before an invalidation isn't shared with later callers.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """Returns await fn(), sharing one call among concurrent callers with the same key."""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # A caller that gets cancelled (e.g. the client disconnects) leaves the call running for the others
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here too, in case every caller was cancelled
+
+    def stats(self) -> dict:
+        requests = self.calls + self.coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / requests, 4) if requests else 0.0,
+        }
@@ -0,0 +1,93 @@
+# storage.py
+import os
+import threading
+from metrics import METRICS_ENABLED
+
+# --- 1. Configuration ---
+# 'firestore' (default), 'memory' for a throwaway local store, or 'sqlite' for one persisted at STORAGE_SQLITE_PATH.
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'firestore')
+STORAGE_SQLITE_PATH = os.environ.get('STORAGE_SQLITE_PATH', 'localStore.sqlite3')
+FIREBASE_CREDENTIALS_PATH = os.environ.get(
+    'FIREBASE_CREDENTIALS_PATH', 'ubuntu/mvidia-c10e5-firebase-adminsdk-fbsvc-b0e12b6e77.json'
+)
+
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+# --- 2. Client Factories ---
+
+def _init_firebase():
+    """Initializes the Firebase Admin SDK once per process."""
+    import firebase_admin
+    from firebase_admin import credentials
+    if firebase_admin._apps: return
+    try:
+        cred = credentials.Certificate(FIREBASE_CREDENTIALS_PATH)
+    except Exception as e:
+        raise RuntimeError(
+            f"Error initializing Firebase Admin SDK: {e}. "
+            "Ensure FIREBASE_CREDENTIALS_PATH is correct, or set STORAGE_BACKEND=memory to run offline."
+        ) from e
+    firebase_admin.initialize_app(cred)
+
+def _create_clients(backend: str):
+    if backend == 'firestore':
+        from firebase_admin import firestore, firestore_async
+        _init_firebase()
+        return firestore.client(), firestore_async.client()
+    if backend in ('memory', 'sqlite'):
+        from localStore import AsyncLocalClient, LocalClient
+        client = LocalClient(':memory:' if backend == 'memory' else STORAGE_SQLITE_PATH)
+        return client, AsyncLocalClient(client)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}'; expected firestore, memory or sqlite.")
+
+def _metered(client, async_client):
+    """Counts each client's Firestore operations for the metrics, unless METRICS_ENABLED is off."""
+    if not METRICS_ENABLED: return client, async_client
+    from meteredStore import metered
+    return metered(client, async_client)
+
+def _ensure_clients():
+    global _client, _async_client
+    with _lock:
+        if _client is None:
+            _client, _async_client = _metered(*_create_clients(STORAGE_BACKEND))
+
+def get_client():
+    """Returns the process-wide blocking database client for STORAGE_BACKEND."""
+    _ensure_clients()
+    return _client
+
+def get_async_client():
+    """Returns the asyncio database client; it reads and writes the same data as get_client()."""
+    _ensure_clients()
+    return _async_client
+
+def use_clients(client, async_client=None):
+    """
+    Replaces the process-wide clients, e.g. with a fresh LocalClient in a benchmark.
+    Modules that already hold a client keep theirs, so call this before importing them.
+    """
+    global _client, _async_client
+    if async_client is None:
+        from localStore import AsyncLocalClient
+        async_client = AsyncLocalClient(client)
+    with _lock:
+        _client, _async_client = _metered(client, async_client)
+
+# --- 3. Transactions ---
+
+def run_transaction(client, fn):
+    """
+    Runs fn(transaction) as one atomic read-modify-write and returns its result. fn
+    reads with transaction=transaction and writes through transaction.set(). Firestore
+    re-runs fn if a document it read changed before the commit, so fn must only compute.
+    """
+    from localStore import LocalClient
+    transaction = client.transaction()
+    if isinstance(getattr(client, '_target', client), LocalClient):
+        return transaction.run(fn)
+    from google.cloud import firestore
+    # The transactional wrapper drives the underlying transaction; fn still gets the metered one
+    return firestore.transactional(lambda _: fn(transaction))(getattr(transaction, '_target', transaction))
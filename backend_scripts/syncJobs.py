@@ -0,0 +1,141 @@
+# syncJobs.py
+import asyncio
+import contextvars
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# --- 1. Configuration ---
+# Syncs that run at once (override with SYNC_JOB_WORKERS).
+SYNC_JOB_WORKERS = int(os.environ.get('SYNC_JOB_WORKERS', '4'))
+# Jobs waiting for a worker before new submissions are refused.
+SYNC_JOB_MAX_QUEUED = int(os.environ.get('SYNC_JOB_MAX_QUEUED', '1000'))
+# Finished jobs kept for status polling; the oldest are forgotten first.
+SYNC_JOB_HISTORY = int(os.environ.get('SYNC_JOB_HISTORY', '1000'))
+
+class QueueFull(RuntimeError):
+    """Raised by submit() when SYNC_JOB_MAX_QUEUED jobs are already waiting."""
+
+# The job a worker is running, for run() to record details on (see Job.details)
+current_job = contextvars.ContextVar('current_job', default=None)
+
+# --- 2. Jobs ---
+
+class Job:
+    """One queued call, tracked from 'queued' through 'running' to 'succeeded' or 'failed'."""
+
+    def __init__(self, key: str, args: tuple):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.args = args
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at = None
+        self.finished_at = None
+        # Extra fields reported in the job's status, e.g. its profile capture
+        self.details = {}
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('succeeded', 'failed')
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "key": self.key,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            **self.details,
+        }
+
+# --- 3. Bounded Worker Pool ---
+
+class JobQueue:
+    """
+    Runs `run(*args)` coroutines on a fixed number of worker tasks on the event loop.
+    Jobs are deduplicated by key: submitting a key that is already queued or running
+    returns the existing job instead of starting another. Call start() from the
+    running loop (e.g. on app startup) and stop() on shutdown.
+    """
+
+    def __init__(self, run, workers: int = SYNC_JOB_WORKERS, max_queued: int = SYNC_JOB_MAX_QUEUED,
+                 history: int = SYNC_JOB_HISTORY):
+        self._run = run
+        self.workers = workers
+        self.max_queued = max_queued
+        self.history = history
+        self._queue = None
+        self._tasks = []
+        self._jobs = {}
+        self._active = {}
+        self._finished = OrderedDict()
+        self.submitted = 0
+        self.deduplicated = 0
+
+    def start(self):
+        self._queue = asyncio.Queue(self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, key: str, *args) -> tuple[Job, bool]:
+        """Queues run(*args) unless a job for `key` is pending. Returns (job, whether it was newly created)."""
+        job = self._active.get(key)
+        if job is not None:
+            self.deduplicated += 1
+            return job, False
+        job = Job(key, args)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"{self.max_queued} jobs are already queued.") from None
+        self._jobs[job.id] = self._active[key] = job
+        self.submitted += 1
+        return job, True
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status, job.started_at = 'running', datetime.now(timezone.utc)
+            current_job.set(job)
+            try:
+                job.result = await self._run(*job.args)
+                job.status = 'succeeded'
+            except Exception as e:
+                job.status, job.error = 'failed', getattr(e, 'detail', None) or str(e)
+            finally:
+                job.finished_at = datetime.now(timezone.utc)
+                self._active.pop(job.key, None)
+                self._remember(job)
+                self._queue.task_done()
+
+    def _remember(self, job: Job):
+        self._finished[job.id] = job
+        while len(self._finished) > self.history:
+            forgotten, _ = self._finished.popitem(last=False)
+            self._jobs.pop(forgotten, None)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": sum(job.status == 'running' for job in self._active.values()),
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "succeeded": sum(job.status == 'succeeded' for job in self._finished.values()),
+            "failed": sum(job.status == 'failed' for job in self._finished.values()),
+        }
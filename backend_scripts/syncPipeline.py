@@ -0,0 +1,189 @@
+# syncPipeline.py
+import contextvars
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from firestoreSync import BulkSyncWriter, transaction_fields
+from nessieClient import NESSIE_MAX_CONCURRENCY, TRANSACTION_ENDPOINTS, get_session
+
+# --- 1. Configuration ---
+# Fetched accounts waiting to be written; when full, fetching pauses until the writer catches up.
+SYNC_PIPELINE_QUEUE_SIZE = int(os.environ.get('SYNC_PIPELINE_QUEUE_SIZE', '16'))
+# How often a stage blocked on a full queue checks whether the pipeline was stopped.
+_STOP_POLL_SECONDS = 0.1
+_DONE = object()
+
+# --- 2. Stages ---
+# 1. fetch:   a thread pool downloads each account's deposits, purchases and withdrawals.
+# 2. write:   the calling thread de-duplicates and batch-writes accounts and transactions
+#             as they arrive, so fetching account N+1 overlaps with writing account N.
+# 3. analyze: once all of a customer's accounts are written, their writes are flushed and
+#             on_customer_synced(customer_id, committed documents) runs on its own thread.
+# Stages are joined by bounded queues, so a slow stage holds back the one before it.
+
+def _fetch_account(get_request, account: dict) -> list[dict]:
+    """All of an account's transactions, tagged with 'type'."""
+    transactions = []
+    for endpoint, txn_type in TRANSACTION_ENDPOINTS.items():
+        records = get_request(f"/accounts/{account['_id']}/{endpoint}")
+        transactions.extend({**t, 'type': txn_type} for t in records or [])
+    return transactions
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Blocks until there is room in the queue, unless the pipeline is stopped first."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_STOP_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def run_sync_pipeline(db, accounts: list[dict], customer_ids: dict, get_request, *,
+                      write_account=None, select_transactions=None, on_account_written=None,
+                      on_customer_synced=None, prefetch_all: bool = False,
+                      fetch_workers: int = None, queue_size: int = None) -> dict:
+    """
+    Syncs Nessie accounts and their transactions into Firestore through the staged pipeline.
+
+    customer_ids maps each Nessie account id to its customer's Firestore id. Hooks:
+      write_account(account) -> bool          whether to sync the account record (default: always)
+      select_transactions(account, txns)      the transactions to write (default: all of them)
+      on_account_written(account, txns)       after an account's transactions are queued for writing
+      on_customer_synced(customer_id, docs)   once per customer, after all their writes are committed;
+                                              docs are the (Firestore id, data) pairs newly created
+    With prefetch_all, known ids are loaded for the whole collections up front (a full resync).
+
+    Returns counters, plus 'committed': the newly created transaction documents not already
+    handed to on_customer_synced, and 'account_timings': {account id: {'fetch_s', 'write_s'}},
+    the seconds spent downloading each account and in the writer (batch commits included).
+
+    A failure in any stage stops the others and is raised here, with a 'committed'
+    attribute holding the documents committed before it that on_customer_synced didn't
+    finish with, so the caller can still fold them in.
+    """
+    fetch_workers = max(1, fetch_workers or NESSIE_MAX_CONCURRENCY)
+    get_session(pool_size=fetch_workers)
+    fetched = queue.Queue(maxsize=queue_size or SYNC_PIPELINE_QUEUE_SIZE)
+    synced_customers = queue.Queue(maxsize=queue_size or SYNC_PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+    errors = []
+
+    # Accounts are fetched customer by customer, so customers complete (and are analyzed) early
+    accounts = sorted(accounts, key=lambda account: customer_ids[account['_id']])
+    remaining_accounts = defaultdict(int)
+    for account in accounts:
+        remaining_accounts[customer_ids[account['_id']]] += 1
+
+    account_timings = {}
+
+    def fetch(account):
+        start = time.perf_counter()
+        try:
+            item = (account, _fetch_account(get_request, account), None)
+        except Exception as e:
+            item = (account, None, e)
+        account_timings[account['_id']] = {'fetch_s': time.perf_counter() - start, 'write_s': 0.0}
+        _put(fetched, item, stop)
+
+    # Documents handed to on_customer_synced that it didn't finish with, because it failed or was stopped
+    unfinished = []
+
+    def analyze():
+        while True:
+            item = synced_customers.get()
+            if item is _DONE: return
+            if stop.is_set():
+                unfinished.extend(item[1])
+                continue
+            try:
+                on_customer_synced(*item)
+            except Exception as e:
+                unfinished.extend(item[1])
+                errors.append(e)
+                stop.set()
+
+    account_writer = BulkSyncWriter(db, 'accounts')
+    txn_writer = BulkSyncWriter(db, 'transactions', track_commits=True, derived_fields=transaction_fields)
+    committed_by_customer = defaultdict(list)
+    transactions_fetched = 0
+
+    def collect_committed():
+        for doc_id, data in txn_writer.take_committed():
+            committed_by_customer[data['customer_firestore_id']].append((doc_id, data))
+
+    # The stage threads run in the caller's context, so their calls count toward its metrics scope
+    analyzer = threading.Thread(
+        target=contextvars.copy_context().run, args=(analyze,), name='sync-analyze', daemon=True
+    ) if on_customer_synced else None
+    if analyzer: analyzer.start()
+    executor = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix='sync-fetch')
+    try:
+        if prefetch_all:
+            account_writer.prefetch()
+            txn_writer.prefetch()
+        for account in accounts:
+            executor.submit(contextvars.copy_context().run, fetch, account)
+
+        for _ in range(len(accounts)):
+            if stop.is_set(): raise errors[0]
+            while True:
+                try:
+                    account, transactions, error = fetched.get(timeout=_STOP_POLL_SECONDS)
+                    break
+                except queue.Empty:
+                    if stop.is_set(): raise errors[0]
+            if error is not None: raise error
+            customer_id = customer_ids[account['_id']]
+            transactions_fetched += len(transactions)
+            write_start = time.perf_counter()
+
+            if write_account is None or write_account(account):
+                account_writer.prefetch(customer_id)
+                account_writer.sync(account, {'customer_firestore_id': customer_id})
+            new_txns = transactions if select_transactions is None else select_transactions(account, transactions)
+            if new_txns:
+                print(f"  Syncing {len(new_txns)} new transactions for account {account['_id']}...")
+                txn_writer.prefetch(customer_id)
+                txn_writer.sync_many(new_txns, {'customer_firestore_id': customer_id})
+            if on_account_written: on_account_written(account, new_txns)
+            account_timings[account['_id']]['write_s'] = time.perf_counter() - write_start
+
+            remaining_accounts[customer_id] -= 1
+            if remaining_accounts[customer_id] == 0 and analyzer:
+                account_writer.flush()
+                txn_writer.flush()
+                collect_committed()
+                if not _put(synced_customers, (customer_id, committed_by_customer.pop(customer_id, [])), stop):
+                    raise errors[0]
+
+        account_writer.flush()
+        txn_writer.flush()
+        collect_committed()
+    except BaseException as e:
+        if not errors: errors.append(e)
+        stop.set()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if analyzer:
+            synced_customers.put(_DONE)  # the analyzer keeps draining, so this can't block for long
+            analyzer.join()
+    if errors:
+        # Batches the writer flushed before the failure are in the database already
+        collect_committed()
+        error = errors[0]
+        error.committed = unfinished + [doc for docs in committed_by_customer.values() for doc in docs]
+        raise error
+
+    return {
+        'accounts': len(accounts),
+        'transactions_fetched': transactions_fetched,
+        'accounts_created': account_writer.created_count,
+        'transactions_created': txn_writer.created_count,
+        'transactions_skipped': txn_writer.skipped_count,
+        'committed': [doc for docs in committed_by_customer.values() for doc in docs],
+        'account_timings': account_timings,
+    }
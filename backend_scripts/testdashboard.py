@@ -5,20 +5,18 @@ import asyncio  # <-- 1. Import asyncio
 
 from nicegui import ui
 import matplotlib.pyplot as plt
+from nessieClient import nessie_get
 
 # --- Configuration ---
-API_KEY = '933f9b5bbbb8094ff92c2ea78ece8502'
-BASE_URL = 'http://api.nessieisreal.com'
 #SAMPLE_CUSTOMER_ID = 68d768529683f20dd51963af
 
 # --- API Functions (unchanged) ---
 def get_customer_accounts(customer_id: str):
     """Fetches all accounts for a given customer ID."""
-    url = f'{BASE_URL}/customers/{customer_id}/accounts?key={API_KEY}'
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    return None
+    try:
+        return nessie_get(f'/customers/{customer_id}/accounts')
+    except requests.exceptions.RequestException:
+        return None
 
 def get_account_transactions(account_id: str):
     """Fetches all transactions for an account."""
@@ -29,10 +27,11 @@ def get_account_transactions(account_id: str):
     }
     all_transactions = []
     for trans_type, endpoint in endpoints.items():
-        url = f'{BASE_URL}{endpoint}?key={API_KEY}'
-        response = requests.get(url)
-        if response.status_code == 200:
-            transactions = response.json()
+        try:
+            transactions = nessie_get(endpoint)
+        except requests.exceptions.RequestException:
+            transactions = None
+        if transactions:
             for t in transactions:
                 t['type'] = trans_type.capitalize()
                 t['date'] = t.get('transaction_date') or t.get('purchase_date')
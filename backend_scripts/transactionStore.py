@@ -0,0 +1,285 @@
+# transactionStore.py
+import json
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from firestoreSync import TRANSACTION_TIMESTAMP_FIELD
+
+# --- 1. Configuration ---
+# Directory of the local columnar transaction store; leave unset to read everything from the database.
+TRANSACTION_STORE_DIR = os.environ.get('TRANSACTION_STORE_DIR')
+# Once a month holds more part files than this, they are merged into one.
+STORE_MAX_PARTS_PER_MONTH = int(os.environ.get('STORE_MAX_PARTS_PER_MONTH', '8'))
+# Partition for transactions whose date can't be parsed.
+UNKNOWN_MONTH = 'unknown'
+# A compaction lock older than this is assumed to be left over from a crashed process.
+COMPACTION_LOCK_TIMEOUT_SECONDS = 600
+
+# Layout: <root>/customer=<firestore id>/month=<YYYY-MM>/part-<uuid>.arrow
+# Each part is an uncompressed Arrow IPC file. Reads memory-map it and only touch the
+# columns they select, so a profile reads date/amount/type without building any dicts.
+# Every other field of the transaction document is kept as JSON in the 'record' column.
+# A part that replaces others (a compaction or a backfill) lists them in its 'replaces'
+# metadata and is written before they are deleted; readers skip replaced parts still on
+# disk, so they never count a row twice while the old parts are being removed.
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+    except ImportError as e:
+        raise RuntimeError("TRANSACTION_STORE_DIR is set but pyarrow is not installed (pip install pyarrow).") from e
+    return pyarrow, pyarrow.compute
+
+def _schema(pa):
+    return pa.schema([
+        ('transaction_firestore_id', pa.string()),
+        ('type', pa.string()),
+        ('date', pa.timestamp('us')),
+        ('amount', pa.float64()),
+        ('record', pa.string()),
+    ])
+
+def store_enabled(root: str = None) -> bool:
+    return bool(root or TRANSACTION_STORE_DIR)
+
+def _customer_dir(root: str, customer_id: str) -> str:
+    if not customer_id or '/' in customer_id or customer_id.startswith('.'):
+        raise ValueError(f"Invalid customer id for the transaction store: {customer_id!r}")
+    return os.path.join(root, f"customer={customer_id}")
+
+def has_customer(customer_id: str, root: str = None) -> bool:
+    return os.path.isdir(_customer_dir(root or TRANSACTION_STORE_DIR, customer_id))
+
+# --- 2. Writing ---
+
+def _write_part(pa, month_dir: str, table, replaces: list[str] = ()):
+    """
+    Writes a part under a temporary name first, so readers never see a half-written file.
+    `replaces` names the parts it supersedes; delete them only after this returns.
+    """
+    os.makedirs(month_dir, exist_ok=True)
+    name = f"part-{uuid.uuid4().hex}.arrow"
+    tmp_path = os.path.join(month_dir, f".{name}.tmp")
+    if replaces:
+        table = table.replace_schema_metadata({'replaces': json.dumps(sorted(replaces))})
+    with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, os.path.join(month_dir, name))
+
+def _parts(month_dir: str) -> list[str]:
+    return sorted(os.path.join(month_dir, f) for f in os.listdir(month_dir) if f.endswith('.arrow'))
+
+def _remove_parts(month_dir: str, names: list[str]):
+    for name in names:
+        try:
+            os.remove(os.path.join(month_dir, name))
+        except FileNotFoundError:
+            pass
+
+def append_transactions(customer_id: str, documents: list[tuple[str, dict]], root: str = None,
+                        replace_existing: bool = False) -> int:
+    """
+    Adds (Firestore id, transaction document) pairs to the customer's month partitions.
+    With replace_existing, they replace everything stored for the customer instead.
+    """
+    root = root or TRANSACTION_STORE_DIR
+    customer_dir = _customer_dir(root, customer_id)
+    os.makedirs(customer_dir, exist_ok=True)
+    # Each month's current parts, which the new ones replace
+    existing = {
+        month[len('month='):]: [os.path.basename(path) for path in _parts(os.path.join(customer_dir, month))]
+        for month in os.listdir(customer_dir) if month.startswith('month=')
+    } if replace_existing else {}
+    if not documents:
+        # Nothing to add, but the old rows must still go: an empty part replaces them
+        if existing: _replace_months(customer_dir, existing, {})
+        return 0
+
+    # Only writes need pandas and the profile engine; reads stay on pyarrow, so importing this module is cheap
+    import pandas as pd
+    from profileEngine import parse_transactions
+    pa, _ = _pyarrow()
+    frame = parse_transactions([data for _, data in documents], keep_invalid=True)
+    dates = pd.to_datetime(frame['date'], utc=True).dt.tz_localize(None) if frame['date'].dt.tz is not None else frame['date']
+    months = dates.dt.strftime('%Y-%m').fillna(UNKNOWN_MONTH)
+    columns = {
+        'transaction_firestore_id': [doc_id for doc_id, _ in documents],
+        'type': frame['type'].tolist(),
+        'date': dates.astype('datetime64[us]'),
+        'amount': frame['amount'].to_numpy(dtype=float),
+        'record': [json.dumps(data, default=str) for _, data in documents],
+    }
+    table = pa.Table.from_pydict(
+        {name: pa.array(values, type=_schema(pa).field(name).type, from_pandas=True) for name, values in columns.items()},
+        schema=_schema(pa),
+    )
+    groups = pd.Series(range(len(documents))).groupby(months.to_numpy()).groups
+    month_tables = {month: table.take(pa.array(list(positions))) for month, positions in groups.items()}
+    if replace_existing:
+        _replace_months(customer_dir, existing, month_tables)
+        return len(documents)
+    for month, month_table in month_tables.items():
+        month_dir = os.path.join(customer_dir, f"month={month}")
+        _write_part(pa, month_dir, month_table)
+        if len(_parts(month_dir)) > STORE_MAX_PARTS_PER_MONTH:
+            compact_month(month_dir)
+    return len(documents)
+
+def _replace_months(customer_dir: str, existing: dict, month_tables: dict):
+    """Writes each month's new part, replacing its existing parts, then deletes those."""
+    pa, _ = _pyarrow()
+    for month in sorted(set(existing) | set(month_tables)):
+        month_dir = os.path.join(customer_dir, f"month={month}")
+        replaced = existing.get(month, [])
+        _write_part(pa, month_dir, month_tables.get(month, _schema(pa).empty_table()), replaced)
+        _remove_parts(month_dir, replaced)
+
+def compact_month(month_dir: str) -> bool:
+    """
+    Merges a month's part files into one. A lock file keeps two processes from
+    compacting the same month at once; parts appended meanwhile are left alone.
+    """
+    pa, _ = _pyarrow()
+    lock_path = os.path.join(month_dir, '.compacting')
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        if time.time() - os.path.getmtime(lock_path) < COMPACTION_LOCK_TIMEOUT_SECONDS:
+            return False
+        os.replace(lock_path, lock_path + '.stale')
+        return compact_month(month_dir)
+    try:
+        tables, listed = _read_month(pa, month_dir, _schema(pa).names)
+        if len(listed) < 2: return False
+        _write_part(pa, month_dir, pa.concat_tables(tables) if tables else _schema(pa).empty_table(), listed)
+        _remove_parts(month_dir, listed)
+        return True
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+def backfill_customer(db, customer_id: str, root: str = None) -> int:
+    """
+    (Re)builds a customer's partitions from the database, e.g. for data synced before
+    the store existed. The new parts replace the old ones, so readers see one or the other.
+    """
+    query = db.collection('transactions').where('customer_firestore_id', '==', customer_id)
+    documents = [(doc.id, doc.to_dict()) for doc in query.stream()]
+    return append_transactions(customer_id, documents, root, replace_existing=True)
+
+def record_synced_transactions(db, documents: list[tuple[str, dict]], root: str = None):
+    """
+    Mirrors newly committed transaction documents into the store, grouped by customer.
+    Customers the store hasn't seen yet are backfilled in full instead, so their
+    partitions never hold only the latest sync.
+    """
+    root = root or TRANSACTION_STORE_DIR
+    by_customer = defaultdict(list)
+    for doc_id, data in documents:
+        by_customer[data['customer_firestore_id']].append((doc_id, data))
+    for customer_id, customer_documents in by_customer.items():
+        if has_customer(customer_id, root):
+            append_transactions(customer_id, customer_documents, root)
+        else:
+            backfill_customer(db, customer_id, root)
+
+# --- 3. Reading ---
+
+def _read_part(pa, path: str, columns: list[str]):
+    """
+    Memory-maps one part; selecting columns is zero-copy and leaves the others unread.
+    Returns the table and the names of the parts it replaces.
+    """
+    reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+    replaces = json.loads((reader.schema.metadata or {}).get(b'replaces', b'[]'))
+    return reader.read_all().select(columns).replace_schema_metadata(None), replaces
+
+def _read_month(pa, month_dir: str, columns: list[str]):
+    """
+    A month's tables, without the parts a listed part replaces, and the part names listed.
+    A part deleted between listing and opening it was just replaced, so the month is listed again.
+    """
+    while True:
+        tables, replaced = {}, set()
+        try:
+            for path in _parts(month_dir):
+                tables[os.path.basename(path)], replaces = _read_part(pa, path, columns)
+                replaced.update(replaces)
+        except FileNotFoundError:
+            continue
+        return [table for name, table in tables.items() if name not in replaced], list(tables)
+
+def _read_months(customer_id: str, columns: list[str], root: str, keep_month=None):
+    pa, _ = _pyarrow()
+    customer_dir = _customer_dir(root, customer_id)
+    tables = [
+        table
+        for month in sorted(os.listdir(customer_dir))
+        if month.startswith('month=') and (keep_month is None or keep_month(month[len('month='):]))
+        for table in _read_month(pa, os.path.join(customer_dir, month), columns)[0]
+    ]
+    if not tables:
+        return _schema(pa).empty_table().select(columns)
+    return pa.concat_tables(tables)
+
+def read_profile_frame(customer_id: str, with_ids: bool = False, root: str = None):
+    """
+    The customer's transactions as profileEngine.compute_financial_profile takes them
+    ('date', 'amount', 'type', plus 'transaction_firestore_id' with_ids; rows with a
+    usable date), or None if the store has never seen this customer.
+    """
+    root = root or TRANSACTION_STORE_DIR
+    if not has_customer(customer_id, root): return None
+    columns = ['date', 'amount', 'type'] + (['transaction_firestore_id'] if with_ids else [])
+    frame = _read_months(customer_id, columns, root).to_pandas()
+    return frame[frame['date'].notna()].reset_index(drop=True)
+
+def read_recent_purchases(customer_id: str, since: datetime, after: tuple = None, limit: int = None,
+                          root: str = None):
+    """
+    Purchases dated at or after `since` (a UTC datetime), ordered by date then document
+    id like the database query, as the documents plus 'transaction_firestore_id' and a
+    typed TRANSACTION_TIMESTAMP_FIELD. `after` is a (timestamp, document id) cursor to
+    resume past and `limit` caps the page. Only the months from `since` on are read.
+    Returns None if the store has never seen this customer.
+    """
+    root = root or TRANSACTION_STORE_DIR
+    if not has_customer(customer_id, root): return None
+    pa, pc = _pyarrow()
+
+    def naive_utc(value: datetime) -> datetime:
+        return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+    first_month = since.strftime('%Y-%m')
+    table = _read_months(customer_id, ['transaction_firestore_id', 'type', 'date', 'record'], root,
+                         keep_month=lambda month: month != UNKNOWN_MONTH and month >= first_month)
+    timestamp = pa.timestamp('us')
+    mask = pc.and_(pc.equal(table['type'], 'purchase'),
+                   pc.greater_equal(table['date'], pa.scalar(naive_utc(since), timestamp)))
+    if after:
+        after_date, after_id = pa.scalar(naive_utc(after[0]), timestamp), after[1]
+        mask = pc.and_(mask, pc.or_(
+            pc.greater(table['date'], after_date),
+            pc.and_(pc.equal(table['date'], after_date), pc.greater(table['transaction_firestore_id'], after_id)),
+        ))
+    table = table.filter(pc.fill_null(mask, False))
+    table = table.sort_by([('date', 'ascending'), ('transaction_firestore_id', 'ascending')])
+    if limit is not None:
+        table = table.slice(0, limit)
+    return [
+        {**json.loads(record), 'transaction_firestore_id': doc_id, TRANSACTION_TIMESTAMP_FIELD: date.replace(tzinfo=timezone.utc)}
+        for doc_id, date, record in zip(
+            table['transaction_firestore_id'].to_pylist(), table['date'].to_pylist(), table['record'].to_pylist()
+        )
+    ]
+
+def read_or_backfill(reader, db, customer_id: str, *args, root: str = None):
+    """Calls reader(customer_id, *args), backfilling the customer from the database first if needed."""
+    result = reader(customer_id, *args, root=root)
+    if result is None:
+        backfill_customer(db, customer_id, root)
+        result = reader(customer_id, *args, root=root)
+    return result